@@ -0,0 +1,79 @@
+import random
+import timeit
+
+import numpy as np
+import typer
+
+from tools.labelme_to_yolo_seg import shapes_to_yolo_seg
+
+cli = typer.Typer(help="分割标签归一化/格式化微基准")
+
+
+def legacy_shapes_to_yolo_seg(shapes, classes, img_width, img_height):
+    """逐点归一化、逐个 f-string 格式化的旧实现, 作为对照"""
+    lines = []
+    for shape in shapes:
+        class_id = classes.index(shape["label"])
+        normalized = []
+        for point in shape["points"]:
+            normalized.extend([point[0] / img_width, point[1] / img_height])
+        lines.append(f"{class_id} " + " ".join([f"{coord:.6f}" for coord in normalized]) + "\n")
+    return "".join(lines)
+
+
+def make_shapes(num_shapes, num_points, img_width, img_height, classes):
+    return [
+        {
+            "label": random.choice(classes),
+            "points": [
+                [random.uniform(0, img_width), random.uniform(0, img_height)]
+                for _ in range(num_points)
+            ],
+            "shape_type": "polygon",
+        }
+        for _ in range(num_shapes)
+    ]
+
+
+@cli.command()
+def main(
+    num_shapes: int = typer.Option(20, "--shapes", "-s", help="每个文件的多边形数量"),
+    num_points: int = typer.Option(2000, "--points", "-p", help="每个多边形的顶点数"),
+    repeat: int = typer.Option(5, "--repeat", "-r", help="重复次数"),
+):
+    random.seed(0)
+    classes = ["a", "b", "c"]
+    img_width, img_height = 4000, 3000
+    shapes = make_shapes(num_shapes, num_points, img_width, img_height, classes)
+
+    # 坐标均在图像内时 clip 不生效, 两种实现的结果只允许末位舍入差异
+    legacy_out = legacy_shapes_to_yolo_seg(shapes, classes, img_width, img_height)
+    vectorized_out = shapes_to_yolo_seg(shapes, classes, img_width, img_height)
+    assert np.allclose(
+        np.array(legacy_out.split(), dtype=np.float64),
+        np.array(vectorized_out.split(), dtype=np.float64),
+        rtol=0,
+        atol=1.01e-6,
+    )
+
+    legacy = min(
+        timeit.repeat(
+            lambda: legacy_shapes_to_yolo_seg(shapes, classes, img_width, img_height),
+            number=1,
+            repeat=repeat,
+        )
+    )
+    vectorized = min(
+        timeit.repeat(
+            lambda: shapes_to_yolo_seg(shapes, classes, img_width, img_height),
+            number=1,
+            repeat=repeat,
+        )
+    )
+    typer.echo(f"{num_shapes} 个多边形 x {num_points} 个顶点")
+    typer.echo(f"  legacy:     {legacy * 1000:.2f} ms")
+    typer.echo(f"  vectorized: {vectorized * 1000:.2f} ms ({legacy / vectorized:.1f}x)")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,79 @@
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import typer
+
+from tools.cli import COMMANDS
+from tools.json_codec import dump_json
+
+cli = typer.Typer(help="datahelper 启动耗时基准 (--help 与模块导入时间)")
+
+
+def time_run(args, repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def top_imports(args, top: int):
+    """解析 -X importtime 输出, 返回累计耗时最多的顶层模块 [(模块, 毫秒)]"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], check=True, capture_output=True, text=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            modules.append((name.strip(), int(cumulative) / 1000))
+    return sorted(modules, key=lambda m: -m[1])[:top]
+
+
+@cli.command()
+def main(
+    repeat: int = typer.Option(10, "--repeat", "-r", help="每条命令运行次数"),
+    subcommands: bool = typer.Option(True, "--subcommands/--no-subcommands", help="同时测试各子命令的 --help"),
+    budget: float = typer.Option(100, "--budget", help="datahelper --help 的耗时上限 (毫秒), 超出时返回非零"),
+    output_path: Path = typer.Option(Path("bench_startup.json"), "--output_path", "-o", help="结果 json"),
+):
+    """在子进程中运行 datahelper --help (及各子命令 --help), 记录耗时和导入最慢的模块"""
+    baseline = min(time_run(["-c", "pass"], repeat))
+    typer.echo(f"解释器空启动: {baseline * 1000:.1f} ms")
+
+    cases = [("datahelper --help", ["-m", "tools.cli", "--help"])]
+    if subcommands:
+        cases += [(f"datahelper {name} --help", ["-m", "tools.cli", name, "--help"]) for name in COMMANDS]
+
+    results = []
+    for name, args in cases:
+        times = time_run(args, repeat)
+        imports = top_imports(args, 5)
+        results.append(
+            {
+                "case": name,
+                "min_ms": min(times) * 1000,
+                "median_ms": statistics.median(times) * 1000,
+                "top_imports_ms": imports,
+            }
+        )
+        slowest = ", ".join(f"{m} {ms:.0f}ms" for m, ms in imports[:3])
+        typer.echo(f"  {name:<46} min {min(times) * 1000:7.1f} ms   [{slowest}]")
+
+    dump_json({"python": sys.version, "interpreter_ms": baseline * 1000, "results": results}, output_path)
+    typer.echo(f"结果保存在 {output_path}")
+
+    if results[0]["min_ms"] > budget:
+        typer.echo(f"datahelper --help 耗时 {results[0]['min_ms']:.1f} ms, 超出上限 {budget} ms")
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,208 @@
+import contextlib
+import datetime
+import io
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import typer
+
+from benchmarks.synthetic import make_dataset
+from tools import find_unlabeled_data
+from tools import labelme_to_yolo_det
+from tools import labelme_to_yolo_pose
+from tools import labelme_to_yolo_seg
+from tools import modify_label
+from tools import search_data_by_label
+from tools import splitdata
+from tools import video_to_images
+from tools import yolo_det_to_labelme
+from tools.json_codec import dump_json
+from tools.json_codec import load_json
+
+cli = typer.Typer(help="各工具在合成数据集上的基准测试")
+
+
+def copy_into(dst: Path, *dirs: Path) -> Path:
+    dst.mkdir(parents=True, exist_ok=True)
+    for src in dirs:
+        for file in src.iterdir():
+            shutil.copy(file, dst)
+    return dst
+
+
+def with_empty_labels(label_dir: Path, image_dir: Path) -> Path:
+    """splitdata 要求每张图片都有 txt 标签, 缺失的补空文件"""
+    for img_file in image_dir.iterdir():
+        (label_dir / f"{img_file.stem}.txt").touch()
+    return label_dir
+
+
+# 每个用例: (工具模块, setup), setup(数据集目录, 临时工作目录) 返回命令行参数.
+# 会修改输入的工具 (move/modify) 在 setup 中先复制一份, 复制不计入耗时.
+CASES = {
+    "labelme_to_yolo_det": (
+        labelme_to_yolo_det,
+        lambda data, work: [
+            str(data / "images"), str(data / "classes.txt"), "-l", str(data / "det"), "-o", str(work / "out"),
+        ],
+    ),
+    "labelme_to_yolo_seg": (
+        labelme_to_yolo_seg,
+        lambda data, work: [
+            str(data / "images"), str(data / "classes.txt"), "-l", str(data / "seg"), "-o", str(work / "out"),
+        ],
+    ),
+    "labelme_to_yolo_pose": (
+        labelme_to_yolo_pose,
+        lambda data, work: [
+            str(data / "images"), str(data / "pose_classes.txt"), "-l", str(data / "pose"), "-o", str(work / "out"),
+        ],
+    ),
+    "yolo_det_to_labelme": (
+        yolo_det_to_labelme,
+        lambda data, work: [
+            str(data / "images"), str(data / "classes.txt"), "-l", str(data / "yolo"), "-o", str(work / "out"),
+        ],
+    ),
+    "splitdata": (
+        splitdata,
+        lambda data, work: [
+            str(data / "images"), "-l", str(with_empty_labels(copy_into(work / "labels", data / "yolo"), data / "images")),
+            "-o", str(work / "out"),
+        ],
+    ),
+    "modify_label": (
+        modify_label,
+        lambda data, work: [
+            str(copy_into(work / "labels", data / "yolo", data / "det")), "car", "-n", "dog",
+            "-c", str(data / "classes.txt"),
+        ],
+    ),
+    "find_unlabeled_data": (
+        find_unlabeled_data,
+        lambda data, work: [
+            str(copy_into(work / "data", data / "images", data / "yolo")), "-o", str(work / "out"), "-m", "all",
+        ],
+    ),
+    "search_data_by_label": (
+        search_data_by_label,
+        lambda data, work: [
+            str(copy_into(work / "data", data / "images", data / "yolo")), "-o", str(work / "out"),
+            "-a", "copy", "--any", "1:>=:2",
+        ],
+    ),
+    "video_to_images": (
+        video_to_images,
+        lambda data, work: [str(data / "videos"), "-g", "10", "-o", str(work / "out")],
+    ),
+}
+
+
+def run_case(module, setup, data: Path, repeat: int) -> List[float]:
+    command = typer.main.get_command(module.cli)
+    times = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+            args = setup(data, Path(tmp))
+            # 屏蔽进度条和打印, labelme_to_yolo_pose 结束时询问是否显示结果, 回答 n
+            stdin = sys.stdin
+            sys.stdin = io.StringIO("n\n")
+            try:
+                with (
+                    open(os.devnull, "w") as devnull,
+                    contextlib.redirect_stdout(devnull),
+                    contextlib.redirect_stderr(devnull),
+                ):
+                    start = time.perf_counter()
+                    command.main(args, standalone_mode=False)
+                    times.append(time.perf_counter() - start)
+            finally:
+                sys.stdin = stdin
+    return times
+
+
+def environment():
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+
+
+def compare(results, baseline_file: Path, tolerance: float) -> int:
+    """与基线结果比较, 打印耗时比值, 返回变慢超过容差的用例数"""
+    baseline = {(r["case"], r["size"]): r for r in load_json(baseline_file)["results"]}
+    regressions = 0
+    typer.echo(f"\n与基线 {baseline_file} 对比 (容差 {tolerance:.0%}):")
+    for r in results:
+        base = baseline.get((r["case"], r["size"]))
+        if base is None:
+            continue
+        ratio = r["min"] / base["min"]
+        slower = ratio > 1 + tolerance
+        regressions += slower
+        mark = "  <-- 变慢" if slower else ""
+        typer.echo(f"  {r['case']:<24} {r['size']:>8}  {base['min']:.3f}s -> {r['min']:.3f}s ({ratio:.2f}x){mark}")
+    return regressions
+
+
+@cli.command()
+def main(
+    sizes: List[int] = typer.Option([100, 1000], "--size", "-n", help="数据集图片数量, 可重复指定"),
+    cases: List[str] = typer.Option(None, "--case", "-c", help=f"仅运行指定用例, 可重复指定 {list(CASES)}"),
+    repeat: int = typer.Option(3, "--repeat", "-r", help="每个用例重复次数, 取最小值比较"),
+    output_path: Path = typer.Option(Path("bench_results.json"), "--output_path", "-o", help="结果 json"),
+    baseline: Path = typer.Option(None, "--baseline", "-b", help="基线结果 json, 指定后对比并在变慢时返回非零"),
+    tolerance: float = typer.Option(0.1, "--tolerance", help="允许的变慢比例"),
+    data_dir: Path = typer.Option(None, "--data_dir", help="合成数据集缓存目录, 默认使用临时目录"),
+    seed: int = typer.Option(0, "--seed", help="随机种子"),
+):
+    """生成不同规模的合成数据集, 依次运行各工具并记录耗时"""
+    selected = cases or list(CASES)
+    unknown = set(selected) - set(CASES)
+    if unknown:
+        raise typer.BadParameter(f"未知用例: {sorted(unknown)}")
+
+    results = []
+    with contextlib.ExitStack() as stack:
+        root = data_dir or Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="bench_data_")))
+        for size in sizes:
+            data = root / f"n{size}_seed{seed}"
+            if not (data / "classes.txt").exists():
+                typer.echo(f"生成合成数据集: {size} 张图片 -> {data}")
+                make_dataset(data, size, seed=seed)
+
+            for name in selected:
+                module, setup = CASES[name]
+                times = run_case(module, setup, data, repeat)
+                results.append(
+                    {
+                        "case": name,
+                        "size": size,
+                        "times": times,
+                        "min": min(times),
+                        "median": statistics.median(times),
+                        "images_per_sec": size / min(times),
+                    }
+                )
+                typer.echo(f"  {name:<24} {size:>8}  min {min(times):.3f}s  median {statistics.median(times):.3f}s")
+
+    dump_json({"environment": environment(), "repeat": repeat, "seed": seed, "results": results}, output_path)
+    typer.echo(f"结果保存在 {output_path}")
+
+    if baseline and compare(results, baseline, tolerance):
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
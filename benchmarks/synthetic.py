@@ -0,0 +1,143 @@
+import random
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from tools.json_codec import dump_json
+
+CLASSES = ["person", "car", "dog"]
+POSE_CLASSES = ["person"]
+POINT_ORDER = ["head", "left_hand", "right_hand", "left_foot", "right_foot"]
+
+# 目录结构:
+#   images/            jpg 图片
+#   det/ seg/ pose/    LabelMe json (检测/分割/关键点)
+#   yolo/              YOLO 检测 txt, 部分为空文件或缺失, 用于 find_unlabeled_data
+#   videos/            mp4 短视频
+#   classes.txt        检测/分割类别
+#   pose_classes.txt   关键点类别, 空行后为关键点顺序
+
+
+def make_image_pool(num, width, height, rng: np.random.Generator):
+    """生成若干张编码后的 jpg, 写入时循环复用以节省生成时间"""
+    pool = []
+    ys, xs = np.mgrid[0:height, 0:width]
+    for _ in range(num):
+        base = rng.integers(0, 256, size=3)
+        img = ((xs / width * base[0] + ys / height * base[1]) % 256).astype(np.uint8)
+        img = np.dstack([img, np.roll(img, width // 3, axis=1), np.full_like(img, base[2])])
+        for _ in range(8):
+            x0, y0 = rng.integers(0, width - 20), rng.integers(0, height - 20)
+            w, h = rng.integers(10, width // 4), rng.integers(10, height // 4)
+            img[y0 : y0 + h, x0 : x0 + w] = rng.integers(0, 256, size=3)
+        pool.append(cv2.imencode(".jpg", img)[1].tobytes())
+    return pool
+
+
+def random_box(rnd: random.Random, width, height):
+    w = rnd.uniform(0.05, 0.4) * width
+    h = rnd.uniform(0.05, 0.4) * height
+    x = rnd.uniform(0, width - w)
+    y = rnd.uniform(0, height - h)
+    return x, y, x + w, y + h
+
+
+def random_polygon(rnd: random.Random, box, num_points):
+    x0, y0, x1, y1 = box
+    cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+    angles = np.sort(np.array([rnd.uniform(0, 2 * np.pi) for _ in range(num_points)]))
+    radius = np.array([rnd.uniform(0.5, 1.0) for _ in range(num_points)])
+    xs = cx + np.cos(angles) * radius * (x1 - x0) / 2
+    ys = cy + np.sin(angles) * radius * (y1 - y0) / 2
+    return np.column_stack((xs, ys)).tolist()
+
+
+def labelme_json(image_name, width, height, shapes):
+    return {
+        "version": "5.3.1",
+        "flags": {},
+        "shapes": shapes,
+        "imagePath": image_name,
+        "imageData": None,
+        "imageHeight": height,
+        "imageWidth": width,
+    }
+
+
+def shape(label, points, shape_type, group_id=None):
+    return {"label": label, "points": points, "group_id": group_id, "shape_type": shape_type, "flags": {}}
+
+
+def write_labels(root: Path, stem, width, height, rnd: random.Random, max_objects, polygon_points):
+    image_name = f"{stem}.jpg"
+    boxes = [random_box(rnd, width, height) for _ in range(rnd.randint(1, max_objects))]
+    labels = [rnd.choice(CLASSES) for _ in boxes]
+
+    det = [shape(label, [[b[0], b[1]], [b[2], b[3]]], "rectangle") for label, b in zip(labels, boxes)]
+    seg = [shape(label, random_polygon(rnd, b, polygon_points), "polygon") for label, b in zip(labels, boxes)]
+    pose = []
+    for b in boxes:
+        pose.append(shape("person", [[b[0], b[1]], [b[2], b[3]]], "rectangle"))
+        for name in POINT_ORDER:
+            point = [[rnd.uniform(b[0], b[2]), rnd.uniform(b[1], b[3])]]
+            pose.append(shape(name, point, "point", rnd.choice([None, 0, 1, 2])))
+
+    dump_json(labelme_json(image_name, width, height, det), root / "det" / f"{stem}.json")
+    dump_json(labelme_json(image_name, width, height, seg), root / "seg" / f"{stem}.json")
+    dump_json(labelme_json(image_name, width, height, pose), root / "pose" / f"{stem}.json")
+
+    # 约 10% 缺失标签, 10% 空标签
+    kind = rnd.random()
+    if kind < 0.1:
+        return
+    with open(root / "yolo" / f"{stem}.txt", "w") as f:
+        if kind < 0.2:
+            return
+        for label, (x0, y0, x1, y1) in zip(labels, boxes):
+            f.write(
+                f"{CLASSES.index(label)} {(x0 + x1) / 2 / width:.6f} {(y0 + y1) / 2 / height:.6f} "
+                f"{(x1 - x0) / width:.6f} {(y1 - y0) / height:.6f}\n"
+            )
+
+
+def write_video(path: Path, num_frames, width, height, rng: np.random.Generator):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 25, (width, height))
+    frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    for i in range(num_frames):
+        writer.write(np.roll(frame, i * 4, axis=1))
+    writer.release()
+
+
+def make_dataset(
+    root: Path,
+    num_images: int,
+    width: int = 640,
+    height: int = 480,
+    max_objects: int = 8,
+    polygon_points: int = 64,
+    num_videos: int = 2,
+    video_frames: int = 100,
+    seed: int = 0,
+) -> Path:
+    """在 root 下生成合成数据集, 相同参数和种子生成的数据一致"""
+    rnd = random.Random(seed)
+    rng = np.random.default_rng(seed)
+    for sub in ("images", "det", "seg", "pose", "yolo", "videos"):
+        (root / sub).mkdir(parents=True, exist_ok=True)
+
+    with open(root / "classes.txt", "w") as f:
+        f.write("\n".join(CLASSES))
+    with open(root / "pose_classes.txt", "w") as f:
+        f.write("\n".join(POSE_CLASSES + [""] + POINT_ORDER))
+
+    pool = make_image_pool(min(num_images, 16), width, height, rng)
+    for i in range(num_images):
+        stem = f"img_{i:06d}"
+        (root / "images" / f"{stem}.jpg").write_bytes(pool[i % len(pool)])
+        write_labels(root, stem, width, height, rnd, max_objects, polygon_points)
+
+    for i in range(num_videos):
+        write_video(root / "videos" / f"video_{i:02d}.mp4", video_frames, 320, 240, rng)
+
+    return root
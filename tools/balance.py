@@ -0,0 +1,166 @@
+# 类别均衡采样: 输出按重复因子重复图片路径的 train.txt, 不复制任何图片
+#
+# rfs (LVIS repeat factor sampling): 类别 c 出现在 f_c 比例的图片中, 类别重复因子 r_c = max(1, sqrt(t / f_c)),
+#     图片的重复因子为其中各类别 r_c 的最大值.
+# quota: 每个类别至少出现在 target 张 (重复后的) 图片中, r_c = max(1, target / n_c).
+# 重复因子的小数部分按固定种子随机取整, 重复后的期望次数等于重复因子, 结果可复现.
+import os
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+import typer
+from rich.progress import Progress
+
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.label_store import LabelStore
+from tools.search_data_by_label import load_labels
+from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.utils import bounded_map
+from tools.utils import chunked
+from tools.utils import iter_image_label_pairs
+from tools.utils import load_classes
+from tools.utils import scan_files
+
+cli = typer.Typer(help="类别均衡采样, 输出重复图片路径的 train.txt")
+
+
+class Mode(str, Enum):
+    rfs = "rfs"
+    quota = "quota"
+
+
+def count_chunk(pairs):
+    """在子进程中读取一批标签, 返回每张图片的 {类别: 数量}, 没有标签的图片为空字典"""
+    results = []
+    for _, _, label_file in pairs:
+        counts = load_labels(label_file) if label_file is not None else None
+        results.append(counts or {})
+    return results
+
+
+def presence_matrix(label_counts: list[dict]) -> tuple[list[str], np.ndarray]:
+    """(类别列表, (图片数, 类别数) 的 bool 矩阵), 类别按 id/名称排序"""
+    # YOLO 类别 id 按数值排序, LabelMe 类别名按字母排序
+    names = sorted(
+        {c for counts in label_counts for c in counts}, key=lambda c: (0, int(c), "") if c.isdigit() else (1, 0, c)
+    )
+    index = {c: i for i, c in enumerate(names)}
+    rows = np.repeat(np.arange(len(label_counts)), [len(counts) for counts in label_counts])
+    cols = np.fromiter((index[c] for counts in label_counts for c in counts), dtype=np.int64, count=len(rows))
+    present = np.zeros((len(label_counts), len(names)), dtype=bool)
+    present[rows, cols] = True
+    return names, present
+
+
+def class_repeat_factors(present: np.ndarray, mode: Mode, threshold: float, target: int) -> np.ndarray:
+    images_per_class = present.sum(axis=0)
+    if mode == Mode.rfs:
+        freq = images_per_class / max(len(present), 1)
+        return np.maximum(1.0, np.sqrt(threshold / freq))
+    return np.maximum(1.0, target / images_per_class)
+
+
+def image_repeat_factors(present: np.ndarray, class_factors: np.ndarray, max_repeat: float) -> np.ndarray:
+    """每张图片取其中各类别重复因子的最大值, 没有目标的图片为 1"""
+    factors = np.where(present, class_factors, 1.0).max(axis=1, initial=1.0)
+    return np.minimum(factors, max_repeat) if max_repeat else factors
+
+
+def stochastic_round(factors: np.ndarray, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    base = np.floor(factors)
+    return (base + (rng.random(len(factors)) < factors - base)).astype(np.int64)
+
+
+def manifest_path(image_file: Path, manifest_dir: Path, absolute: bool) -> str:
+    """ultralytics 将 ./ 开头的路径视为相对 train.txt 所在目录"""
+    if not absolute and image_file.is_relative_to(manifest_dir):
+        return f"./{image_file.relative_to(manifest_dir).as_posix()}"
+    return image_file.as_posix()
+
+
+@cli.command()
+@instrumented
+def balance(
+    image_path: Path = typer.Argument(..., help="图片目录"),
+    label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录 (YOLO txt 或 LabelMe json)"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="输出的 train.txt, 默认为图片目录同级的 train.txt"),
+    mode: Mode = typer.Option(Mode.rfs, "--mode", "-m", help="[rfs: LVIS 重复因子采样, quota: 每个类别的目标图片数]"),
+    threshold: float = typer.Option(0.1, "--threshold", "-t", help="rfs 的频率阈值 t, 出现比例低于 t 的类别被过采样"),
+    target: int = typer.Option(None, "--target", help="quota 模式下每个类别至少出现的图片数, 默认为最多的类别的图片数"),
+    max_repeat: float = typer.Option(None, "--max_repeat", help="单张图片的最大重复次数"),
+    seed: int = typer.Option(0, "--seed", help="重复因子小数部分随机取整的种子"),
+    class_path: Path = typer.Option(None, "--class_path", "-c", help="classes.txt, 仅用于显示 YOLO 类别名"),
+    store_path: Path = typer.Option(
+        None, "--store", help="标签存储目录 (label_store pack 生成), 指定后直接从存储读取类别数量"
+    ),
+    absolute: bool = typer.Option(False, "--absolute", help="写入绝对路径, 默认在 train.txt 所在目录下的图片写为 ./ 相对路径"),
+    workers: int = typer.Option(os.cpu_count(), "--workers", "-w", help="进程数"),
+    chunk_size: int = typer.Option(500, "--chunk_size", help="每个任务处理的文件数"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录"),
+):
+    """统计每张图片包含的类别, 按重复因子重复图片路径写出 train.txt, 过采样只占用几 KB 而不是复制图片"""
+    image_path = image_path.resolve()
+    label_path = (label_path or image_path).resolve()
+    output_path = (output_path or image_path.parent / "train.txt").resolve()
+
+    images, label_counts = [], []
+    if store_path is not None:
+        store = LabelStore(store_path)
+        for image_file in scan_files(image_path, SUPPORTED_IMAGE_EXTENSIONS, recursive):
+            stem = image_file.relative_to(image_path).with_suffix("").as_posix()
+            images.append(image_file)
+            try:
+                label_counts.append(store.class_counts(store.index(stem)))
+            except KeyError:
+                label_counts.append({})
+    else:
+        pairs = iter_image_label_pairs(image_path, label_path, recursive, label_suffixes=(".txt", ".json"))
+        with Progress() as progress, ProcessPoolExecutor(max_workers=workers) as executor:
+            bar = progress.add_task("Counting labels...", total=None)
+            for chunk, counts in bounded_map(executor, count_chunk, chunked(pairs, chunk_size)):
+                images.extend(img_file for img_file, _, _ in chunk)
+                label_counts.extend(counts)
+                progress.update(bar, advance=len(chunk))
+
+    if not images:
+        typer.echo("没有找到图片")
+        raise typer.Exit(1)
+
+    with stage("convert"):
+        names, present = presence_matrix(label_counts)
+        images_per_class = present.sum(axis=0)
+        if mode == Mode.quota and target is None:
+            target = int(images_per_class.max(initial=0))
+        class_factors = class_repeat_factors(present, mode, threshold, target)
+        factors = image_repeat_factors(present, class_factors, max_repeat)
+        repeats = stochastic_round(factors, seed)
+
+    manifest_dir = output_path.parent
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    with stage("write") as s, open(output_path, "w", encoding="utf-8") as f:
+        lines = [
+            f"{manifest_path(image_file, manifest_dir, absolute)}\n" * n
+            for image_file, n in zip(images, repeats.tolist())
+        ]
+        text = "".join(lines)
+        s.nbytes = len(text)
+        f.write(text)
+
+    display = dict(enumerate(load_classes(class_path)[0])) if class_path else {}
+    effective = (present * repeats[:, None]).sum(axis=0)
+    typer.echo(f"{'类别':<16}{'图片数':>8}{'重复因子':>10}{'重复后':>8}")
+    for i, name in enumerate(names):
+        label = display.get(int(name), name) if name.isdigit() else name
+        typer.echo(f"{label:<16}{images_per_class[i]:>8}{class_factors[i]:>10.2f}{effective[i]:>8}")
+    typer.echo(
+        f"完成: {len(images)} 张图片 -> {int(repeats.sum())} 行 (平均重复 {repeats.mean():.2f} 次), "
+        f"结果保存在 {output_path} ({len(text) / 1024:.1f} KB)"
+    )
+
+
+if __name__ == "__main__":
+    cli()
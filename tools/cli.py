@@ -0,0 +1,74 @@
+# datahelper 统一入口, 各工具注册为子命令
+#
+# 启动时只导入 click, 子命令对应的模块 (以及 cv2/PIL/pandas/ultralytics 等依赖)
+# 在执行该子命令时才导入, `datahelper --help` 不会导入任何工具模块.
+# 新增工具时在 COMMANDS 中注册: 子命令名 -> (模块, 帮助), 模块需提供 typer.Typer 实例 cli.
+import importlib
+
+import click
+
+COMMANDS = {
+    "balance": ("tools.balance", "类别均衡采样 (重复因子), 输出重复图片路径的 train.txt"),
+    "coco-export": ("tools.coco_export", "LabelMe / YOLO 标签导出为 COCO json (增量写出)"),
+    "coco-import": ("tools.coco_import", "COCO json 导入为 LabelMe / YOLO 标签 (流式解析)"),
+    "dedup": ("tools.dedup", "近重复图片检测 (感知哈希)"),
+    "export-masks": ("tools.export_masks", "LabelMe 多边形导出为掩码 (COCO RLE / 调色板 PNG)"),
+    "export-shards": ("tools.export_shards", "图片+标签打包为 tar 分片 (WebDataset 格式)"),
+    "find-unlabeled-data": ("tools.find_unlabeled_data", "查找未/空标注数据"),
+    "generate-empty-label-file": ("tools.generate_empty_label_file", "生成空标签文件，支持 txt/json 格式"),
+    "label-store": ("tools.label_store", "YOLO 标签打包为可内存映射的二进制存储 (pack/unpack)"),
+    "labelme-to-yolo-det": ("tools.labelme_to_yolo_det", "LabelMe 标签转 YOLO 标签 (目标检测)"),
+    "labelme-to-yolo-multi": ("tools.labelme_to_yolo_multi", "LabelMe 标签一次性转 YOLO 多任务标签"),
+    "labelme-to-yolo-pose": ("tools.labelme_to_yolo_pose", "LabelMe 标签转 YOLO 标签 (关键点)"),
+    "labelme-to-yolo-seg": ("tools.labelme_to_yolo_seg", "LabelMe 标签转 YOLO 标签 (分割)"),
+    "lint-labels": ("tools.lint_labels", "标签检查 (YOLO txt / LabelMe json)"),
+    "modify-label": ("tools.modify_label", "修改标签"),
+    "pipeline": ("tools.pipeline", "流式处理管线 (视频抽帧 -> 筛选未标注 -> 转 YOLO -> 划分数据集)"),
+    "prelabel": ("tools.prelabel", "YOLO 模型批量预标注, 输出 LabelMe json"),
+    "search-data-by-label": ("tools.search_data_by_label", "根据标签规则查找图像和标签"),
+    "show-pose": ("tools.show_pose", "关键点可视化，yolo 格式"),
+    "splitdata": ("tools.splitdata", "划分数据集"),
+    "stats": ("tools.stats", "数据集统计 (类别分布/目标尺寸/每图目标数/关键点可见性)"),
+    "tile": ("tools.tile", "大图切块, 标签 (框/多边形/关键点) 同步裁剪"),
+    "verify-images": ("tools.verify_images", "图片完整性校验"),
+    "video-to-images": ("tools.video_to_images", "视频转帧"),
+    "yolo-det-to-labelme": ("tools.yolo_det_to_labelme", "YOLO 标签转 LabelMe 标签 (目标检测)"),
+}
+
+
+class LazyCommand(click.Command):
+    """占位命令, 执行时才导入工具模块, 并将全部参数交给工具自己的 typer 应用解析"""
+
+    def __init__(self, name, module, help):
+        super().__init__(
+            name,
+            help=help,
+            short_help=help,
+            add_help_option=False,
+            context_settings={"ignore_unknown_options": True, "allow_extra_args": True},
+        )
+        self.module = module
+
+    def invoke(self, ctx):
+        app = importlib.import_module(self.module).cli
+        return app(args=ctx.args, prog_name=ctx.command_path)
+
+
+class LazyGroup(click.Group):
+    def list_commands(self, ctx):
+        return list(COMMANDS)
+
+    def get_command(self, ctx, name):
+        if name not in COMMANDS:
+            return None
+        module, help = COMMANDS[name]
+        return LazyCommand(name, module, help)
+
+
+@click.group(cls=LazyGroup, context_settings={"help_option_names": ["-h", "--help"]})
+def main():
+    """图像识别任务的数据处理工具, 使用 datahelper <子命令> --help 查看各工具用法"""
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# LabelMe / YOLO 标签导出为 COCO json
+#
+# 标签在进程池中读取并转换为 COCO 标注, 主进程按图片顺序分配 id 并逐条写出,
+# 不在内存中保留整个数据集.
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import typer
+from rich.progress import Progress
+
+from tools.coco_format import CocoWriter
+from tools.coco_format import coco_categories
+from tools.geometry import segment_starts
+from tools.geometry import shoelace_area
+from tools.instrument import instrumented
+from tools.json_codec import load_json
+from tools.label_objects import Task
+from tools.label_objects import load_labelme_objects
+from tools.label_objects import load_yolo_objects
+from tools.utils import bounded_map
+from tools.utils import chunked
+from tools.utils import iter_image_label_pairs
+from tools.utils import load_classes
+
+cli = typer.Typer(help="LabelMe / YOLO 标签导出为 COCO json")
+
+
+def image_size(img_file: Path, label_file):
+    """LabelMe json 中记录了图片尺寸时不打开图片"""
+    from PIL import Image
+
+    if label_file is not None and label_file.suffix == ".json":
+        data = load_json(label_file, skip_image_data=True)
+        if data.get("imageWidth") and data.get("imageHeight"):
+            return data["imageWidth"], data["imageHeight"]
+    with Image.open(img_file) as img:
+        return img.size
+
+
+def objects_to_annotations(objects, task: Task, category_ids: dict) -> tuple[list, list]:
+    """返回 (不含 id 的 COCO 标注, 不在 classes.txt 中的类别), 坐标保留 2 位小数"""
+    anns, unknown = [], []
+    if task == Task.seg:
+        if not len(objects.ring_lens):
+            return anns, unknown
+        starts = segment_starts(objects.ring_lens)
+        areas = shoelace_area(objects.points[:, 0], objects.points[:, 1], starts)
+        for label, start, n, area in zip(objects.poly_labels, starts.tolist(), objects.ring_lens.tolist(), areas.tolist()):
+            if label not in category_ids:
+                unknown.append(label)
+                continue
+            ring = objects.points[start : start + n]
+            x1, y1 = ring.min(axis=0)
+            x2, y2 = ring.max(axis=0)
+            anns.append(
+                {
+                    "category_id": category_ids[label],
+                    "bbox": np.round([x1, y1, x2 - x1, y2 - y1], 2).tolist(),
+                    "area": round(area, 2),
+                    "segmentation": [np.round(ring.ravel(), 2).tolist()],
+                }
+            )
+        return anns, unknown
+
+    for i, label in enumerate(objects.box_labels):
+        if label not in category_ids:
+            unknown.append(label)
+            continue
+        x1, y1, x2, y2 = objects.boxes[i]
+        ann = {
+            "category_id": category_ids[label],
+            "bbox": np.round([x1, y1, x2 - x1, y2 - y1], 2).tolist(),
+            "area": round(float((x2 - x1) * (y2 - y1)), 2),
+        }
+        if task == Task.pose:
+            kpts = objects.kpts[i].copy()
+            kpts[:, :2] = np.round(kpts[:, :2], 2)
+            # 不可见/未标注的关键点坐标按 COCO 惯例置 0
+            kpts[kpts[:, 2] == 0, :2] = 0
+            ann["keypoints"] = [int(v) if j % 3 == 2 else v for j, v in enumerate(kpts.ravel().tolist())]
+            ann["num_keypoints"] = int(np.count_nonzero(kpts[:, 2]))
+        anns.append(ann)
+    return anns, unknown
+
+
+def load_annotations(pairs, task: Task, classes: list, point_order: list, kpt_dim: int):
+    """在子进程中处理一批图片, 返回 [(宽, 高, 标注, 未知类别)], 无法读取的图片为 None"""
+    category_ids = {name: i + 1 for i, name in enumerate(classes)}
+    results = []
+    for img_file, _, label_file in pairs:
+        try:
+            width, height = image_size(img_file, label_file)
+        except OSError:
+            results.append(None)
+            continue
+        if label_file is None:
+            results.append((width, height, [], []))
+            continue
+        if label_file.suffix == ".json":
+            objects = load_labelme_objects(label_file, point_order)
+        else:
+            objects = load_yolo_objects(label_file, task, width, height, classes, point_order, kpt_dim)
+        results.append((width, height, *objects_to_annotations(objects, task, category_ids)))
+    return results
+
+
+@cli.command()
+@instrumented
+def coco_export(
+    image_path: Path = typer.Argument(..., help="图片目录"),
+    class_path: Path = typer.Argument(..., help="classes.txt, 第 i 行为 category id i + 1; 关键点任务中以空行分隔关键点顺序"),
+    label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录 (LabelMe json 或 YOLO txt)"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="输出的 COCO json, 默认为图片目录同级的 coco.json"),
+    task: Task = typer.Option(Task.det, "--task", "-t", help="[det: 检测框, seg: 多边形, pose: 检测框 + 关键点]"),
+    kpt_dim: int = typer.Option(3, "--kpt_dim", help="YOLO 关键点的字段数 [2: x y, 3: x y v]"),
+    workers: int = typer.Option(os.cpu_count(), "--workers", "-w", help="进程数"),
+    chunk_size: int = typer.Option(64, "--chunk_size", help="每个任务处理的图片数"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, file_name 为相对图片目录的路径"),
+):
+    """将图片目录及其标签导出为一个 COCO json, 没有标签的图片也写入 images"""
+    label_path = label_path or image_path
+    output_path = output_path or image_path.resolve().parent / "coco.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    classes, point_order = load_classes(class_path)
+    if task == Task.pose and not point_order:
+        raise typer.BadParameter("关键点任务需要在 classes.txt 中以空行分隔给出关键点顺序")
+    categories = coco_categories(classes, point_order if task == Task.pose else [])
+
+    pairs = iter_image_label_pairs(image_path, label_path, recursive, label_suffixes=(".json", ".txt"))
+    unknown = set()
+    with (
+        Progress() as progress,
+        ProcessPoolExecutor(max_workers=workers) as executor,
+        CocoWriter(output_path, categories, {"description": image_path.name}) as writer,
+    ):
+        bar = progress.add_task("Exporting COCO...", total=None)
+        batches = bounded_map(executor, load_annotations, chunked(pairs, chunk_size), task, classes, point_order, kpt_dim)
+        for batch, results in batches:
+            for (img_file, rel, _), result in zip(batch, results):
+                if result is None:
+                    typer.echo(f"无法读取图片: {img_file}")
+                    continue
+                width, height, anns, labels = result
+                image_id = writer.add_image(rel.as_posix(), width, height)
+                for ann in anns:
+                    writer.add_annotation(image_id, **ann)
+                unknown.update(labels)
+            progress.update(bar, advance=len(batch))
+
+    if unknown:
+        typer.echo(f"以下类别不在 classes.txt 中, 已忽略: {sorted(unknown)}")
+    typer.echo(f"完成: {writer.num_images} 张图片, {writer.num_annotations} 个标注, 结果保存在 {output_path}")
+
+
+if __name__ == "__main__":
+    cli()
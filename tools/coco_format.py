@@ -0,0 +1,187 @@
+# COCO json 的流式读写, 文件可能有数 GB, 读写时都不会整体载入内存
+#
+# iter_json_arrays 分块读取文本, 顶层对象的各个数组逐个元素用 json.JSONDecoder.raw_decode 解析,
+# 内存占用只与单个元素的大小有关. CocoWriter 逐条写出 images, annotations 先写入临时文件,
+# 结束时拼接在 images 之后, id 由写入器按顺序分配.
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from tools.json_codec import dumps
+
+CHUNK_SIZE = 1 << 20
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _TextStream:
+    """在分块读入的文本上按位置解析 json 值, 缓冲区只保留尚未解析的部分"""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        more = self.f.read(self.chunk_size)
+        if not more:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + more
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白, 返回下一个字符, 文件结束时返回空串"""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise json.JSONDecodeError(f"应为 {char!r}, 实际为 {found!r}", self.buf, self.pos)
+        self.pos += 1
+
+    def value(self) -> tuple[object, str]:
+        """解析一个完整的值, 返回 (值, 原始文本)"""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # 值被分块截断, 读入更多内容后重新解析
+                if self.fill():
+                    continue
+                raise
+            # 数字可能恰好在缓冲区末尾被截断
+            if end == len(self.buf) and self.fill():
+                continue
+            raw = self.buf[self.pos : end]
+            self.pos = end
+            return obj, raw
+
+
+def iter_json_arrays(path, keys: Iterable[str], raw: bool = False, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    流式读取顶层对象, 逐个产出 keys 中各数组的元素 (键, 元素); raw 为 True 时产出 (键, 元素, 原始文本)
+
+    不在 keys 中的数组也逐个元素解析后丢弃, 不会整体读入. keys 中的非数组值作为单个元素产出.
+    """
+    keys = set(keys)
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _TextStream(f, chunk_size)
+        stream.expect("{")
+        while True:
+            char = stream.peek()
+            if char == "}":
+                return
+            if char == ",":
+                stream.pos += 1
+                continue
+            key, _ = stream.value()
+            stream.expect(":")
+            if stream.peek() != "[":
+                obj, text = stream.value()
+                if key in keys:
+                    yield (key, obj, text) if raw else (key, obj)
+                continue
+
+            stream.pos += 1
+            while True:
+                char = stream.peek()
+                if char == "]":
+                    stream.pos += 1
+                    break
+                if char == ",":
+                    stream.pos += 1
+                    continue
+                if not char:
+                    raise json.JSONDecodeError(f"数组 {key} 未结束", stream.buf, stream.pos)
+                obj, text = stream.value()
+                if key in keys:
+                    yield (key, obj, text) if raw else (key, obj)
+
+
+def coco_categories(classes: list, point_order: list) -> list:
+    """classes.txt 的第 i 行对应 category id i + 1, 关键点任务中每个类别都带有关键点名称"""
+    categories = []
+    for i, name in enumerate(classes):
+        category = {"id": i + 1, "name": name, "supercategory": name}
+        if point_order:
+            category["keypoints"] = list(point_order)
+            category["skeleton"] = []
+        categories.append(category)
+    return categories
+
+
+class CocoWriter:
+    """
+    增量写出 COCO json, 分配图片和标注的 id (从 1 开始)
+
+    先写入 <文件名>.tmp, 正常结束时才替换为目标文件, 中途出错不会留下不完整的 json.
+    """
+
+    def __init__(self, path, categories: list, info: Optional[dict] = None):
+        self.path = Path(path)
+        self.categories = categories
+        self.info = info or {}
+        self.num_images = 0
+        self.num_annotations = 0
+        self._tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        self._ann_path = self.path.with_name(f"{self.path.name}.annotations.tmp")
+
+    def __enter__(self):
+        self._out = open(self._tmp_path, "wb")
+        self._anns = open(self._ann_path, "wb+")
+        self._out.write(b'{"info":%s,"licenses":[],"categories":%s,"images":[' % (
+            dumps(self.info, compact=True), dumps(self.categories, compact=True)
+        ))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._out.write(b'],"annotations":[')
+                self._anns.seek(0)
+                shutil.copyfileobj(self._anns, self._out)
+                self._out.write(b"]}\n")
+        finally:
+            self._out.close()
+            self._anns.close()
+            os.remove(self._ann_path)
+        if exc_type is None:
+            os.replace(self._tmp_path, self.path)
+        else:
+            os.remove(self._tmp_path)
+
+    def add_image(self, file_name: str, width: int, height: int) -> int:
+        self.num_images += 1
+        image = {"id": self.num_images, "file_name": file_name, "width": width, "height": height}
+        self._out.write(b"," * (self.num_images > 1) + dumps(image, compact=True))
+        return self.num_images
+
+    def add_annotation(self, image_id: int, category_id: int, bbox, area: float, **fields) -> int:
+        """fields 为 segmentation, keypoints, num_keypoints 等可选字段"""
+        self.num_annotations += 1
+        ann = {
+            "id": self.num_annotations,
+            "image_id": image_id,
+            "category_id": category_id,
+            "bbox": bbox,
+            "area": area,
+            "iscrowd": 0,
+            **fields,
+        }
+        self._anns.write(b"," * (self.num_annotations > 1) + dumps(ann, compact=True))
+        return self.num_annotations
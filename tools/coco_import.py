@@ -0,0 +1,292 @@
+# COCO json 导入为 LabelMe json 或 YOLO txt
+#
+# 数 GB 的 COCO 文件不能用 json.load 整体读入, 这里只读一遍文件 (coco_format.iter_json_arrays 流式解析):
+# images 和 categories 保留在内存中 (每张图片只有文件名和宽高), annotations 按 image_id
+# 分散写入临时目录下的若干分片 (jsonl). 之后逐个分片读回, 按图片分组后交给进程池写出标签,
+# 内存占用只与单个分片的大小有关, 分片数由 --shards 或文件大小决定.
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import typer
+from rich.progress import Progress
+
+from tools.coco_format import iter_json_arrays
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.json_codec import dump_json
+from tools.json_codec import loads
+from tools.label_objects import OutputFormat
+from tools.label_objects import Task
+from tools.utils import bounded_map
+from tools.utils import chunked
+from tools.utils import load_classes
+from tools.yolo_det_to_labelme import DEFAULT_JSON_TEMPLATE
+from tools.yolo_det_to_labelme import rectangle_shape
+from tools.yolo_format import format_yolo_rows
+
+cli = typer.Typer(help="COCO json 导入为 LabelMe / YOLO 标签")
+
+# 未指定分片数时每个分片对应的 COCO 文件大小
+SHARD_BYTES = 64 << 20
+
+
+@dataclass
+class ImportOptions:
+    task: Task
+    output_format: OutputFormat
+    class_index: dict  # category id -> classes.txt 中的下标, 不在其中的类别被忽略
+    names: dict  # category id -> 类别名
+    keypoint_names: dict  # category id -> 关键点名称
+    image_root: Path
+    keep_crowd: bool
+    compact: bool
+
+
+def rle_polygons(segmentation: dict) -> list:
+    """RLE 掩码的外轮廓转为多边形"""
+    import cv2
+
+    from tools.export_masks import rle_to_mask
+
+    mask = rle_to_mask(segmentation).astype(np.uint8)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return [c.reshape(-1, 2).astype(np.float64) for c in contours if len(c) >= 3]
+
+
+def ann_polygons(ann: dict) -> list:
+    segmentation = ann.get("segmentation")
+    if isinstance(segmentation, dict):
+        return rle_polygons(segmentation)
+    return [np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in segmentation or [] if len(p) >= 6]
+
+
+def ann_keypoints(ann: dict, num_kpts: int) -> np.ndarray:
+    kpts = np.zeros((num_kpts, 3))
+    values = np.asarray(ann.get("keypoints") or [], dtype=np.float64).reshape(-1, 3)[:num_kpts]
+    kpts[: len(values)] = values
+    return kpts
+
+
+def yolo_lines(anns: list, opts: ImportOptions, width: int, height: int) -> str:
+    class_ids, values, row_lens = [], [], []
+    scale = np.array([width, height], dtype=np.float64)
+    for ann in anns:
+        class_id = opts.class_index[ann["category_id"]]
+        if opts.task == Task.seg:
+            for polygon in ann_polygons(ann):
+                class_ids.append(class_id)
+                values.append(np.clip(polygon / scale, 0.0, 1.0).ravel())
+                row_lens.append(polygon.size)
+            continue
+
+        x, y, w, h = ann["bbox"]
+        box = np.array([(x + w / 2) / width, (y + h / 2) / height, w / width, h / height])
+        if opts.task == Task.pose:
+            kpts = ann_keypoints(ann, len(opts.keypoint_names.get(ann["category_id"], [])))
+            kpts[:, :2] = np.clip(kpts[:, :2] / scale, 0.0, 1.0)
+            box = np.concatenate((box, kpts.ravel()))
+        class_ids.append(class_id)
+        values.append(np.clip(box, 0.0, None))
+        row_lens.append(len(box))
+    if not class_ids:
+        return ""
+    return format_yolo_rows(class_ids, np.concatenate(values), row_lens)
+
+
+def labelme_shapes(anns: list, opts: ImportOptions) -> list:
+    shapes = []
+    for ann in anns:
+        label = opts.names[ann["category_id"]]
+        if opts.task == Task.seg:
+            for polygon in ann_polygons(ann):
+                shapes.append(
+                    {"label": label, "points": polygon.tolist(), "group_id": None, "shape_type": "polygon", "flags": {}}
+                )
+            continue
+
+        x, y, w, h = ann["bbox"]
+        shapes.append(rectangle_shape(label, x, y, x + w, y + h))
+        if opts.task == Task.pose:
+            names = opts.keypoint_names.get(ann["category_id"], [])
+            for name, (kx, ky, vis) in zip(names, ann_keypoints(ann, len(names)).tolist()):
+                if vis <= 0:
+                    continue
+                shapes.append(
+                    {
+                        "label": name,
+                        "points": [[kx, ky]],
+                        # 与 labelme_to_yolo_pose 一致: group_id 为空表示可见 (2), 否则为可见性
+                        "group_id": None if vis == 2 else int(vis),
+                        "shape_type": "point",
+                        "flags": {},
+                    }
+                )
+    return shapes
+
+
+def write_labels(item, output_path: Path, opts: ImportOptions):
+    """在子进程中写出一张图片的标签, 返回 (写出的标注数, 忽略的 crowd 标注数, 未知类别 id)"""
+    file_name, width, height, anns = item
+    rel = Path(file_name)
+    if rel.is_absolute():
+        rel = Path(rel.name)
+
+    crowd = 0
+    unknown = set()
+    kept = []
+    for ann in anns:
+        if ann.get("iscrowd") and not opts.keep_crowd:
+            crowd += 1
+        elif ann["category_id"] not in opts.class_index:
+            unknown.add(ann["category_id"])
+        else:
+            kept.append(ann)
+
+    out_file = output_path / rel.with_suffix(".txt" if opts.output_format == OutputFormat.yolo else ".json")
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    if opts.output_format == OutputFormat.yolo:
+        with stage("convert"):
+            lines = yolo_lines(kept, opts, width, height)
+        with stage("write", nbytes=len(lines)), open(out_file, "w") as f:
+            f.write(lines)
+    else:
+        with stage("convert"):
+            shapes = labelme_shapes(kept, opts)
+        data = DEFAULT_JSON_TEMPLATE.copy()
+        data.update(
+            {
+                "imagePath": os.path.relpath(opts.image_root / rel, out_file.parent) if opts.image_root else rel.name,
+                "imageWidth": width,
+                "imageHeight": height,
+                "shapes": shapes,
+            }
+        )
+        dump_json(data, out_file, compact=opts.compact)
+    return len(kept), crowd, unknown
+
+
+def write_chunk(items, output_path: Path, opts: ImportOptions):
+    """一个任务写出一批图片, 减少进程间传递的次数"""
+    kept = crowd = 0
+    unknown = set()
+    for item in items:
+        n, c, missing = write_labels(item, output_path, opts)
+        kept += n
+        crowd += c
+        unknown |= missing
+    return kept, crowd, unknown
+
+
+def spill_annotations(coco_path: Path, shard_dir: Path, num_shards: int, progress, bar):
+    """读一遍 COCO 文件, 返回 (images, categories), annotations 按 image_id 写入分片"""
+    images, categories = {}, []
+    shards = [open(shard_dir / f"{i:04d}.jsonl", "wb") for i in range(num_shards)]
+    num_anns = 0
+    try:
+        for key, obj, text in iter_json_arrays(coco_path, ("images", "categories", "annotations"), raw=True):
+            if key == "annotations":
+                # json 字符串中不会出现未转义的换行, 替换后每个标注占一行
+                shards[obj["image_id"] % num_shards].write(text.replace("\n", " ").encode("utf-8") + b"\n")
+                num_anns += 1
+                if num_anns % 4096 == 0:
+                    progress.update(bar, completed=num_anns)
+            elif key == "images":
+                images[obj["id"]] = (obj["file_name"], obj["width"], obj["height"])
+            else:
+                categories.append(obj)
+    finally:
+        for f in shards:
+            f.close()
+    return images, categories
+
+
+def iter_shard_items(shard_dir: Path, num_shards: int, images: dict, written: set):
+    """逐个分片读回标注并按图片分组, 最后产出没有标注的图片"""
+    for i in range(num_shards):
+        groups = {}
+        with open(shard_dir / f"{i:04d}.jsonl", "rb") as f:
+            for line in f:
+                ann = loads(line)
+                groups.setdefault(ann["image_id"], []).append(ann)
+        for image_id, anns in groups.items():
+            if image_id not in images:
+                continue
+            written.add(image_id)
+            yield (*images[image_id], anns)
+    for image_id, image in images.items():
+        if image_id not in written:
+            yield (*image, [])
+
+
+@cli.command()
+@instrumented
+def coco_import(
+    coco_path: Path = typer.Argument(..., help="COCO json"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="标签输出目录, 按 file_name 保留子目录"),
+    output_format: OutputFormat = typer.Option(OutputFormat.yolo, "--format", "-f", help="输出标签格式 [yolo, labelme]"),
+    task: Task = typer.Option(Task.det, "--task", "-t", help="[det: 检测框, seg: 多边形, pose: 检测框 + 关键点]"),
+    class_path: Path = typer.Option(
+        None, "--class_path", "-c", help="按已有 classes.txt 中的类别名确定 YOLO 类别编号, 默认按 category id 排序并写出 classes.txt"
+    ),
+    image_root: Path = typer.Option(None, "--image_root", help="图片目录, LabelMe 的 imagePath 指向其中的图片"),
+    keep_crowd: bool = typer.Option(False, "--keep-crowd", help="保留 iscrowd 标注, 默认忽略"),
+    shards: int = typer.Option(None, "--shards", help=f"标注临时分片数, 默认每 {SHARD_BYTES >> 20} MB 一个分片"),
+    workers: int = typer.Option(os.cpu_count(), "--workers", "-w", help="进程数"),
+    chunk_size: int = typer.Option(256, "--chunk_size", help="每个任务写出的图片数"),
+    compact: bool = typer.Option(False, "--compact", help="json 紧凑输出 (无缩进)"),
+):
+    """流式读取 COCO json, 每张图片写出一个 LabelMe json 或 YOLO txt, 没有标注的图片写出空标签"""
+    output_path = output_path or coco_path.resolve().parent / f"{coco_path.stem}_{output_format.value}"
+    output_path.mkdir(parents=True, exist_ok=True)
+    num_shards = shards or max(1, coco_path.stat().st_size // SHARD_BYTES + 1)
+
+    with Progress() as progress, tempfile.TemporaryDirectory(dir=output_path, prefix=".coco_shards_") as shard_dir:
+        shard_dir = Path(shard_dir)
+        bar = progress.add_task("Reading annotations...", total=None)
+        with stage("spill"):
+            images, categories = spill_annotations(coco_path, shard_dir, num_shards, progress, bar)
+
+        categories.sort(key=lambda c: c["id"])
+        names = {c["id"]: c["name"] for c in categories}
+        keypoint_names = {c["id"]: c.get("keypoints") or [] for c in categories}
+        if class_path:
+            classes, _ = load_classes(class_path)
+            by_name = {name: i for i, name in enumerate(classes)}
+            class_index = {c["id"]: by_name[c["name"]] for c in categories if c["name"] in by_name}
+        else:
+            class_index = {c["id"]: i for i, c in enumerate(categories)}
+            if output_format == OutputFormat.yolo:
+                lines = [c["name"] for c in categories]
+                point_order = next((kpts for kpts in keypoint_names.values() if kpts), [])
+                if task == Task.pose and point_order:
+                    lines += ["", *point_order]
+                (output_path / "classes.txt").write_text("\n".join(lines) + "\n")
+
+        opts = ImportOptions(task, output_format, class_index, names, keypoint_names, image_root, keep_crowd, compact)
+        written = set()
+        counts = {"annotations": 0, "crowd": 0}
+        unknown = set()
+        bar = progress.add_task("Writing labels...", total=len(images))
+        items = iter_shard_items(shard_dir, num_shards, images, written)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk, (kept, crowd, missing) in bounded_map(
+                executor, write_chunk, chunked(items, chunk_size), output_path, opts
+            ):
+                counts["annotations"] += kept
+                counts["crowd"] += crowd
+                unknown.update(missing)
+                progress.update(bar, advance=len(chunk))
+
+    if unknown:
+        typer.echo(f"以下类别不在 classes.txt 中, 已忽略: {sorted(names.get(i, i) for i in unknown)}")
+    if counts["crowd"]:
+        typer.echo(f"忽略 iscrowd 标注 {counts['crowd']} 个, 使用 --keep-crowd 保留")
+    typer.echo(f"完成: {len(images)} 张图片, {counts['annotations']} 个标注, 结果保存在 {output_path}")
+
+
+if __name__ == "__main__":
+    cli()
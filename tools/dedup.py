@@ -0,0 +1,301 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+import typer
+from PIL import Image
+from rich.progress import Progress
+
+from tools.find_unlabeled_data import move_or_copy
+from tools.instrument import instrumented
+from tools.json_codec import dump_json
+from tools.json_codec import load_json
+from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.utils import create_output_directory
+from tools.utils import output_subdir
+from tools.utils import scan_files
+
+cli = typer.Typer(help="近重复图片检测 (感知哈希)")
+
+CACHE_NAME = ".dedup_hash_cache.json"
+GROUPS_NAME = "dedup_groups.json"
+HASH_BITS = 64
+# 多索引哈希中超过 BUCKET_LIMIT 的桶在剩余的位上继续切分, 直到每段不足 MIN_BAND_BITS 位
+BUCKET_LIMIT = 256
+MIN_BAND_BITS = 8
+
+# 每个字节中 1 的个数, 用于批量计算汉明距离
+POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class HashType(str, Enum):
+    dhash = "dhash"
+    phash = "phash"
+
+
+class Action(str, Enum):
+    report = "report"
+    copy = "copy"
+    move = "move"
+    delete = "delete"
+
+
+def dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+
+DCT_32 = dct_matrix(32)
+
+
+def bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash(img: Image.Image) -> int:
+    pixels = np.asarray(img.convert("L").resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    return bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(img: Image.Image) -> int:
+    pixels = np.asarray(img.convert("L").resize((32, 32), Image.Resampling.BILINEAR), dtype=np.float64)
+    low = (DCT_32 @ pixels @ DCT_32.T)[:8, :8]
+    return bits_to_int(low > np.median(low))
+
+
+HASH_FUNCS = {HashType.dhash: dhash, HashType.phash: phash}
+
+
+def hash_chunk(files, hash_type):
+    results = []
+    for file in files:
+        try:
+            with Image.open(file) as img:
+                # JPEG 解码时直接缩小, 避免解码整张大图
+                img.draft("L", (64, 64))
+                results.append((str(file), f"{HASH_FUNCS[hash_type](img):016x}"))
+        except Exception as e:
+            print(f"无法计算哈希 {file.name}: {e}")
+            results.append((str(file), None))
+    return results
+
+
+def popcount64(x: np.ndarray) -> np.ndarray:
+    return POPCOUNT_TABLE[np.ascontiguousarray(x, dtype=np.uint64).view(np.uint8)].reshape(
+        *x.shape, 8
+    ).sum(axis=-1)
+
+
+def union_find(num_nodes: int, pairs: np.ndarray) -> np.ndarray:
+    """向量化的并查集, 返回每个节点所在连通分量的最小下标"""
+    labels = np.arange(num_nodes)
+    if len(pairs) == 0:
+        return labels
+    a, b = pairs[:, 0], pairs[:, 1]
+    while True:
+        m = np.minimum(labels[a], labels[b])
+        new = labels.copy()
+        np.minimum.at(new, a, m)
+        np.minimum.at(new, b, m)
+        new = new[new]
+        while not np.array_equal(new, new[new]):
+            new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+def compact_band(hashes: np.ndarray, shift: int, bits: int) -> np.ndarray:
+    """去掉 [shift, shift + bits) 这一段, 其余的位拼接为更短的哈希"""
+    low = hashes & np.uint64((1 << shift) - 1)
+    if shift + bits >= HASH_BITS:
+        return low
+    return ((hashes >> np.uint64(shift + bits)) << np.uint64(shift)) | low
+
+
+def bucket_pairs(order: np.ndarray, sorted_band: np.ndarray, hashes: np.ndarray, threshold: int) -> list:
+    """
+    比较同一个桶内的元素, 第 k 轮比较桶内相隔 k 的元素, 只保留桶内还有后续元素的位置
+
+    计算量等于桶内的哈希对数, 超过 BUCKET_LIMIT 的桶中每个元素只与之后的 BUCKET_LIMIT 个元素比较.
+    """
+    starts = np.flatnonzero(np.r_[True, sorted_band[1:] != sorted_band[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    # 每个位置之后同一个桶中还有多少个元素
+    remaining = np.repeat(starts + sizes, sizes) - np.arange(len(order)) - 1
+    active = np.flatnonzero(remaining > 0)
+    pairs = []
+    offset = 1
+    while len(active) and offset <= BUCKET_LIMIT:
+        i, j = order[active], order[active + offset]
+        close = popcount64(hashes[i] ^ hashes[j]) <= threshold
+        pairs.append(np.column_stack((i[close], j[close])))
+        offset += 1
+        active = active[remaining[active] >= offset]
+    return pairs
+
+
+def near_duplicate_pairs(hashes: np.ndarray, threshold: int, hash_bits: int = HASH_BITS) -> np.ndarray:
+    """
+    多索引哈希 (multi-index hashing) 查找汉明距离不超过 threshold 的哈希对, hashes 需互不相同
+
+    将 hash_bits 位哈希切成 threshold + 1 段, 由抽屉原理, 距离不超过 threshold 的两个哈希
+    至少有一段完全相同, 因此只需比较同一段取值相同 (同一个桶) 的哈希, 避免两两比较.
+
+    固定机位或视频帧中大量图片落入同一个桶时, 超过 BUCKET_LIMIT 的桶去掉这一段后在剩余的位上
+    递归建立索引. 剩余的位切分后每段不足 MIN_BAND_BITS 位时切分不再有效, 桶内按完整哈希排序,
+    每个元素只与相邻的 BUCKET_LIMIT 个元素比较, 此时可能漏掉少量距离较远的哈希对.
+    返回的哈希对只用于求连通分量, 同一对可能重复出现.
+    """
+    num_bands = threshold + 1
+    band_bits = np.diff(np.linspace(0, hash_bits, num_bands + 1).astype(int))
+    pairs = []
+    shift = hash_bits
+    for bits in band_bits.tolist():
+        shift -= bits
+        band = (hashes >> np.uint64(shift)) & np.uint64((1 << bits) - 1)
+        # 桶内按完整哈希排序, 相邻元素更可能是近重复
+        order = np.lexsort((hashes, band))
+        sorted_band = band[order]
+
+        if (hash_bits - bits) // num_bands >= MIN_BAND_BITS:
+            starts = np.flatnonzero(np.r_[True, sorted_band[1:] != sorted_band[:-1]])
+            sizes = np.diff(np.r_[starts, len(order)])
+            oversized = sizes > BUCKET_LIMIT
+            for start, size in zip(starts[oversized].tolist(), sizes[oversized].tolist()):
+                members = order[start : start + size]
+                sub_hashes = compact_band(hashes[members], shift, bits)
+                pairs.append(members[near_duplicate_pairs(sub_hashes, threshold, hash_bits - bits)])
+            keep = np.repeat(~oversized, sizes)
+            order, sorted_band = order[keep], sorted_band[keep]
+
+        pairs.extend(bucket_pairs(order, sorted_band, hashes, threshold))
+    return np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.int64)
+
+
+def find_clusters(names, hashes: np.ndarray, threshold: int):
+    """返回近重复簇 (至少 2 个元素), 每簇按文件名排序"""
+    unique_hashes, inverse = np.unique(hashes, return_inverse=True)
+    pairs = near_duplicate_pairs(unique_hashes, threshold)
+    labels = union_find(len(unique_hashes), pairs)[inverse.ravel()]
+
+    order = np.lexsort((np.asarray(names, dtype=object).astype(str), labels))
+    sorted_labels = labels[order]
+    bounds = np.flatnonzero(np.diff(sorted_labels)) + 1
+    clusters = []
+    for group in np.split(order, bounds):
+        if len(group) > 1:
+            clusters.append([names[i] for i in group])
+    return clusters
+
+
+def load_groups(groups_file: Path) -> dict[str, int]:
+    """读取 dedup 输出的近重复簇, 返回 {图片相对路径: 簇编号}, 非递归时即为文件名"""
+    clusters = load_json(groups_file)["clusters"]
+    return {name: i for i, cluster in enumerate(clusters) for name in cluster}
+
+
+@cli.command()
+@instrumented
+def dedup(
+    image_path: Path = typer.Argument(..., help="图片目录"),
+    hash_type: HashType = typer.Option(HashType.dhash, "--hash", help="感知哈希算法 [dhash, phash]"),
+    threshold: int = typer.Option(4, "--threshold", "-t", help="汉明距离阈值 (0-63), 不超过该值视为近重复"),
+    action: Action = typer.Option(
+        Action.report, "--action", "-a", help="对重复图片的处理 [report, copy, move, delete], 每簇保留文件名最小的一张"
+    ),
+    label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录, 处理重复图片时一并处理"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    workers: int = typer.Option(os.cpu_count(), "--workers", "-w", help="进程数"),
+    chunk_size: int = typer.Option(500, "--chunk_size", help="每个任务处理的文件数"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 簇中记录相对路径"),
+):
+    """
+    计算图片感知哈希并查找近重复簇
+
+    结果写入输出目录下的 dedup_groups.json, 可通过 splitdata --groups 使同一簇的图片
+    只出现在 train 或 val 其中一个集合中.
+    """
+    img_dir = image_path.resolve()
+    if not img_dir.is_dir():
+        raise ValueError(f"图片路径不存在或不是目录: {img_dir}")
+    if not 0 <= threshold < HASH_BITS:
+        raise typer.BadParameter(f"阈值需在 0-{HASH_BITS - 1} 之间")
+    label_dir = label_path.resolve() if label_path else img_dir
+    output_dir = create_output_directory(output_path, img_dir, "dedup")
+
+    cache_file = img_dir / CACHE_NAME
+    cache = load_json(cache_file) if cache_file.exists() else {}
+
+    image_files = scan_files(img_dir, SUPPORTED_IMAGE_EXTENSIONS, recursive, exclude=(output_dir,))
+    stats, hashes, pending = {}, {}, []
+    for image_file in image_files:
+        st = image_file.stat()
+        stats[str(image_file)] = (st.st_mtime_ns, st.st_size)
+        entry = cache.get(str(image_file))
+        if entry and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size and entry.get(hash_type.value):
+            hashes[str(image_file)] = entry[hash_type.value]
+        else:
+            pending.append(image_file)
+
+    chunks = [pending[i : i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    with Progress() as progress, ProcessPoolExecutor(max_workers=workers) as executor:
+        bar = progress.add_task("Hashing...", total=len(pending))
+        futures = [executor.submit(hash_chunk, chunk, hash_type) for chunk in chunks]
+        for future in futures:
+            results = future.result()
+            for file, value in results:
+                if value is None:
+                    continue
+                hashes[file] = value
+                mtime, size = stats[file]
+                entry = cache.get(file)
+                if not entry or entry["mtime"] != mtime or entry["size"] != size:
+                    entry = {"mtime": mtime, "size": size}
+                entry[hash_type.value] = value
+                cache[file] = entry
+            progress.update(bar, advance=len(results))
+
+    cache = {k: v for k, v in cache.items() if k in stats}
+    dump_json(cache, cache_file, compact=True)
+
+    files = sorted(hashes)
+    values = np.array([int(hashes[f], 16) for f in files], dtype=np.uint64)
+    names = [Path(f).relative_to(img_dir).as_posix() for f in files]
+    clusters = find_clusters(names, values, threshold)
+
+    dump_json(
+        {"hash": hash_type.value, "threshold": threshold, "clusters": clusters},
+        output_dir / GROUPS_NAME,
+    )
+
+    duplicates = [name for cluster in clusters for name in cluster[1:]]
+    if action != Action.report and duplicates:
+        dup_dir = output_dir / "duplicates"
+        dup_dir.mkdir(parents=True, exist_ok=True)
+        for name in duplicates:
+            rel = Path(name)
+            image_file = img_dir / rel
+            label_files = [
+                label_dir / rel.parent / f"{image_file.stem}{ext}"
+                for ext in (".txt", ".json")
+                if (label_dir / rel.parent / f"{image_file.stem}{ext}").exists()
+            ]
+            for file in [image_file] + label_files:
+                if action == Action.delete:
+                    file.unlink()
+                else:
+                    move_or_copy(file, output_subdir(dup_dir, rel), action == Action.copy)
+
+    typer.echo(
+        f"完成: 共 {len(files)} 张图片, {len(clusters)} 个近重复簇, 重复图片 {len(duplicates)} 张, "
+        f"结果保存在 {output_dir / GROUPS_NAME}"
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,289 @@
+# LabelMe 多边形一次性栅格化为掩码, 供语义分割训练和评估直接读取
+#
+# 每个文件在进程池中栅格化为一张实例编号图 (uint16, 0 为背景), 遮挡关系在这一步确定:
+# 默认按面积从大到小绘制, 小目标不会被覆盖的大目标遮住 (--order area); 也可按 LabelMe 中的
+# 顺序绘制, 后面的形状覆盖前面的 (--order file). 相同面积时按文件中的顺序, 结果与运行环境无关.
+#
+# 由实例编号图导出:
+#   rle: 每张图一个 json, 每个实例一条 COCO 压缩 RLE (列优先, 与 pycocotools.mask.decode 兼容),
+#        实例之间互不重叠
+#   png: 调色板 PNG, 像素值为 classes.txt 中的行号 + 1, 0 为背景
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+import typer
+from rich.progress import Progress
+
+from tools.geometry import segment_starts
+from tools.geometry import shoelace_area
+from tools.instrument import instrumented
+from tools.json_codec import dump_json
+from tools.json_codec import load_json
+from tools.utils import bounded_map
+from tools.utils import create_output_directory
+from tools.utils import iter_image_label_pairs
+from tools.utils import load_classes
+from tools.utils import output_subdir
+
+cli = typer.Typer(help="LabelMe 多边形导出为掩码 (COCO RLE / 调色板 PNG)")
+
+MAX_INSTANCES = np.iinfo(np.uint16).max
+
+
+class MaskFormat(str, Enum):
+    rle = "rle"
+    png = "png"
+
+
+class DrawOrder(str, Enum):
+    area = "area"
+    file = "file"
+
+
+@dataclass
+class MaskOptions:
+    mask_format: MaskFormat
+    order: DrawOrder
+    classes: list
+    compact: bool
+
+
+def label_palette(n: int = 256) -> list:
+    """PASCAL VOC 调色板: 类别编号的各位依次分配到 R/G/B 的高位, 相邻类别颜色区分明显"""
+    ids = np.arange(n)
+    rgb = np.zeros((n, 3), dtype=np.int64)
+    for shift in range(7, -1, -1):
+        for channel in range(3):
+            rgb[:, channel] |= ((ids >> channel) & 1) << shift
+        ids = ids >> 3
+    return rgb.ravel().tolist()
+
+
+def shapes_to_polygons(shapes, classes):
+    """返回 (类别编号, 顶点, 每个多边形的顶点数, 未知类别), 矩形转为四边形, 其他形状忽略"""
+    class_index = {name: i for i, name in enumerate(classes)}
+    class_ids, points, ring_lens, unknown = [], [], [], []
+    for shape in shapes:
+        shape_type = shape.get("shape_type") or "polygon"
+        pts = shape["points"]
+        if shape_type == "rectangle" and len(pts) == 2:
+            (x1, y1), (x2, y2) = pts
+            pts = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+        elif shape_type != "polygon" or len(pts) < 3:
+            continue
+        class_id = class_index.get(shape["label"])
+        if class_id is None:
+            unknown.append(shape["label"])
+            continue
+        class_ids.append(class_id)
+        points.extend(pts)
+        ring_lens.append(len(pts))
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return np.asarray(class_ids, dtype=np.int64), points, np.asarray(ring_lens, dtype=np.int64), unknown
+
+
+def rasterize_instances(points, ring_lens, width: int, height: int, order: DrawOrder) -> np.ndarray:
+    """所有多边形绘制到一张实例编号图上, 第 i 个多边形的像素值为 i + 1"""
+    import cv2
+
+    canvas = np.zeros((height, width), dtype=np.uint16)
+    if not len(ring_lens):
+        return canvas
+    starts = segment_starts(ring_lens)
+    if order == DrawOrder.area:
+        areas = shoelace_area(points[:, 0], points[:, 1], starts)
+        # 稳定排序, 面积相同时保持文件中的顺序
+        draw = np.argsort(-areas, kind="stable")
+    else:
+        draw = np.arange(len(ring_lens))
+
+    # 4 位小数精度的定点坐标, 像素中心位于整数坐标
+    fixed = np.round(points * 16).astype(np.int32)
+    for i in draw.tolist():
+        ring = fixed[starts[i] : starts[i] + ring_lens[i]]
+        cv2.fillPoly(canvas, [ring], int(i) + 1, lineType=cv2.LINE_8, shift=4)
+    return canvas
+
+
+def encode_rle_counts(counts) -> str:
+    """COCO 压缩 RLE: 从第 3 个起存与前第二个计数的差, 每 5 位一组按 ASCII 编码 (同 pycocotools rleToString)"""
+    chars = []
+    for i, x in enumerate(counts):
+        if i > 2:
+            x -= counts[i - 2]
+        more = True
+        while more:
+            c = x & 0x1F
+            x >>= 5
+            more = x != -1 if c & 0x10 else x != 0
+            if more:
+                c |= 0x20
+            chars.append(chr(c + 48))
+    return "".join(chars)
+
+
+def decode_rle_counts(s: str) -> list:
+    """encode_rle_counts 的逆过程"""
+    counts, pos = [], 0
+    while pos < len(s):
+        x, k, more = 0, 0, True
+        while more:
+            c = ord(s[pos]) - 48
+            x |= (c & 0x1F) << (5 * k)
+            more = bool(c & 0x20)
+            pos += 1
+            k += 1
+            if not more and c & 0x10:
+                x |= -1 << (5 * k)
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return counts
+
+
+def rle_to_mask(rle: dict) -> np.ndarray:
+    """解码一条 RLE 为 (高, 宽) 的 bool 掩码"""
+    height, width = rle["size"]
+    counts = decode_rle_counts(rle["counts"]) if isinstance(rle["counts"], str) else rle["counts"]
+    values = np.arange(len(counts)) % 2 == 1
+    return np.repeat(values, counts).reshape(width, height).T
+
+
+def instances_to_rle(canvas: np.ndarray, num_instances: int) -> list:
+    """
+    实例编号图按列优先展开后求一次游程, 每个实例的 RLE 由其所在游程的起止位置得到,
+    不需要为每个实例生成单独的掩码
+    """
+    flat = canvas.ravel(order="F")
+    total = flat.size
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    run_starts = np.concatenate(([0], change))
+    run_ends = np.concatenate((change, [total]))
+    run_values = flat[run_starts]
+
+    order = np.argsort(run_values, kind="stable")
+    bounds = np.searchsorted(run_values[order], np.arange(1, num_instances + 2))
+    rles = []
+    for i in range(num_instances):
+        runs = order[bounds[i] : bounds[i + 1]]
+        if not len(runs):
+            rles.append(None)
+            continue
+        # 0 游程与 1 游程交替, 第一个计数为 0 游程的长度 (可以为 0)
+        edges = np.column_stack((run_starts[runs], run_ends[runs])).ravel()
+        counts = np.diff(np.concatenate(([0], edges, [total])))
+        if counts[-1] == 0:
+            counts = counts[:-1]
+        area = int((run_ends[runs] - run_starts[runs]).sum())
+        rles.append((counts.tolist(), area))
+    return rles
+
+
+def export_file(pair, output_path: Path, opts: MaskOptions):
+    """在子进程中执行, 返回 (实例数, 被完全遮挡的实例数, 未知类别), 无法确定图片尺寸时返回 None"""
+    from PIL import Image
+
+    img_file, rel, json_file = pair
+    data = load_json(json_file, skip_image_data=True) if json_file is not None else {}
+    width, height = data.get("imageWidth"), data.get("imageHeight")
+    if not width or not height:
+        try:
+            with Image.open(img_file) as img:
+                width, height = img.size
+        except OSError:
+            return None
+
+    class_ids, points, ring_lens, unknown = shapes_to_polygons(data.get("shapes", []), opts.classes)
+    if len(ring_lens) > MAX_INSTANCES:
+        raise ValueError(f"{json_file}: 实例数超过 {MAX_INSTANCES}")
+    canvas = rasterize_instances(points, ring_lens, width, height, opts.order)
+
+    out_dir = output_subdir(output_path, rel)
+    hidden = 0
+    if opts.mask_format == MaskFormat.png:
+        # 实例编号映射为类别编号 + 1
+        lut = np.concatenate(([0], class_ids + 1)).astype(np.uint8)
+        # putpalette 将灰度图转为调色板模式
+        mask = Image.fromarray(lut[canvas])
+        mask.putpalette(label_palette())
+        mask.save(out_dir / f"{img_file.stem}.png", optimize=True)
+        pixels = np.bincount(canvas.ravel(), minlength=len(ring_lens) + 1)
+        hidden = int(np.count_nonzero(pixels[1:] == 0))
+    else:
+        instances = []
+        for class_id, rle in zip(class_ids.tolist(), instances_to_rle(canvas, len(ring_lens))):
+            if rle is None:
+                hidden += 1
+                continue
+            counts, area = rle
+            instances.append(
+                {
+                    "class_id": class_id,
+                    "label": opts.classes[class_id],
+                    "area": area,
+                    "size": [height, width],
+                    "counts": encode_rle_counts(counts),
+                }
+            )
+        dump_json(
+            {"imagePath": rel.name, "width": width, "height": height, "instances": instances},
+            out_dir / f"{img_file.stem}.json",
+            compact=opts.compact,
+        )
+    return len(ring_lens), hidden, unknown
+
+
+@cli.command()
+@instrumented
+def export_masks(
+    image_path: Path = typer.Argument(..., help="图片目录"),
+    class_path: Path = typer.Argument(..., help="classes.txt, 行号即类别编号"),
+    label_path: Path = typer.Option(None, "--label_path", "-l", help="LabelMe 标签目录"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    mask_format: MaskFormat = typer.Option(
+        MaskFormat.png, "--format", "-f", help="[png: 调色板 PNG, 像素值为类别编号 + 1; rle: 每个实例一条 COCO RLE]"
+    ),
+    order: DrawOrder = typer.Option(
+        DrawOrder.area, "--order", help="重叠时的绘制顺序 [area: 大目标先画, 小目标在上; file: 按标注顺序, 后画的在上]"
+    ),
+    workers: int = typer.Option(os.cpu_count(), "--workers", "-w", help="进程数"),
+    compact: bool = typer.Option(False, "--compact", help="json 紧凑输出 (无缩进)"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
+):
+    """将 LabelMe 多边形/矩形栅格化为掩码, 没有标签的图片输出空掩码"""
+    label_path = label_path or image_path
+    output_path = create_output_directory(output_path, image_path, f"masks_{mask_format.value}")
+    classes, _ = load_classes(class_path)
+    if mask_format == MaskFormat.png and len(classes) > 255:
+        raise typer.BadParameter("调色板 PNG 最多支持 255 个类别, 请使用 --format rle")
+    opts = MaskOptions(mask_format, order, classes, compact)
+
+    pairs = iter_image_label_pairs(image_path, label_path, recursive, label_suffixes=(".json",), exclude=(output_path,))
+    files = instances = hidden = 0
+    unknown = set()
+    with Progress() as progress, ProcessPoolExecutor(max_workers=workers) as executor:
+        bar = progress.add_task("Exporting masks...", total=None)
+        for (img_file, _, _), result in bounded_map(executor, export_file, pairs, output_path, opts):
+            if result is None:
+                typer.echo(f"无法读取图片尺寸: {img_file}")
+            else:
+                files += 1
+                instances += result[0]
+                hidden += result[1]
+                unknown.update(result[2])
+            progress.update(bar, advance=1)
+
+    (output_path / "classes.txt").write_text(class_path.read_text())
+    if unknown:
+        typer.echo(f"以下类别不在 classes.txt 中, 已忽略: {sorted(unknown)}")
+    if hidden:
+        typer.echo(f"{hidden} 个实例被其他实例完全遮挡, 未出现在掩码中")
+    typer.echo(f"完成: {files} 张图片, {instances} 个实例, 结果保存在 {output_path}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,200 @@
+import os
+import random
+import tarfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List
+
+import typer
+from rich.progress import Progress
+
+from tools.instrument import instrumented
+from tools.json_codec import dump_json
+from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.utils import create_output_directory
+from tools.utils import scan_files
+
+cli = typer.Typer(help="图片+标签打包为 tar 分片 (WebDataset 格式)")
+
+LABEL_EXTENSIONS = (".txt", ".json")
+
+
+def find_splits(image_path: Path, label_path: Path) -> dict[str, tuple[Path, Path]]:
+    """
+    识别输入目录结构, 返回 {split: (图片目录, 标签目录)}
+
+    支持 splitdata 的输出结构 (images/<split>, labels/<split>),
+    否则将 image_path/label_path 作为单个 split 处理.
+    """
+    images_root = image_path / "images"
+    labels_root = image_path / "labels"
+    if images_root.is_dir():
+        return {
+            split_dir.name: (split_dir, labels_root / split_dir.name)
+            for split_dir in sorted(images_root.iterdir())
+            if split_dir.is_dir()
+        }
+    return {"all": (image_path, label_path)}
+
+
+def collect_samples(image_dir: Path, label_dir: Path, recursive: bool = False):
+    """返回 [(相对路径 (不含后缀), 文件列表, 各文件大小)], 递归时子目录在 tar 中保留"""
+    samples = []
+    for img_file in scan_files(image_dir, SUPPORTED_IMAGE_EXTENSIONS, recursive):
+        rel = img_file.relative_to(image_dir)
+        files = [img_file]
+        files += [
+            label_dir / rel.parent / f"{img_file.stem}{ext}"
+            for ext in LABEL_EXTENSIONS
+            if (label_dir / rel.parent / f"{img_file.stem}{ext}").exists()
+        ]
+        sizes = [f.stat().st_size for f in files]
+        samples.append((rel.with_suffix("").as_posix(), files, sizes))
+    return samples
+
+
+def blocks(size: int) -> int:
+    """按 512 字节块对齐后的大小"""
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+def member_bytes(name: str, size: int) -> int:
+    """一个成员在 tar 中占用的字节数: 512 字节头 + 按块对齐的数据, 超长文件名另有 GNU LongLink 头和数据块"""
+    nbytes = tarfile.BLOCKSIZE + blocks(size)
+    if len(name.encode("utf-8")) >= tarfile.LENGTH_NAME:
+        nbytes += tarfile.BLOCKSIZE + blocks(len(name.encode("utf-8")) + 1)
+    return nbytes
+
+
+def archive_bytes(members_bytes: int) -> int:
+    """加上结尾的 2 个空块, 并按 tarfile 的记录大小 (10240 字节) 补齐后的文件大小"""
+    return -(-(members_bytes + 2 * tarfile.BLOCKSIZE) // tarfile.RECORDSIZE) * tarfile.RECORDSIZE
+
+
+def plan_shards(samples, max_bytes: int, max_count: int):
+    """按大小和数量上限将样本顺序划分到各个分片, 大小按写入后的 tar 文件计算 (单个样本超过上限时独占一个分片)"""
+    shards, current, current_bytes = [], [], 0
+    for sample in samples:
+        key, files, sizes = sample
+        size = sum(member_bytes(f"{key}{f.suffix.lower()}", n) for f, n in zip(files, sizes))
+        if current and (archive_bytes(current_bytes + size) > max_bytes or len(current) >= max_count):
+            shards.append(current)
+            current, current_bytes = [], 0
+        current.append(sample)
+        current_bytes += size
+    if current:
+        shards.append(current)
+    return shards
+
+
+def sample_key(stem: str) -> str:
+    # WebDataset 以第一个 "." 分割 key 和扩展名
+    return stem.replace(".", "_")
+
+
+def assign_keys(samples):
+    """
+    为每个样本分配唯一的 key, 返回 [(key, 文件列表, 各文件大小)] 和 {key: 原始路径} (仅 key 与原始路径不同的样本)
+
+    "." 替换为 "_" 后可能重名 (a.b 与 a_b), 同目录下同名不同后缀的图片 (a.jpg 与 a.png) 也会得到相同的 key,
+    WebDataset 读取时会把同 key 的成员合并为一个样本, 因此重复的 key 依次添加 _1, _2 ... 后缀.
+    """
+    taken = {sample_key(stem) for stem, _, _ in samples}
+    used, keyed, renamed = set(), [], {}
+    for stem, files, sizes in samples:
+        key = sample_key(stem)
+        if key in used:
+            n = 1
+            while f"{key}_{n}" in taken or f"{key}_{n}" in used:
+                n += 1
+            key = f"{key}_{n}"
+        used.add(key)
+        keyed.append((key, files, sizes))
+        if key != stem:
+            renamed[key] = stem
+    return keyed, renamed
+
+
+def write_shard(shard_file: Path, samples):
+    """写入一个分片, 返回每个成员在 tar 中的 (名称, 数据偏移, 大小)"""
+    members = []
+    with tarfile.open(shard_file, "w", format=tarfile.GNU_FORMAT) as tar:
+        for key, files, _ in samples:
+            for file in files:
+                info = tar.gettarinfo(str(file), arcname=f"{key}{file.suffix.lower()}")
+                info.uid = info.gid = 0
+                info.uname = info.gname = ""
+                with open(file, "rb") as f:
+                    tar.addfile(info, f)
+                # 数据按 512 字节对齐, 写入后 tar.offset 指向数据块末尾
+                padded = -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                members.append((info.name, tar.offset - padded, info.size))
+    return shard_file, len(samples), members
+
+
+@cli.command()
+@instrumented
+def export_shards(
+    image_path: Path = typer.Argument(..., help="图片目录, 或 splitdata 输出目录 (包含 images/ labels/)"),
+    label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    max_size: float = typer.Option(1024, "--max_size", "-s", help="单个分片的大小上限 (MB)"),
+    max_count: int = typer.Option(100000, "--max_count", help="单个分片的样本数上限"),
+    shuffle: bool = typer.Option(True, "--shuffle/--no-shuffle", help="打包前打乱样本顺序"),
+    seed: int = typer.Option(0, "--seed", help="随机种子"),
+    splits: List[str] = typer.Option(None, "--split", help="仅导出指定的 split, 可重复指定"),
+    workers: int = typer.Option(min(8, os.cpu_count() or 1), "--workers", "-w", help="并行写入的分片数"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录"),
+):
+    """
+    将图片和同名标签打包为大小受限的 tar 分片, 训练时顺序读取
+
+    每个 split 输出 <split>-000000.tar ... 以及 <split>.index.json,
+    索引记录每个分片的样本数/大小、每个成员在分片中的偏移, 以及 key 与原始路径不同的样本.
+    """
+    image_path = image_path.resolve()
+    label_path = (label_path or image_path).resolve()
+    output_path = create_output_directory(output_path, image_path, "shards")
+    max_bytes = int(max_size * 1024 * 1024)
+
+    split_dirs = find_splits(image_path, label_path)
+    if splits:
+        split_dirs = {k: v for k, v in split_dirs.items() if k in splits}
+
+    rng = random.Random(seed)
+    for split, (image_dir, label_dir) in split_dirs.items():
+        samples, renamed = assign_keys(collect_samples(image_dir, label_dir, recursive))
+        duplicates = sum(sample_key(stem) != key for key, stem in renamed.items())
+        if duplicates:
+            typer.echo(f"{split}: {duplicates} 个样本的 key 重复, 已添加序号后缀, 原始路径记录在索引的 renamed 中")
+        if shuffle:
+            rng.shuffle(samples)
+        shards = plan_shards(samples, max_bytes, max_count)
+
+        index = {"split": split, "samples": len(samples), "shards": [], "members": [], "renamed": renamed}
+        results = {}
+        with Progress() as progress, ThreadPoolExecutor(max_workers=workers) as executor:
+            bar = progress.add_task(f"Packing {split}...", total=len(samples))
+            futures = {
+                executor.submit(write_shard, output_path / f"{split}-{i:06d}.tar", shard): i
+                for i, shard in enumerate(shards)
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                progress.update(bar, advance=results[futures[future]][1])
+
+        for i in range(len(shards)):
+            shard_file, count, members = results[i]
+            index["shards"].append(
+                {"name": shard_file.name, "samples": count, "bytes": shard_file.stat().st_size}
+            )
+            index["members"].extend([name, i, offset, size] for name, offset, size in members)
+        dump_json(index, output_path / f"{split}.index.json", compact=True)
+
+        typer.echo(f"{split}: {len(samples)} 个样本, {len(shards)} 个分片")
+
+    typer.echo(f"Finished! file saved in {output_path}")
+
+
+if __name__ == "__main__":
+    cli()
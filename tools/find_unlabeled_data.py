@@ -6,8 +6,15 @@ from pathlib import Path
 import typer
 from rich.progress import track
 
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.json_codec import load_json
 from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
 from tools.utils import create_output_directory
+from tools.utils import iter_image_label_pairs
+from tools.utils import output_subdir
+from tools.watch import remove_outputs
+from tools.watch import run_watch
 
 cli = typer.Typer(help="查找未/空标注数据")
 
@@ -20,10 +27,11 @@ class Mode(str, Enum):
 
 def move_or_copy(src_file: Path, dst_path: Path, copy: bool) -> None:
     try:
-        if copy:
-            shutil.copy2(src_file, dst_path)
-        else:
-            shutil.move(src_file, dst_path)
+        with stage("copy" if copy else "move"):
+            if copy:
+                shutil.copy2(src_file, dst_path)
+            else:
+                shutil.move(src_file, dst_path)
     except OSError as e:
         print(f"无法处理 {src_file.name}: {e}")
 
@@ -33,19 +41,19 @@ def is_nolabel_file(label_file: Path) -> bool:
         return True
 
     try:
-        with open(label_file, "r", encoding="utf-8") as f:
-            if label_file.suffix == ".txt":
+        if label_file.suffix == ".txt":
+            with open(label_file, "r", encoding="utf-8") as f:
                 lines = [line.strip() for line in f if line.strip()]
-                if not lines:
-                    return True
-                # 每行应至少有5个字段（class + 4 coords）
-                return any(len(line.split()) < 5 for line in lines)
-
-            elif label_file.suffix == ".json":
-                data = json.load(f)
-                # 支持常见 YOLO-JSON 或 LabelMe 格式
-                shapes = data.get("shapes", [])
-                return not shapes
+            if not lines:
+                return True
+            # 每行应至少有5个字段（class + 4 coords）
+            return any(len(line.split()) < 5 for line in lines)
+
+        elif label_file.suffix == ".json":
+            data = load_json(label_file, skip_image_data=True)
+            # 支持常见 YOLO-JSON 或 LabelMe 格式
+            shapes = data.get("shapes", [])
+            return not shapes
     except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
         print(f"无法解析标签文件 {label_file}: {e}")
         return True  # 视为无效
@@ -54,6 +62,7 @@ def is_nolabel_file(label_file: Path) -> bool:
 
 
 @cli.command()
+@instrumented
 def process_data(
     image_path: Path = typer.Argument(..., help="图片目录"),
     label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录"),
@@ -65,6 +74,12 @@ def process_data(
         "-m",
         help="处理模式 [single: 没有标签文件, nolabel: 空标签文件, all: 同时两种]",
     ),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
+    watch: bool = typer.Option(
+        False, "--watch", help="处理后持续监视图片/标签目录, 只检查变化的文件 (Ctrl+C 退出); 复制模式下补上标签的图片会从输出中删除"
+    ),
+    debounce: float = typer.Option(0.5, "--debounce", help="监视模式下合并连续保存的等待时间 (秒)"),
+    poll: bool = typer.Option(False, "--poll", help="监视模式下使用 mtime 轮询代替 inotify (如网络文件系统)"),
 ):
     img_dir = image_path.resolve()
     label_dir = label_path.resolve() if label_path else img_dir
@@ -84,43 +99,52 @@ def process_data(
             output_path, img_dir, "find_nolabel"
         )
 
-    image_files = [
-        f
-        for f in img_dir.iterdir()
-        if f.is_file() and f.suffix.lower() in SUPPORTED_IMAGE_EXTENSIONS
-    ]
-
-    processed = 0
-    for img_file in track(image_files, description="Processing images..."):
-        stem = img_file.stem
-        txt_label = label_dir / f"{stem}.txt"
-        json_label = label_dir / f"{stem}.json"
-
-        has_txt = txt_label.exists()
-        has_json = json_label.exists()
-
-        # 情况1: 无任何标签文件
-        if not (has_txt or has_json):
-            if output_paths["single"]:
-                move_or_copy(img_file, output_paths["single"], copy)
-                processed += 1
-            continue
-
-        # 情况2: 有标签但为空/无效
-        label_file = txt_label if has_txt else json_label
-        if is_nolabel_file(label_file):
-            if output_paths["nolabel"]:
-                move_or_copy(img_file, output_paths["nolabel"], copy)
-                move_or_copy(label_file, output_paths["nolabel"], copy)
-                processed += 1
+    checked, processed = 0, 0
+
+    def remove(key):
+        # 只清理复制的文件, 移动模式下输出目录中的是唯一的一份
+        if copy:
+            for out_dir in output_paths.values():
+                remove_outputs(out_dir, key, (".txt", ".json", *SUPPORTED_IMAGE_EXTENSIONS))
+
+    def process(pairs, changed_images=None):
+        nonlocal checked, processed
+        for img_file, rel, label_file in track(pairs, description="Processing images..."):
+            checked += 1
+            if changed_images is not None:
+                # 监视模式下重新检查, 先清除上次的结果
+                remove(rel.with_suffix(""))
+
+            # 情况1: 无任何标签文件
+            if label_file is None:
+                if output_paths.get("single"):
+                    move_or_copy(img_file, output_subdir(output_paths["single"], rel), copy)
+                    processed += 1
+                continue
+
+            # 情况2: 有标签但为空/无效
+            if is_nolabel_file(label_file):
+                if output_paths.get("nolabel"):
+                    out_dir = output_subdir(output_paths["nolabel"], rel)
+                    move_or_copy(img_file, out_dir, copy)
+                    move_or_copy(label_file, out_dir, copy)
+                    processed += 1
+
+    if watch:
+        run_watch(
+            img_dir, label_dir, (".txt", ".json"), recursive, process, remove,
+            exclude=output_paths.values(), debounce=debounce, poll=poll,
+        )
+    else:
+        process(iter_image_label_pairs(img_dir, label_dir, recursive, exclude=output_paths.values()))
 
     # 清理空输出目录
-    for out_dir in [output_paths["single"], output_paths["nolabel"]]:
+    for out_dir in output_paths.values():
         if out_dir and out_dir.exists():
             if not any(out_dir.iterdir()):
                 shutil.rmtree(out_dir)
 
-    typer.echo(f"处理完成: 共检查 {len(image_files)} 张图像, 操作 {processed} 张图片")
+    typer.echo(f"处理完成: 共检查 {checked} 张图像, 操作 {processed} 张图片")
 
 
 if __name__ == "__main__":
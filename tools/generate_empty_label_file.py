@@ -1,5 +1,4 @@
 import copy
-import json
 from enum import Enum
 from pathlib import Path
 
@@ -7,7 +6,10 @@ import typer
 from PIL import Image
 from rich.progress import track
 
+from tools.instrument import instrumented
+from tools.json_codec import dump_json
 from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.utils import scan_files
 
 cli = typer.Typer(help="生成空标签文件，支持 txt/json 格式")
 
@@ -28,27 +30,28 @@ class LabelType(str, Enum):
 
 
 @cli.command()
+@instrumented
 def generate_empty_file(
     path: Path = typer.Argument(..., help="图片存放目录"),
     file_type: LabelType = typer.Argument(
         LabelType.txt, help="要生成的标签文件类型 [txt, json]"
     ),
+    compact: bool = typer.Option(False, "--compact", help="json 紧凑输出 (无缩进)"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录"),
 ):
     for img_file in track(
-        path.iterdir(), description="Generating empty label files..."
+        scan_files(path, SUPPORTED_IMAGE_EXTENSIONS, recursive),
+        description="Generating empty label files...",
     ):
-        if img_file.suffix.lower() not in SUPPORTED_IMAGE_EXTENSIONS:
-            continue
-        filename = Path(img_file.parent) / f"{img_file.stem}.{file_type}"
+        filename = Path(img_file.parent) / f"{img_file.stem}.{file_type.value}"
 
         if file_type == "json":
-            with open(filename, "w") as f:
-                img = Image.open(img_file)
-                data = copy.deepcopy(JSON_FORMAT)
-                data["imagePath"] = img_file.name
-                data["imageHeight"] = img.height
-                data["imageWidth"] = img.width
-                json.dump(data, f, indent=4)
+            img = Image.open(img_file)
+            data = copy.deepcopy(JSON_FORMAT)
+            data["imagePath"] = img_file.name
+            data["imageHeight"] = img.height
+            data["imageWidth"] = img.width
+            dump_json(data, filename, compact=compact)
         else:
             with open(filename, "w") as f:
                 pass
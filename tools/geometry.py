@@ -0,0 +1,139 @@
+import numpy as np
+
+
+def segment_starts(lens):
+    lens = np.asarray(lens, dtype=np.int64)
+    return np.cumsum(lens) - lens
+
+
+def shoelace_area(xs, ys, seg_starts):
+    """按段计算多边形面积, xs/ys 为扁平坐标, seg_starts 为每个多边形的起始下标"""
+    seg_lens = np.diff(np.append(seg_starts, len(xs)))
+    local = np.arange(len(xs)) - np.repeat(seg_starts, seg_lens)
+    nxt = np.repeat(seg_starts, seg_lens) + (local + 1) % np.repeat(seg_lens, seg_lens)
+    cross = xs * ys[nxt] - xs[nxt] * ys
+    return 0.5 * np.abs(np.add.reduceat(cross, seg_starts))
+
+
+def point_segment_distance(points, a, b):
+    """点到线段的距离, 三个参数均为 (N, 2)"""
+    ab = b - a
+    ap = points - a
+    denom = np.einsum("ij,ij->i", ab, ab)
+    t = np.divide(np.einsum("ij,ij->i", ap, ab), denom, out=np.zeros(len(points)), where=denom > 0)
+    proj = a + np.clip(t, 0.0, 1.0)[:, None] * ab
+    return np.hypot(*(points - proj).T)
+
+
+def simplify_polygons(points, ring_lens, tolerance, max_vertices=None):
+    """
+    Douglas-Peucker 多边形简化
+
+    所有多边形首尾相接拼成一个数组, 按层迭代, 每一层对所有线段同时求最远点,
+    距离超过阈值的最远点加入保留集合, 直到没有新的点加入.
+
+    Args:
+        points: (N, 2) 所有多边形的顶点 (像素坐标)
+        ring_lens: 每个多边形的顶点数
+        tolerance: 距离阈值 (像素)
+        max_vertices: 每个多边形最多保留的顶点数, 超出时优先保留距离大的点
+
+    Returns:
+        (N,) bool, 需要保留的顶点
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    ring_lens = np.asarray(ring_lens, dtype=np.int64)
+    num_rings = len(ring_lens)
+    if num_rings == 0:
+        return np.ones(0, dtype=bool)
+    if max_vertices is not None:
+        max_vertices = max(int(max_vertices), 3)
+
+    # 每个多边形末尾补上首点, 闭合后的折线首尾都是锚点
+    ext_lens = ring_lens + 1
+    ext_starts = segment_starts(ext_lens)
+    ring_of = np.repeat(np.arange(num_rings), ext_lens)
+    orig_of = np.arange(ext_lens.sum()) - ring_of
+    closing = ext_starts + ring_lens
+    orig_of[closing] = orig_of[ext_starts]
+    ext = points[orig_of]
+
+    kept = np.zeros(len(ext), dtype=bool)
+    kept[ext_starts] = True
+    kept[closing] = True
+
+    # 顶点过少的多边形不做简化
+    small = ring_lens <= 3
+    kept[np.isin(ring_of, np.flatnonzero(small))] = True
+
+    # 第三个锚点取离首点最远的点
+    d0 = np.hypot(*(ext - ext[ext_starts[ring_of]]).T)
+    d0[kept] = -1
+    ring_max = np.maximum.reduceat(d0, ext_starts)
+    far = np.flatnonzero((d0 == ring_max[ring_of]) & (d0 > 0))
+    _, first = np.unique(ring_of[far], return_index=True)
+    kept[far[first]] = True
+
+    positions = np.arange(len(ext))
+    while True:
+        kidx = np.flatnonzero(kept)
+        seg_of = np.searchsorted(kidx, positions, side="right") - 1
+        a = ext[kidx[seg_of]]
+        b = ext[kidx[np.minimum(seg_of + 1, len(kidx) - 1)]]
+        d = point_segment_distance(ext, a, b)
+        d[kept] = -1
+
+        seg_max = np.maximum.reduceat(d, kidx)
+        cand = np.flatnonzero((d > tolerance) & (d == seg_max[seg_of]))
+        _, first = np.unique(seg_of[cand], return_index=True)
+        cand = cand[first]
+
+        if max_vertices is not None and len(cand):
+            # 闭合点与首点重复, 不计入顶点数
+            remaining = max_vertices - (np.add.reduceat(kept, ext_starts) - 1)
+            order = np.lexsort((-d[cand], ring_of[cand]))
+            cand = cand[order]
+            cand_rings = ring_of[cand]
+            rank = np.arange(len(cand)) - np.searchsorted(cand_rings, cand_rings)
+            cand = cand[rank < remaining[cand_rings]]
+
+        if len(cand) == 0:
+            break
+        kept[cand] = True
+
+    kept[closing] = False
+    return kept[~np.isin(positions, closing)]
+
+
+def assign_points_to_boxes(points, boxes, chunk_size=4096):
+    """
+    将每个点分配给包含它的面积最小的框, 面积相同时取下标小的框
+
+    Args:
+        points: (P, 2) 点坐标
+        boxes: (B, 4) xyxy, 两个角点顺序任意
+    Returns:
+        (P,) 所属框的下标, 不在任何框内为 -1
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    owner = np.full(len(points), -1, dtype=np.int64)
+    if len(points) == 0 or len(boxes) == 0:
+        return owner
+
+    x_min = np.minimum(boxes[:, 0], boxes[:, 2])
+    x_max = np.maximum(boxes[:, 0], boxes[:, 2])
+    y_min = np.minimum(boxes[:, 1], boxes[:, 3])
+    y_max = np.maximum(boxes[:, 1], boxes[:, 3])
+    area = (x_max - x_min) * (y_max - y_min)
+
+    # 分块计算 (点 x 框) 的包含矩阵, 避免点和框都很多时占用过多内存
+    for start in range(0, len(points), chunk_size):
+        x = points[start : start + chunk_size, 0, None]
+        y = points[start : start + chunk_size, 1, None]
+        inside = (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+        # argmin 返回第一个最小值, 面积相同时即为下标小的框
+        best = np.argmin(np.where(inside, area, np.inf), axis=1)
+        owner[start : start + chunk_size] = np.where(inside.any(axis=1), best, -1)
+
+    return owner
@@ -1,12 +1,17 @@
 import asyncio
 import cv2
+import json
 import requests
 from requests.auth import HTTPDigestAuth
 from datetime import datetime
 import os
 import schedule
+import shutil
+import socket
 import time
 import concurrent.futures
+import multiprocessing
+from multiprocessing import shared_memory
 
 # 配置项（集中管理常量，便于维护）
 CONFIG = {
@@ -15,7 +20,20 @@ CONFIG = {
     "PTZ_TIMEOUT": 5,
     "CAPTURE_TIMEOUT": 5,
     "PTZ_WAIT": 2,
-    "MAX_WORKERS": 10,
+    # 抓拍按摄像头分组交给进程池, 每个进程用线程并发处理 CAMERAS_PER_PROCESS 个摄像头,
+    # RTSP 解码和 JPEG 编码在子进程中完成, 编码后的图片经共享内存传回, 超过 FRAME_SLOT_BYTES 的随结果返回
+    "CAPTURE_PROCESSES": os.cpu_count(),
+    "CAMERAS_PER_PROCESS": 8,
+    "FRAME_SLOT_BYTES": 8 << 20,
+    # 健康检查: 抓拍前先探测 HTTP/RTSP 端口, 不可达的摄像头不占用抓拍线程
+    "PROBE_PORTS": (80, 554),
+    "PROBE_TIMEOUT": 1,
+    "PROBE_WORKERS": 64,
+    # 断路器: 连续失败 FAILURE_THRESHOLD 次后跳过该摄像头, 冷却时间从 BACKOFF_BASE 秒起每次失败翻倍, 最长 BACKOFF_MAX 秒
+    "FAILURE_THRESHOLD": 3,
+    "BACKOFF_BASE": 1800,
+    "BACKOFF_MAX": 6 * 3600,
+    "HEALTH_FILE": "camera_health.json",
     "IP_LIST": [f"192.168.180.{i}" for i in range(0, 1)],
     "CRON_TIMES": [":20", ":50"]
 }
@@ -40,11 +58,58 @@ def control_ptz(ip, channel=1, preset=1):
         print(f"PTZ调用异常: {ip} - {str(e)}")
         return False
 
+def load_health(path):
+    """读取摄像头健康状态, 文件不存在或损坏时从空状态开始"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_health(path, health):
+    """先写临时文件再替换, 写入中断不会损坏状态文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(health, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def is_available(health, ip, now):
+    """断路器打开时在冷却期内跳过该摄像头, 冷却结束后放行一次试探"""
+    return now >= health.get(ip, {}).get("retry_at", 0)
+
+def record_result(health, ip, success, error, now):
+    """更新连续失败次数, 达到阈值后按指数退避设置下次重试时间"""
+    state = health.setdefault(ip, {"failures": 0, "retry_at": 0})
+    if success:
+        state.update(failures=0, retry_at=0, last_success=datetime.fromtimestamp(now).isoformat(timespec="seconds"))
+        state.pop("last_error", None)
+        return
+    state["failures"] += 1
+    state["last_error"] = error
+    exceeded = state["failures"] - CONFIG["FAILURE_THRESHOLD"]
+    if exceeded >= 0:
+        cooldown = min(CONFIG["BACKOFF_BASE"] * 2 ** exceeded, CONFIG["BACKOFF_MAX"])
+        state["retry_at"] = now + cooldown
+        print(f"断路器打开: {ip} 连续失败 {state['failures']} 次, {cooldown} 秒内跳过")
+
+def probe_camera(ip):
+    """TCP 连接 PTZ 和 RTSP 端口, 只需 PROBE_TIMEOUT 秒就能发现离线的摄像头"""
+    for port in CONFIG["PROBE_PORTS"]:
+        try:
+            with socket.create_connection((ip, port), timeout=CONFIG["PROBE_TIMEOUT"]):
+                pass
+        except OSError as e:
+            return f"端口 {port} 不可达: {e}"
+    return None
+
 def capture_camera(ip):
-    """捕获单个摄像头图像（精简逻辑，合并重复判断）"""
+    """调用预置点并读取一帧编码为 JPEG, 返回 (图片字节, 错误信息, 各阶段耗时)"""
+    timings = {}
     # 1. 调用预置点
+    start_time = time.time()
     if not control_ptz(ip):
-        return False
+        return None, "预置点调用失败", timings
+    timings["ptz"] = time.time() - start_time
 
     # 2. 等待摄像头到位
     time.sleep(CONFIG["PTZ_WAIT"])
@@ -60,44 +125,160 @@ def capture_camera(ip):
             ret, frame = cap.read()
             if not ret:
                 time.sleep(0.1)
+        cap.release()
+        timings["read"] = time.time() - start_time
 
-        # 保存图片
-        if ret and frame is not None:
-            filename = f"{ip}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]}.jpg"
-            cv2.imwrite(os.path.join(CONFIG["IMG_DIR"], filename), frame)
-            print(f"图片保存成功: {filename}")
-            cap.release()
-            return True
+        if not ret or frame is None:
+            return None, "无法读取图像", timings
 
-        print(f"无法读取图像: {ip}")
-        cap.release()
-        return False
+        start_time = time.time()
+        ok, buf = cv2.imencode(".jpg", frame)
+        timings["encode"] = time.time() - start_time
+        if not ok:
+            return None, "图像编码失败", timings
+        return buf.tobytes(), None, timings
 
     except Exception as e:
-        print(f"捕获图像异常: {ip} - {str(e)}")
-        return False
+        return None, f"捕获图像异常: {e}", timings
+
+def capture_shard(shm_name, ip_list, slot_bytes):
+    """子进程: 并发抓拍一组摄像头, 第 i 个摄像头的 JPEG 写入共享内存的第 i 个槽, 只返回长度和统计信息"""
+    # 共享内存由主进程创建和释放, 子进程不注册到 resource_tracker; 没有共享内存时图片随结果返回
+    shm = shared_memory.SharedMemory(name=shm_name, track=False) if shm_name else None
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(ip_list)) as executor:
+            outcomes = list(executor.map(capture_camera, ip_list))
+        results = []
+        for i, (data, error, timings) in enumerate(outcomes):
+            if data is not None and shm is not None and len(data) <= slot_bytes:
+                shm.buf[i * slot_bytes : i * slot_bytes + len(data)] = data
+                results.append((len(data), None, error, timings))
+            else:
+                results.append((len(data) if data is not None else 0, data, error, timings))
+        return results
+    finally:
+        if shm is not None:
+            shm.close()
+
+def save_image(ip, data):
+    """data 可以是共享内存的 memoryview, 直接写入文件而不复制"""
+    filename = f"{ip}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]}.jpg"
+    with open(os.path.join(CONFIG["IMG_DIR"], filename), "wb") as f:
+        f.write(data)
+    print(f"图片保存成功: {filename}")
+
+async def capture_shards(ip_list):
+    """将摄像头分组提交到进程池, 从共享内存取回图片并保存, 返回 {ip: 错误信息} 和汇总统计, 成功时错误信息为 None"""
+    loop = asyncio.get_running_loop()
+    slot_bytes = CONFIG["FRAME_SLOT_BYTES"]
+    size = CONFIG["CAMERAS_PER_PROCESS"]
+    shards = [ip_list[i : i + size] for i in range(0, len(ip_list), size)]
+    errors = {}
+    stats = {"bytes": 0, "inline": 0, "ptz": 0.0, "read": 0.0, "encode": 0.0}
+    if not shards:
+        return errors, stats
+
+    max_workers = min(CONFIG["CAPTURE_PROCESSES"], len(shards))
+    # 同时运行的分组数不超过进程数, 每组的共享内存在开始时创建、保存完图片后立即释放,
+    # /dev/shm 中最多只有 max_workers 组图片
+    running = asyncio.Semaphore(max_workers)
+    blocks = set()
+
+    def release(shm):
+        blocks.discard(shm)
+        shm.close()
+        shm.unlink()
+
+    async def run_shard(executor, shard):
+        async with running:
+            block_size = len(shard) * slot_bytes
+            shm = None
+            # /dev/shm 剩余空间不足一组的槽时 (如 Docker 默认 64 MB) 子进程写入会因 SIGBUS 退出, 改为随结果返回图片
+            if not os.path.isdir("/dev/shm") or shutil.disk_usage("/dev/shm").free >= block_size:
+                shm = shared_memory.SharedMemory(create=True, size=block_size)
+                blocks.add(shm)
+            try:
+                try:
+                    shm_name = shm.name if shm is not None else None
+                    results = await loop.run_in_executor(executor, capture_shard, shm_name, shard, slot_bytes)
+                except Exception as e:
+                    # 整个分组的进程异常退出时, 该组摄像头都记为失败
+                    errors.update((ip, f"抓拍进程异常: {e}") for ip in shard)
+                    return
+                for i, (ip, (nbytes, data, error, timings)) in enumerate(zip(shard, results)):
+                    for key, seconds in timings.items():
+                        stats[key] += seconds
+                    if error:
+                        errors[ip] = error
+                        continue
+                    if data is None:
+                        # 写完后立即释放视图, 否则共享内存无法关闭
+                        with shm.buf[i * slot_bytes : i * slot_bytes + nbytes] as view:
+                            save_image(ip, view)
+                    else:
+                        stats["inline"] += 1
+                        save_image(ip, data)
+                    stats["bytes"] += nbytes
+                    errors[ip] = None
+            finally:
+                if shm is not None:
+                    release(shm)
+
+    # OpenCV 和线程在 fork 后可能死锁, 子进程使用 spawn 启动
+    context = multiprocessing.get_context("spawn")
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            await asyncio.gather(*[run_shard(executor, shard) for shard in shards])
+    finally:
+        # 正常情况下每组结束时已释放, 这里只处理异常中断时遗留的共享内存
+        for shm in list(blocks):
+            release(shm)
+    return errors, stats
 
 async def capture_all_cameras(ip_list):
-    """异步并行捕获所有摄像头（精简任务创建和结果统计）"""
+    """多进程并行捕获所有摄像头, 跳过断路器打开的摄像头, 端口探测通过后才交给抓拍进程"""
     loop = asyncio.get_running_loop()
     success_count = 0
+    now = time.time()
+    health = load_health(CONFIG["HEALTH_FILE"])
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=CONFIG["MAX_WORKERS"]) as executor:
-        # 批量创建任务并执行
-        tasks = [loop.run_in_executor(executor, capture_camera, ip) for ip in ip_list]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # 统计结果
-        for ip, result in zip(ip_list, results):
-            if isinstance(result, Exception):
-                print(f"处理失败: {ip} - {result}")
-            elif result:
-                success_count += 1
-                print(f"处理成功: {ip}")
-            else:
-                print(f"处理失败: {ip}")
+    candidates = [ip for ip in ip_list if is_available(health, ip, now)]
+    skipped = len(ip_list) - len(candidates)
+    if skipped:
+        print(f"跳过 {skipped} 个断路器打开的摄像头")
+
+    # 1. 并发探测端口, 离线的摄像头直接记为失败
+    with concurrent.futures.ThreadPoolExecutor(max_workers=CONFIG["PROBE_WORKERS"]) as executor:
+        probes = await asyncio.gather(*[loop.run_in_executor(executor, probe_camera, ip) for ip in candidates])
+    alive = []
+    for ip, error in zip(candidates, probes):
+        if error:
+            print(f"探测失败: {ip} - {error}")
+            record_result(health, ip, False, error, now)
+        else:
+            alive.append(ip)
 
-    print(f"任务完成: 成功 {success_count}/{len(ip_list)}")
+    # 2. 只对在线的摄像头调用预置点并抓拍
+    errors, stats = await capture_shards(alive)
+
+    # 统计结果
+    for ip in alive:
+        error = errors.get(ip, "没有返回结果")
+        if error is None:
+            success_count += 1
+            print(f"处理成功: {ip}")
+        else:
+            print(f"处理失败: {ip} - {error}")
+        record_result(health, ip, error is None, error, now)
+
+    save_health(CONFIG["HEALTH_FILE"], health)
+    print(f"任务完成: 成功 {success_count}/{len(ip_list)} (跳过 {skipped}, 离线 {len(candidates) - len(alive)})")
+    if alive:
+        print(
+            f"抓拍统计: {len(alive)} 个摄像头, 平均预置点 {stats['ptz'] / len(alive):.2f}s, "
+            f"读取 {stats['read'] / len(alive):.2f}s, 编码 {stats['encode'] / len(alive):.3f}s, "
+            f"图片共 {stats['bytes'] / 1024 / 1024:.1f} MB (超出共享内存槽 {stats['inline']} 张)"
+        )
     return success_count
 
 def run_capture_task():
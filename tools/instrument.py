@@ -0,0 +1,189 @@
+# 各工具共用的性能分析选项
+#
+#   --profile PATH       cProfile 结果保存为 pstats 文件, 并打印耗时最多的函数
+#   --trace-stages       统计各阶段 (list/read/parse/convert/write/copy/image) 的耗时、次数和字节数
+#   --metrics-out PATH   将阶段统计和总耗时保存为 json
+#
+# 用法: 在 @cli.command() 下加 @instrumented, 在热点处用 stage() 计时.
+# 未开启统计时 stage() 返回同一个空对象, 开销只有一次函数调用.
+# 统计只在主进程中进行, 进程池中执行的部分计入提交/收集结果所在的阶段.
+import cProfile
+import functools
+import inspect
+import pstats
+import sys
+import threading
+import time
+from pathlib import Path
+
+import typer
+
+
+class Stage:
+    __slots__ = ("tracer", "name", "count", "nbytes", "start")
+
+    def __init__(self, tracer, name, count, nbytes):
+        self.tracer = tracer
+        self.name = name
+        self.count = count
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, time.perf_counter() - self.start, self.count, self.nbytes)
+        return False
+
+
+class NullStage:
+    """未开启统计时使用, 允许在 with 块中设置 nbytes/count 而不产生任何效果"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Tracer:
+    def __init__(self):
+        self.stages = {}
+        # 多线程的工具 (如 pipeline) 会在不同线程中同时累加
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, count=1, nbytes=0):
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                entry = self.stages[name] = [0.0, 0, 0]
+            entry[0] += seconds
+            entry[1] += count
+            entry[2] += nbytes
+
+    def summary(self):
+        return {
+            name: {"seconds": seconds, "count": count, "bytes": nbytes}
+            for name, (seconds, count, nbytes) in sorted(self.stages.items(), key=lambda kv: -kv[1][0])
+        }
+
+
+_tracer = None
+
+
+def stage(name: str, count: int = 1, nbytes: int = 0):
+    """
+    阶段计时, with 块结束时累加到当前统计中
+
+        with stage("read") as s:
+            data = f.read()
+            s.nbytes = len(data)
+    """
+    if _tracer is None:
+        return NULL_STAGE
+    return Stage(_tracer, name, count, nbytes)
+
+
+def tracing() -> bool:
+    return _tracer is not None
+
+
+def print_stages(tracer: Tracer, wall_time: float):
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title=f"阶段耗时 (总耗时 {wall_time:.3f}s)")
+    for column in ("阶段", "耗时 (s)", "占比", "次数", "字节数"):
+        table.add_column(column, justify="left" if column == "阶段" else "right")
+    for name, s in tracer.summary().items():
+        table.add_row(
+            name,
+            f"{s['seconds']:.3f}",
+            f"{s['seconds'] / wall_time:.1%}" if wall_time else "-",
+            str(s["count"]),
+            str(s["bytes"]),
+        )
+    Console(stderr=True).print(table)
+
+
+def run_instrumented(func, args, kwargs, profile, trace_stages, metrics_out):
+    global _tracer
+    if not (profile or trace_stages or metrics_out):
+        return func(*args, **kwargs)
+
+    tracer = Tracer() if (trace_stages or metrics_out) else None
+    profiler = cProfile.Profile() if profile else None
+    _tracer = tracer
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if profiler:
+            profiler.disable()
+        wall_time = time.perf_counter() - start
+        _tracer = None
+
+        if profiler:
+            profiler.dump_stats(profile)
+            stats = pstats.Stats(profiler, stream=sys.stderr)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(20)
+            print(f"cProfile 结果保存在 {profile}", file=sys.stderr)
+        if trace_stages:
+            print_stages(tracer, wall_time)
+        if metrics_out:
+            from tools.json_codec import dump_json
+
+            dump_json(
+                {
+                    "command": func.__name__,
+                    "argv": sys.argv[1:],
+                    "wall_time": wall_time,
+                    "stages": tracer.summary(),
+                },
+                metrics_out,
+            )
+
+
+INSTRUMENT_PARAMS = [
+    inspect.Parameter(
+        "profile",
+        inspect.Parameter.KEYWORD_ONLY,
+        default=typer.Option(None, "--profile", help="cProfile 结果保存路径 (pstats 格式)"),
+        annotation=Path,
+    ),
+    inspect.Parameter(
+        "trace_stages",
+        inspect.Parameter.KEYWORD_ONLY,
+        default=typer.Option(False, "--trace-stages", help="统计各阶段耗时/次数/字节数"),
+        annotation=bool,
+    ),
+    inspect.Parameter(
+        "metrics_out",
+        inspect.Parameter.KEYWORD_ONLY,
+        default=typer.Option(None, "--metrics-out", help="阶段统计保存为 json"),
+        annotation=Path,
+    ),
+]
+
+
+def instrumented(func):
+    """为 typer 命令添加 --profile / --trace-stages / --metrics-out 选项"""
+    sig = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, profile=None, trace_stages=False, metrics_out=None, **kwargs):
+        return run_instrumented(func, args, kwargs, profile, trace_stages, metrics_out)
+
+    wrapper.__signature__ = sig.replace(parameters=[*sig.parameters.values(), *INSTRUMENT_PARAMS])
+    return wrapper
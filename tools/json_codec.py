@@ -0,0 +1,147 @@
+# LabelMe json 读写
+# 优先使用 orjson, 其次 ujson, 都未安装时使用标准库 json,
+# 可通过环境变量 DATAHELPER_JSON_BACKEND 或 set_backend() 指定后端
+import importlib
+import json
+import os
+import re
+
+from tools.instrument import stage
+
+BACKENDS = ("orjson", "ujson", "json")
+# 与 LabelMe 保存时的缩进保持一致 (orjson 仅支持 2 空格缩进)
+INDENT = 2
+
+IMAGE_DATA_KEY = b'"imageData"'
+VALUE_START = re.compile(rb"\s*:?\s*")
+CHUNK_SIZE = 1 << 20
+
+_backend = None
+_module = None
+
+
+def set_backend(name: str) -> None:
+    global _backend, _module
+    if name not in BACKENDS:
+        raise ValueError(f"不支持的 json 后端: {name}, 仅支持: {list(BACKENDS)}")
+    _module = importlib.import_module(name)
+    _backend = name
+
+
+def get_backend() -> str:
+    if _backend is None:
+        preferred = os.environ.get("DATAHELPER_JSON_BACKEND")
+        if preferred:
+            set_backend(preferred)
+        else:
+            for name in BACKENDS:
+                try:
+                    set_backend(name)
+                    break
+                except ImportError:
+                    continue
+    return _backend
+
+
+def loads(data: bytes | str):
+    backend = get_backend()
+    if backend == "ujson":
+        try:
+            return _module.loads(data)
+        except ValueError as e:
+            # 统一为 json.JSONDecodeError, 调用方无需关心后端
+            raise json.JSONDecodeError(str(e), "", 0) from e
+    # orjson.JSONDecodeError 本身是 json.JSONDecodeError 的子类
+    return _module.loads(data)
+
+
+def dumps(obj, compact: bool = False) -> bytes:
+    backend = get_backend()
+    if backend == "orjson":
+        option = 0 if compact else _module.OPT_INDENT_2
+        return _module.dumps(obj, option=option)
+    if backend == "ujson":
+        text = _module.dumps(obj, ensure_ascii=False, indent=0 if compact else INDENT)
+    else:
+        text = _module.dumps(
+            obj,
+            ensure_ascii=False,
+            indent=None if compact else INDENT,
+            separators=(",", ":") if compact else None,
+        )
+    return text.encode("utf-8")
+
+
+def read_without_image_data(path, chunk_size: int = CHUNK_SIZE) -> bytes:
+    """
+    分块读取 json, 将 imageData 的 base64 字符串替换为 null
+
+    imageData 字段往往有数 MB, 只需要 shapes 时跳过该字段可以避免读入和解析整段字符串.
+    base64 中不包含引号, 因此值的结束位置即为下一个引号.
+    """
+    out = bytearray()
+    with open(path, "rb") as f:
+        buf = f.read(chunk_size)
+        key_len = len(IMAGE_DATA_KEY)
+
+        while True:
+            idx = buf.find(IMAGE_DATA_KEY)
+            if idx >= 0:
+                break
+            more = f.read(chunk_size)
+            if not more:
+                out += buf
+                return bytes(out)
+            # 保留末尾一段, 防止键名被分块截断
+            keep = min(len(buf), key_len - 1)
+            out += buf[: len(buf) - keep]
+            buf = buf[len(buf) - keep :] + more
+
+        out += buf[: idx + key_len]
+        buf = buf[idx + key_len :]
+
+        while True:
+            m = VALUE_START.match(buf)
+            if m.end() < len(buf):
+                break
+            more = f.read(chunk_size)
+            if not more:
+                break
+            buf += more
+
+        if buf[m.end() : m.end() + 1] != b'"':
+            # imageData 为 null 等非字符串值, 原样保留
+            out += buf + f.read()
+            return bytes(out)
+
+        out += b": null"
+        buf = buf[m.end() + 1 :]
+        end = buf.find(b'"')
+        while end < 0:
+            buf = f.read(chunk_size)
+            if not buf:
+                raise json.JSONDecodeError("imageData 字符串未结束", str(path), 0)
+            end = buf.find(b'"')
+        out += buf[end + 1 :] + f.read()
+
+    return bytes(out)
+
+
+def load_json(path, skip_image_data: bool = False):
+    with stage("read") as s:
+        if skip_image_data:
+            data = read_without_image_data(path)
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+        s.nbytes = len(data)
+    with stage("parse", nbytes=len(data)):
+        return loads(data)
+
+
+def dump_json(obj, path, compact: bool = False) -> None:
+    with stage("write") as s:
+        data = dumps(obj, compact=compact)
+        s.nbytes = len(data)
+        with open(path, "wb") as f:
+            f.write(data)
@@ -0,0 +1,99 @@
+# 从 LabelMe json 或 YOLO txt 读取一张图片的标注, 统一为像素坐标的框/关键点/多边形数组
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+
+from tools.geometry import assign_points_to_boxes
+from tools.json_codec import load_json
+
+
+class Task(str, Enum):
+    det = "det"
+    seg = "seg"
+    pose = "pose"
+
+
+class OutputFormat(str, Enum):
+    yolo = "yolo"
+    labelme = "labelme"
+
+
+@dataclass
+class Objects:
+    """一张图片的标注, 均为像素坐标"""
+
+    box_labels: list
+    boxes: np.ndarray  # (B, 4) xyxy
+    kpts: np.ndarray  # (B, K, 3) x y 可见性, 非关键点标注时 K = 0
+    poly_labels: list
+    points: np.ndarray  # (N, 2) 所有多边形顶点拼接
+    ring_lens: np.ndarray  # (P,) 每个多边形的顶点数
+
+
+def empty_objects(num_kpts: int = 0) -> Objects:
+    return Objects([], np.zeros((0, 4)), np.zeros((0, num_kpts, 3)), [], np.zeros((0, 2)), np.zeros(0, np.int64))
+
+
+def load_labelme_objects(json_file: Path, point_order) -> Objects:
+    shapes = load_json(json_file, skip_image_data=True).get("shapes", [])
+    rects = [s for s in shapes if s.get("shape_type") == "rectangle"]
+    polygons = [s for s in shapes if s.get("shape_type") == "polygon" and len(s["points"]) >= 3]
+    points = [s for s in shapes if s.get("shape_type") == "point"]
+
+    corners = np.array([r["points"][0] + r["points"][1] for r in rects], dtype=np.float64).reshape(-1, 4)
+    boxes = np.column_stack(
+        (np.minimum(corners[:, 0], corners[:, 2]), np.minimum(corners[:, 1], corners[:, 3]),
+         np.maximum(corners[:, 0], corners[:, 2]), np.maximum(corners[:, 1], corners[:, 3]))
+    )
+
+    # 关键点与 labelme_to_yolo_pose 相同, 归属于包含它的面积最小的框
+    kpts = np.zeros((len(rects), len(point_order), 3))
+    if points and point_order and rects:
+        kpt_index = {name: i for i, name in enumerate(point_order)}
+        owner = assign_points_to_boxes([p["points"][0] for p in points], boxes)
+        for point, box in zip(points, owner.tolist()):
+            k = kpt_index.get(point["label"], -1)
+            if box >= 0 and k >= 0:
+                vis = 2 if point.get("group_id") is None else int(point["group_id"])
+                kpts[box, k] = (*point["points"][0], vis)
+
+    return Objects(
+        box_labels=[r["label"] for r in rects],
+        boxes=boxes,
+        kpts=kpts,
+        poly_labels=[p["label"] for p in polygons],
+        points=np.array([pt for p in polygons for pt in p["points"]], dtype=np.float64).reshape(-1, 2),
+        ring_lens=np.array([len(p["points"]) for p in polygons], dtype=np.int64),
+    )
+
+
+def load_yolo_objects(txt_file: Path, task: Task, width, height, classes, point_order, kpt_dim) -> Objects:
+    with open(txt_file, "r") as f:
+        rows = [line.split() for line in f.read().splitlines() if line.strip()]
+
+    objects = empty_objects(len(point_order))
+    if not rows:
+        return objects
+    labels = [classes[int(row[0])] for row in rows]
+    values = [np.asarray(row[1:], dtype=np.float64) for row in rows]
+    scale = np.array([width, height], dtype=np.float64)
+
+    if task == Task.seg:
+        objects.poly_labels = labels
+        objects.points = np.concatenate([v.reshape(-1, 2) for v in values]) * scale
+        objects.ring_lens = np.array([len(v) // 2 for v in values], dtype=np.int64)
+        return objects
+
+    xywh = np.array([v[:4] for v in values]) * np.tile(scale, 2)
+    objects.box_labels = labels
+    objects.boxes = np.column_stack((xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2))
+    objects.kpts = np.zeros((len(rows), 0, 3))
+    if task == Task.pose:
+        num_kpts = len(point_order) or (len(values[0]) - 4) // kpt_dim
+        kpts = np.array([v[4 : 4 + num_kpts * kpt_dim] for v in values]).reshape(len(rows), num_kpts, kpt_dim)
+        objects.kpts = np.zeros((len(rows), num_kpts, 3))
+        objects.kpts[..., :2] = kpts[..., :2] * scale
+        objects.kpts[..., 2] = kpts[..., 2] if kpt_dim == 3 else 2
+    return objects
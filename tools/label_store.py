@@ -0,0 +1,191 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import typer
+from rich.progress import Progress
+
+from tools.geometry import segment_starts
+from tools.instrument import instrumented
+from tools.json_codec import dump_json
+from tools.json_codec import load_json
+from tools.lint_labels import parse_yolo_files
+from tools.utils import bounded_map
+from tools.utils import chunked
+from tools.utils import create_output_directory
+from tools.utils import scan_files
+from tools.yolo_format import format_yolo_rows
+
+cli = typer.Typer(help="YOLO 标签打包为可内存映射的二进制存储")
+
+STORE_VERSION = 1
+STORE_SUFFIX = ".labelstore"
+
+# 存储目录结构:
+#   meta.json           版本、行数、图片数
+#   stems.txt           每张图片相对标签目录的路径 (不含后缀), 顺序与 image_offsets 一致
+#   values.npy          float32, 所有行的坐标 (不含类别列) 拼接
+#   row_offsets.npy     int64, 第 i 行的坐标为 values[row_offsets[i]:row_offsets[i + 1]]
+#   class_ids.npy       int32, 每行的类别 id
+#   image_offsets.npy   int64, 第 j 张图片的行为 [image_offsets[j], image_offsets[j + 1])
+
+
+class LabelStore:
+    """只读访问打包后的标签, 数组通过 mmap 加载, 不会一次性读入内存"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = load_json(self.path / "meta.json")
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"不支持的标签存储版本: {self.meta.get('version')}")
+
+        with open(self.path / "stems.txt", "r", encoding="utf-8") as f:
+            self.stems = f.read().splitlines()
+        self.values = np.load(self.path / "values.npy", mmap_mode="r")
+        self.row_offsets = np.load(self.path / "row_offsets.npy", mmap_mode="r")
+        self.class_ids = np.load(self.path / "class_ids.npy", mmap_mode="r")
+        self.image_offsets = np.load(self.path / "image_offsets.npy", mmap_mode="r")
+        self._stem_index = None
+
+    def __len__(self):
+        return len(self.stems)
+
+    def index(self, stem: str) -> int:
+        if self._stem_index is None:
+            self._stem_index = {s: i for i, s in enumerate(self.stems)}
+        return self._stem_index[stem]
+
+    def rows(self, i: int) -> tuple[int, int]:
+        return int(self.image_offsets[i]), int(self.image_offsets[i + 1])
+
+    def labels(self, i: int):
+        """返回第 i 张图片的 (类别 id 数组, 每行坐标数组列表)"""
+        start, end = self.rows(i)
+        offsets = self.row_offsets[start : end + 1]
+        coords = [self.values[offsets[k] : offsets[k + 1]] for k in range(end - start)]
+        return self.class_ids[start:end], coords
+
+    def class_counts(self, i: int) -> dict[str, int]:
+        """与 search_data_by_label.load_labels 相同的格式: {类别 id 字符串: 数量}"""
+        start, end = self.rows(i)
+        ids, counts = np.unique(self.class_ids[start:end], return_counts=True)
+        return {str(k): int(v) for k, v in zip(ids, counts)}
+
+    def image_of_rows(self) -> np.ndarray:
+        """每一行所属图片的下标"""
+        return np.repeat(np.arange(len(self)), np.diff(self.image_offsets))
+
+    def __getitem__(self, key):
+        return self.labels(self.index(key) if isinstance(key, str) else key)
+
+
+def pack_chunk(files):
+    values, row_lens, row_files, _, issues = parse_yolo_files(files)
+    starts = segment_starts(row_lens)
+    class_ids = values[starts].astype(np.int32)
+    coords = np.delete(values, starts).astype(np.float32)
+    rows_per_file = np.bincount(row_files, minlength=len(files))
+    return coords, row_lens - 1, class_ids, rows_per_file, issues
+
+
+def write_store(output_dir: Path, stems, coords, coord_lens, class_ids, rows_per_image):
+    output_dir.mkdir(parents=True, exist_ok=True)
+    row_offsets = np.concatenate(([0], np.cumsum(coord_lens))).astype(np.int64)
+    image_offsets = np.concatenate(([0], np.cumsum(rows_per_image))).astype(np.int64)
+
+    np.save(output_dir / "values.npy", np.asarray(coords, dtype=np.float32))
+    np.save(output_dir / "row_offsets.npy", row_offsets)
+    np.save(output_dir / "class_ids.npy", np.asarray(class_ids, dtype=np.int32))
+    np.save(output_dir / "image_offsets.npy", image_offsets)
+    with open(output_dir / "stems.txt", "w", encoding="utf-8") as f:
+        f.write("\n".join(stems))
+    dump_json(
+        {
+            "version": STORE_VERSION,
+            "num_images": len(stems),
+            "num_rows": len(class_ids),
+        },
+        output_dir / "meta.json",
+    )
+
+
+@cli.command()
+@instrumented
+def pack(
+    label_path: Path = typer.Argument(..., help="YOLO 标签目录 (det/seg/pose)"),
+    output_path: Path = typer.Option(
+        None, "--output_path", "-o", help=f"输出目录, 默认为标签目录同级的 <目录名>{STORE_SUFFIX}"
+    ),
+    workers: int = typer.Option(os.cpu_count(), "--workers", "-w", help="进程数"),
+    chunk_size: int = typer.Option(2000, "--chunk_size", help="每个任务处理的文件数"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录"),
+):
+    """将标签目录中的 txt 文件打包为一个标签存储"""
+    label_dir = label_path.resolve()
+    if not label_dir.is_dir():
+        raise ValueError(f"标签路径不存在或不是目录: {label_dir}")
+    output_dir = output_path or label_dir.parent / f"{label_dir.name}{STORE_SUFFIX}"
+
+    files = (
+        f for f in scan_files(label_dir, {".txt"}, recursive, exclude=(output_dir,)) if f.name != "classes.txt"
+    )
+
+    parts, stems = [], []
+    with Progress() as progress, ProcessPoolExecutor(max_workers=workers) as executor:
+        bar = progress.add_task("Packing...", total=None)
+        # bounded_map 保证结果顺序与文件顺序一致
+        for chunk, result in bounded_map(executor, pack_chunk, chunked(files, chunk_size)):
+            parts.append(result)
+            stems.extend(f.relative_to(label_dir).with_suffix("").as_posix() for f in chunk)
+            progress.update(bar, advance=len(chunk))
+
+    issues = [issue for part in parts for issue in part[4]]
+    for issue in issues:
+        typer.echo(f"跳过 {issue['file']}:{issue['line']} {issue['message']}")
+
+    if parts:
+        coords, coord_lens, class_ids, rows_per_image = (
+            np.concatenate([part[k] for part in parts]) for k in range(4)
+        )
+    else:
+        coords, coord_lens, class_ids, rows_per_image = (np.zeros(0) for _ in range(4))
+    write_store(output_dir, stems, coords, coord_lens, class_ids, rows_per_image)
+
+    typer.echo(f"打包完成: {len(stems)} 个文件, {len(class_ids)} 行, 保存在 {output_dir}")
+
+
+@cli.command()
+@instrumented
+def unpack(
+    store_path: Path = typer.Argument(..., help="标签存储目录"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+):
+    """将标签存储还原为 txt 标签目录"""
+    store = LabelStore(store_path)
+    output_dir = create_output_directory(output_path, store.path, "unpack_labels")
+
+    row_lens = np.diff(store.row_offsets)
+    with Progress() as progress:
+        bar = progress.add_task("Unpacking...", total=len(store))
+        for i, stem in enumerate(store.stems):
+            start, end = store.rows(i)
+            lo, hi = store.row_offsets[start], store.row_offsets[end]
+            label_file = output_dir / f"{stem}.txt"
+            if "/" in stem:
+                label_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(label_file, "w") as f:
+                f.write(
+                    format_yolo_rows(
+                        store.class_ids[start:end].tolist(),
+                        store.values[lo:hi].astype(np.float64),
+                        row_lens[start:end].tolist(),
+                    )
+                )
+            progress.update(bar, advance=1)
+
+    typer.echo(f"还原完成: {len(store)} 个文件, 保存在 {output_dir}")
+
+
+if __name__ == "__main__":
+    cli()
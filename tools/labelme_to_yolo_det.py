@@ -1,13 +1,21 @@
-import json
 import shutil
 from pathlib import Path
 
+import numpy as np
 import typer
 from PIL import Image
 from rich.progress import track
 
-from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.json_codec import load_json
+from tools.resize import ImageWriter
 from tools.utils import create_output_directory
+from tools.utils import iter_image_label_pairs
+from tools.utils import output_subdir
+from tools.watch import remove_outputs
+from tools.watch import run_watch
+from tools.yolo_format import format_yolo_rows
 
 
 cli = typer.Typer(help="LabelMe 标签转 YOLO 标签 (目标检测)")
@@ -21,29 +29,45 @@ def xyxy2xywh(box, img_width, img_height):
     return (x_center, y_center, width, height)
 
 
+def shapes_to_yolo_det(shapes, classes, img_width, img_height):
+    if not shapes:
+        return ""
+
+    class_ids = [classes.index(shape["label"]) for shape in shapes]
+    boxes = np.array(
+        [shape["points"][0] + shape["points"][1] for shape in shapes], dtype=np.float64
+    )
+    boxes = np.clip(boxes / (img_width, img_height, img_width, img_height), 0.0, 1.0)
+    # 坐标已归一化, xyxy2xywh 按列批量计算
+    yolo_boxes = xyxy2xywh(boxes.T, 1, 1)
+    return format_yolo_rows(class_ids, np.column_stack(yolo_boxes).ravel(), [4] * len(shapes))
+
+
 def convert_labelme_to_yolo(json_path, txt_path, classes, img_width, img_height):
-    with open(json_path, "r") as f:
-        data = json.load(f)
+    data = load_json(json_path, skip_image_data=True)
 
-    with open(txt_path, "w") as f:
-        for shape in data["shapes"]:
-            points = shape["points"]
-            box = [points[0][0], points[0][1], points[1][0], points[1][1]]
-            yolo_box = xyxy2xywh(box, img_width, img_height)
-            class_id = classes.index(shape["label"])
-            f.write(
-                f"{class_id} " + " ".join(map(lambda x: f"{x:.6f}", yolo_box)) + "\n"
-            )
+    with stage("convert"):
+        lines = shapes_to_yolo_det(data["shapes"], classes, img_width, img_height)
+    with stage("write", nbytes=len(lines)), open(txt_path, "w") as f:
+        f.write(lines)
 
 
 @cli.command()
+@instrumented
 def process_labelme_to_yolo_det(
     image_path: Path = typer.Argument(..., help="图片目录"),
     class_path: str = typer.Argument(..., help="classes.txt"),
     label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录"),
     output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
+    max_size: int = typer.Option(
+        None, "--max-size", "--resize", help="长边超过该值的图片缩小到该值 (INTER_AREA) 并重新编码, 默认原样复制"
+    ),
+    quality: int = typer.Option(95, "--quality", help="缩小后 JPEG 的编码质量"),
+    watch: bool = typer.Option(False, "--watch", help="转换后持续监视图片/标签目录, 只转换变化的文件 (Ctrl+C 退出)"),
+    debounce: float = typer.Option(0.5, "--debounce", help="监视模式下合并连续保存的等待时间 (秒)"),
+    poll: bool = typer.Option(False, "--poll", help="监视模式下使用 mtime 轮询代替 inotify (如网络文件系统)"),
 ):
-    images = [f for f in image_path.iterdir() if f.suffix.lower() in SUPPORTED_IMAGE_EXTENSIONS]
     label_path = label_path or image_path
     output_path = create_output_directory(output_path, image_path, "json2yolo_det")
 
@@ -51,16 +75,39 @@ def process_labelme_to_yolo_det(
     with open(class_path, "r") as f:
         classes = f.read().splitlines()
 
-    for img_file in track(images, description="Converting to YOLO..."):
-        img = Image.open(img_file)
-        base_name = img_file.stem
-        json_file = label_path / f"{base_name}.json"
-        txt_file = output_path / f"{base_name}.txt"
-
-        if json_file.exists():
-            convert_labelme_to_yolo(json_file, txt_file, classes, img.width, img.height)
-        shutil.copy(img_file, output_path)
-
+    def convert(pairs, changed_images=None):
+        with ImageWriter(max_size, quality) as writer:
+            for img_file, rel, json_file in track(pairs, description="Converting to YOLO..."):
+                with stage("image"):
+                    img = Image.open(img_file)
+                out_dir = output_subdir(output_path, rel)
+                txt_file = out_dir / f"{img_file.stem}.txt"
+
+                if json_file is not None:
+                    convert_labelme_to_yolo(json_file, txt_file, classes, img.width, img.height)
+                elif changed_images is not None:
+                    # 监视模式下标签被删除时, 不保留之前的输出
+                    txt_file.unlink(missing_ok=True)
+                if changed_images is None or img_file in changed_images:
+                    writer.write(img_file, out_dir, (img.width, img.height))
+
+    def reload_classes(_):
+        with open(class_path, "r") as f:
+            classes[:] = f.read().splitlines()
+        shutil.copy(class_path, output_path / "classes.txt")
+
+    if watch:
+        shutil.copy(class_path, output_path / "classes.txt")
+        run_watch(
+            image_path, label_path, (".json",), recursive, convert,
+            lambda key: remove_outputs(output_path, key),
+            exclude=(output_path,), files=(class_path,), on_files=reload_classes, debounce=debounce, poll=poll,
+        )
+        return
+
+    convert(
+        iter_image_label_pairs(image_path, label_path, recursive, label_suffixes=(".json",), exclude=(output_path,))
+    )
     shutil.copy(class_path, output_path / "classes.txt")
 
 
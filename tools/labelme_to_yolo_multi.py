@@ -0,0 +1,183 @@
+import os
+import shutil
+from enum import Enum
+from functools import partial
+from pathlib import Path
+from typing import List
+
+import typer
+from PIL import Image
+from rich.progress import track
+
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.json_codec import load_json
+from tools.labelme_to_yolo_det import shapes_to_yolo_det
+from tools.labelme_to_yolo_pose import shapes_to_yolo_pose
+from tools.labelme_to_yolo_seg import shapes_to_yolo_seg
+from tools.resize import ImageWriter
+from tools.utils import create_output_directory
+from tools.utils import iter_image_label_pairs
+from tools.utils import load_classes
+from tools.utils import output_subdir
+from tools.watch import remove_outputs
+from tools.watch import run_watch
+
+cli = typer.Typer(help="LabelMe 标签一次性转 YOLO 多任务标签 (检测/分割/关键点)")
+
+
+class Task(str, Enum):
+    det = "det"
+    seg = "seg"
+    pose = "pose"
+
+
+def polygon_to_rectangle(shape):
+    xs = [p[0] for p in shape["points"]]
+    ys = [p[1] for p in shape["points"]]
+    return {**shape, "points": [[min(xs), min(ys)], [max(xs), max(ys)]], "shape_type": "rectangle"}
+
+
+def convert_shapes(task, shapes, classes, point_order, img_width, img_height, json_path):
+    if task == Task.det:
+        # 检测任务使用矩形框, 多边形取外接矩形
+        boxes = [s for s in shapes if s.get("shape_type") == "rectangle"]
+        boxes += [polygon_to_rectangle(s) for s in shapes if s.get("shape_type") == "polygon"]
+        return shapes_to_yolo_det(boxes, classes, img_width, img_height)
+    if task == Task.seg:
+        polygons = [s for s in shapes if s.get("shape_type") == "polygon"]
+        return shapes_to_yolo_seg(polygons, classes, img_width, img_height)
+    return shapes_to_yolo_pose(shapes, classes, point_order, img_width, img_height, json_path)
+
+
+def link_or_copy(src_file: Path, dst_file: Path) -> None:
+    """优先使用硬链接共享同一份图片, 跨盘或不支持时退化为复制"""
+    if dst_file.exists():
+        dst_file.unlink()
+    try:
+        os.link(src_file, dst_file)
+    except OSError:
+        shutil.copy2(src_file, dst_file)
+
+
+def link_images(shared_image: Path, link_dirs) -> None:
+    """图片写入 images/ 后再链接到各任务目录"""
+    with stage("copy"):
+        for link_dir in link_dirs:
+            link_or_copy(shared_image, link_dir / shared_image.name)
+
+
+@cli.command()
+@instrumented
+def process_labelme_to_yolo_multi(
+    image_path: Path = typer.Argument(..., help="图片目录"),
+    class_path: str = typer.Argument(
+        ..., help="classes.txt, 导出关键点时目标分类和关键点分类中间用空行分隔"
+    ),
+    tasks: List[Task] = typer.Option(
+        [Task.det, Task.seg], "--task", "-t", help="导出的任务, 可重复指定 [det, seg, pose]"
+    ),
+    label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
+    max_size: int = typer.Option(
+        None, "--max-size", "--resize", help="长边超过该值的图片缩小到该值 (INTER_AREA) 并重新编码, 默认原样复制"
+    ),
+    quality: int = typer.Option(95, "--quality", help="缩小后 JPEG 的编码质量"),
+    watch: bool = typer.Option(False, "--watch", help="转换后持续监视图片/标签目录, 只转换变化的文件 (Ctrl+C 退出)"),
+    debounce: float = typer.Option(0.5, "--debounce", help="监视模式下合并连续保存的等待时间 (秒)"),
+    poll: bool = typer.Option(False, "--poll", help="监视模式下使用 mtime 轮询代替 inotify (如网络文件系统)"),
+):
+    """
+    每个 json 只解析一次, 同时输出多个任务的标签
+
+    输出目录结构:
+        images/             图片只复制一次
+        <task>/images/      指向 images/ 的硬链接
+        <task>/labels/      对应任务的 YOLO 标签
+        <task>/classes.txt
+    """
+    label_path = label_path or image_path
+    output_path = create_output_directory(output_path, image_path, "json2yolo_multi")
+    tasks = list(dict.fromkeys(tasks))
+
+    classes, point_order = load_classes(class_path)
+    if Task.pose in tasks and not point_order:
+        raise ValueError("导出关键点标签时 classes.txt 需包含关键点顺序 (与目标类别以空行分隔)")
+
+    shared_image_dir = output_path / "images"
+    shared_image_dir.mkdir(parents=True, exist_ok=True)
+    task_dirs = {}
+    for task in tasks:
+        task_dir = output_path / task.value
+        (task_dir / "images").mkdir(parents=True, exist_ok=True)
+        (task_dir / "labels").mkdir(parents=True, exist_ok=True)
+        task_dirs[task] = task_dir
+
+    def convert(pairs, changed_images=None):
+        with ImageWriter(max_size, quality) as writer:
+            for img_file, rel, json_file in track(pairs, description="Converting to YOLO (multi-task)..."):
+                base_name = img_file.stem
+
+                if json_file is not None:
+                    data = load_json(json_file, skip_image_data=True)
+                    with stage("image"):
+                        img = Image.open(img_file)
+                    for task, task_dir in task_dirs.items():
+                        with stage("convert"):
+                            lines = convert_shapes(
+                                task, data["shapes"], classes, point_order, img.width, img.height, json_file
+                            )
+                        label_file = output_subdir(task_dir / "labels", rel) / f"{base_name}.txt"
+                        with stage("write", nbytes=len(lines)), open(label_file, "w") as f:
+                            f.write(lines)
+                elif changed_images is not None:
+                    # 监视模式下标签被删除时, 不保留之前的输出
+                    for task_dir in task_dirs.values():
+                        (task_dir / "labels" / rel.parent / f"{base_name}.txt").unlink(missing_ok=True)
+
+                if changed_images is not None and img_file not in changed_images:
+                    continue
+                shared_dir = output_subdir(shared_image_dir, rel)
+                link_dirs = [output_subdir(task_dir / "images", rel) for task_dir in task_dirs.values()]
+                size = (img.width, img.height) if json_file is not None else None
+                writer.write(
+                    img_file, shared_dir, size, on_done=partial(link_images, shared_dir / img_file.name, link_dirs)
+                )
+
+    def write_classes():
+        for task, task_dir in task_dirs.items():
+            if task == Task.pose:
+                shutil.copy(class_path, task_dir / "classes.txt")
+            else:
+                with open(task_dir / "classes.txt", "w") as f:
+                    f.write("\n".join(classes))
+
+    def remove(key):
+        remove_outputs(shared_image_dir, key)
+        for task_dir in task_dirs.values():
+            remove_outputs(task_dir / "images", key)
+            remove_outputs(task_dir / "labels", key)
+
+    def reload_classes(_):
+        classes[:], point_order[:] = load_classes(class_path)
+        write_classes()
+
+    if watch:
+        write_classes()
+        run_watch(
+            image_path, label_path, (".json",), recursive, convert, remove,
+            exclude=(output_path,), files=(class_path,), on_files=reload_classes, debounce=debounce, poll=poll,
+        )
+        return
+
+    convert(
+        iter_image_label_pairs(image_path, label_path, recursive, label_suffixes=(".json",), exclude=(output_path,))
+    )
+    write_classes()
+
+    typer.echo(f"Finished! file saved in {output_path}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,14 +1,22 @@
-import json
 import shutil
 from pathlib import Path
 
+import numpy as np
 import typer
 from PIL import Image
 from rich.progress import track
 
-from tools.show_pose import show
-from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.geometry import assign_points_to_boxes
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.json_codec import load_json
+from tools.resize import ImageWriter
 from tools.utils import create_output_directory
+from tools.utils import iter_image_label_pairs
+from tools.utils import output_subdir
+from tools.watch import remove_outputs
+from tools.watch import run_watch
+from tools.yolo_format import format_yolo_rows
 
 cli = typer.Typer(help="LabelMe 标签转 YOLO 标签 (关键点)")
 
@@ -21,89 +29,92 @@ def xyxy2xywh(box, img_width, img_height):
     return (x_center, y_center, width, height)
 
 
-def convert_labelme_to_yolo(
-    json_path, txt_path, classes, point_order, img_width, img_height
+def shapes_to_yolo_pose(
+    shapes, classes, point_order, img_width, img_height, json_path=None
 ):
-    with open(json_path, "r") as f:
-        data = json.load(f)
-
     retangles = []
+    retangle_labels = []
     points = []
+    point_infos = []
 
-    p_order = {po: None for po in point_order}
+    kpt_index = {po: i for i, po in enumerate(point_order)}
 
-    for shape in data["shapes"]:
-        if int(shape["group_id"]) > 2:
+    for shape in shapes:
+        vis = 2 if shape["group_id"] is None else int(shape["group_id"])
+        if vis > 2:
             raise ValueError(
                 f"{json_path} 可见性不符合规范 [0: 不可见, 1: 部分可见, 2: 全部可见]"
             )
 
-        if shape["group_id"] is None:
-            shape["group_id"] = 2
-
         shape_type = shape["shape_type"]
-        infos = {"label": shape["label"]}
-
         if shape_type == "rectangle":
-            infos["xyxy"] = shape["points"][0] + shape["points"][1]
-            infos.update(p_order)
-            retangles.append(infos)
+            retangles.append(shape["points"][0] + shape["points"][1])
+            retangle_labels.append(shape["label"])
         elif shape_type == "point":
-            infos["vis"] = shape["group_id"]
-            infos["xy"] = shape["points"][0]
-            points.append(infos)
-
-    point_in_rectangle = {tuple(point["xy"]): False for point in points}
-
-    for point in points:
-        x, y = point["xy"]
-        label = point["label"]
-        for retangle in retangles:
-            x1, y1, x2, y2 = retangle["xyxy"]
-            x_min, x_max = min(x1, x2), max(x1, x2)
-            y_min, y_max = min(y1, y2), max(y1, y2)
-            if x_min <= x <= x_max and y_min <= y <= y_max:
-                # if retangle.get(label) is not None:
-                #     raise f"{json_path} {label} has more than one point in one rectangle"
-                retangle[label] = point
-                point_in_rectangle[(x, y)] = True
-
-    outside_points = [
-        point for point, is_inside in point_in_rectangle.items() if not is_inside
-    ]
-    if outside_points:
-        print(
-            f"{json_path} contains {len(outside_points)} points not in any rectangle:"
-        )
+            points.append(shape["points"][0])
+            point_infos.append((kpt_index.get(shape["label"], -1), vis))
+
+    # 每个点只归属于包含它的面积最小的框, 避免重叠框之间互相抢占关键点
+    owner = assign_points_to_boxes(points, retangles)
+    outside = int((owner < 0).sum())
+    if outside:
+        print(f"{json_path} contains {outside} points not in any rectangle:")
+
+    if not retangles:
+        return ""
+
+    scale = (img_width, img_height)
+    boxes = np.array(retangles, dtype=np.float64)
+    boxes = np.clip(boxes / (scale + scale), 0.0, 1.0)
+
+    # 未标注的关键点保持 0 0 0
+    kpts = np.zeros((len(retangles), len(point_order), 3))
+    if points:
+        xy = np.asarray(points, dtype=np.float64)
+        kpt_ids, vis = np.asarray(point_infos, dtype=np.int64).T
+        valid = np.flatnonzero((owner >= 0) & (kpt_ids >= 0))
+        # 同一个框内同名关键点重复时, 以标注顺序中最后一个为准
+        slots = owner[valid] * len(point_order) + kpt_ids[valid]
+        _, last = np.unique(slots[::-1], return_index=True)
+        valid = valid[len(valid) - 1 - last]
+        kpts[owner[valid], kpt_ids[valid], :2] = xy[valid]
+        kpts[owner[valid], kpt_ids[valid], 2] = vis[valid]
+    kpts[..., :2] = np.clip(kpts[..., :2] / scale, 0.0, 1.0)
+
+    rows = np.column_stack(xyxy2xywh(boxes.T, 1, 1) + (kpts.reshape(len(retangles), -1),))
+    class_ids = [classes.index(label) for label in retangle_labels]
+    return format_yolo_rows(class_ids, rows.ravel(), [rows.shape[1]] * len(rows))
 
-    with open(txt_path, "w") as f:
-        for retangle in retangles:
-            xywh = xyxy2xywh(retangle["xyxy"], img_width, img_height)
-            yolo_box = [round(i, 6) for i in xywh]
-            for po in point_order:
-                if retangle[po]:
-                    x, y = retangle[po]["xy"]
-                    visibility = retangle[po]["vis"]
-                    yolo_box.extend(
-                        [round(x / img_width, 6), round(y / img_height, 6), visibility]
-                    )
-                else:
-                    yolo_box.extend([0, 0, 0])
 
-            class_id = classes.index(retangle["label"])
-            f.write(
-                f"{class_id} " + " ".join(map(lambda x: f"{x:.6f}", yolo_box)) + "\n"
-            )
+def convert_labelme_to_yolo(
+    json_path, txt_path, classes, point_order, img_width, img_height
+):
+    data = load_json(json_path, skip_image_data=True)
+
+    with stage("convert"):
+        lines = shapes_to_yolo_pose(
+            data["shapes"], classes, point_order, img_width, img_height, json_path
+        )
+    with stage("write", nbytes=len(lines)), open(txt_path, "w") as f:
+        f.write(lines)
 
 
 @cli.command()
+@instrumented
 def process_labelme_to_yolo_pose(
     image_path: Path = typer.Argument(..., help="图片目录"),
     class_path: str = typer.Argument(..., help="classes.txt"),
     label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录"),
     output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
+    max_size: int = typer.Option(
+        None, "--max-size", "--resize", help="长边超过该值的图片缩小到该值 (INTER_AREA) 并重新编码, 默认原样复制"
+    ),
+    quality: int = typer.Option(95, "--quality", help="缩小后 JPEG 的编码质量"),
+    watch: bool = typer.Option(False, "--watch", help="转换后持续监视图片/标签目录, 只转换变化的文件 (Ctrl+C 退出)"),
+    debounce: float = typer.Option(0.5, "--debounce", help="监视模式下合并连续保存的等待时间 (秒)"),
+    poll: bool = typer.Option(False, "--poll", help="监视模式下使用 mtime 轮询代替 inotify (如网络文件系统)"),
 ):
-    images = [f for f in image_path.iterdir() if f.suffix.lower() in SUPPORTED_IMAGE_EXTENSIONS]
     label_path = label_path or image_path
     output_path = create_output_directory(output_path, image_path, "json2yolo_pose")
 
@@ -116,21 +127,49 @@ def process_labelme_to_yolo_pose(
     print("主体类别: ", classes)
     print("关键点顺序: ", point_order)
 
-    for img_file in track(images, description="Converting to POSE..."):
-        img = Image.open(img_file)
-        base_name = img_file.stem
-        json_file = label_path / f"{base_name}.json"
-        txt_file = output_path / f"{base_name}.txt"
-
-        if json_file.exists():
-            convert_labelme_to_yolo(
-                json_file, txt_file, classes, point_order, img.width, img.height
-            )
-        shutil.copy(img_file, output_path)
+    def convert(pairs, changed_images=None):
+        with ImageWriter(max_size, quality) as writer:
+            for img_file, rel, json_file in track(pairs, description="Converting to POSE..."):
+                with stage("image"):
+                    img = Image.open(img_file)
+                out_dir = output_subdir(output_path, rel)
+                txt_file = out_dir / f"{img_file.stem}.txt"
+
+                if json_file is not None:
+                    convert_labelme_to_yolo(
+                        json_file, txt_file, classes, point_order, img.width, img.height
+                    )
+                elif changed_images is not None:
+                    # 监视模式下标签被删除时, 不保留之前的输出
+                    txt_file.unlink(missing_ok=True)
+                if changed_images is None or img_file in changed_images:
+                    writer.write(img_file, out_dir, (img.width, img.height))
+
+    def reload_classes(_):
+        with open(class_path, "r") as f:
+            lines = f.read().splitlines()
+        split_idx = lines.index("")
+        classes[:], point_order[:] = lines[:split_idx], lines[split_idx + 1 :]
+        shutil.copy(class_path, output_path / "classes.txt")
+
+    if watch:
+        shutil.copy(class_path, output_path / "classes.txt")
+        run_watch(
+            image_path, label_path, (".json",), recursive, convert,
+            lambda key: remove_outputs(output_path, key),
+            exclude=(output_path,), files=(class_path,), on_files=reload_classes, debounce=debounce, poll=poll,
+        )
+        return
 
+    convert(
+        iter_image_label_pairs(image_path, label_path, recursive, label_suffixes=(".json",), exclude=(output_path,))
+    )
     shutil.copy(class_path, output_path / "classes.txt")
     show_result = input("是否要显示结果? (y/n): ")
     if show_result.lower() == "y":
+        # 预览依赖 cv2, 只在需要时导入
+        from tools.show_pose import show
+
         show(output_path, output_path / "classes.txt", output_path)
 
 
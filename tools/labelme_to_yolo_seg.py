@@ -1,53 +1,151 @@
-import json
 import shutil
+from itertools import chain
 from pathlib import Path
 
+import numpy as np
 import typer
 from PIL import Image
 from rich.progress import track
 
-from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.geometry import segment_starts
+from tools.geometry import shoelace_area
+from tools.geometry import simplify_polygons
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.json_codec import load_json
+from tools.resize import ImageWriter
 from tools.utils import create_output_directory
+from tools.utils import iter_image_label_pairs
+from tools.utils import output_subdir
+from tools.watch import remove_outputs
+from tools.watch import run_watch
+from tools.yolo_format import format_yolo_rows
 
 cli = typer.Typer(help="LabelMe 标签转 YOLO 标签 (分割)")
 
 
 def normalize_polygon(polygon, img_width, img_height):
-    normalized = []
-    for point in polygon:
-        x = point[0] / img_width
-        y = point[1] / img_height
-        normalized.extend([x, y])
-    return normalized
+    if isinstance(polygon, np.ndarray):
+        coords = polygon.astype(np.float64).ravel()
+    else:
+        # 用 fromiter 展开顶点列表, 比 np.asarray 处理嵌套列表快得多
+        coords = np.fromiter(chain.from_iterable(polygon), dtype=np.float64, count=2 * len(polygon))
+    points = coords.reshape(-1, 2)
+    points /= (img_width, img_height)
+    return np.clip(coords, 0.0, 1.0, out=coords)
+
+
+def polygon_iou(poly_a, poly_b, max_canvas=512):
+    """在两个多边形的外接矩形内栅格化后计算 IoU"""
+    import cv2  # 仅在统计 IoU 时需要
+
+    both = np.vstack((poly_a, poly_b))
+    origin = both.min(axis=0)
+    size = both.max(axis=0) - origin
+    scale = min(1.0, max_canvas / max(size.max(), 1e-6))
+    canvas_size = np.ceil(size * scale).astype(int) + 2
+
+    masks = []
+    for poly in (poly_a, poly_b):
+        mask = np.zeros((canvas_size[1], canvas_size[0]), dtype=np.uint8)
+        # 4 位小数精度的定点坐标
+        pts = np.round((poly - origin) * scale * 16).astype(np.int32)
+        cv2.fillPoly(mask, [pts], 1, shift=4)
+        masks.append(mask.astype(bool))
+
+    union = np.logical_or(*masks).sum()
+    return np.logical_and(*masks).sum() / union if union else 1.0
+
+
+def update_simplify_stats(stats, points, ring_lens, keep, with_iou):
+    starts = segment_starts(ring_lens)
+    kept_lens = np.add.reduceat(keep, starts)
+    area_before = shoelace_area(points[:, 0], points[:, 1], starts)
+    area_after = shoelace_area(points[keep, 0], points[keep, 1], segment_starts(kept_lens))
+    area_dev = np.abs(area_after - area_before) / np.maximum(area_before, 1e-12)
+
+    stats["shapes"] += len(ring_lens)
+    stats["vertices_before"] += len(points)
+    stats["vertices_after"] += int(keep.sum())
+    stats["max_area_dev"] = max(stats["max_area_dev"], float(area_dev.max()))
+
+    if with_iou:
+        for start, n in zip(starts, ring_lens):
+            # 未删除顶点的多边形 IoU 恒为 1
+            if keep[start : start + n].all():
+                continue
+            ring = points[start : start + n]
+            iou = polygon_iou(ring, ring[keep[start : start + n]])
+            stats["max_iou_dev"] = max(stats["max_iou_dev"], 1.0 - iou)
+
+
+def shapes_to_yolo_seg(
+    shapes,
+    classes,
+    img_width,
+    img_height,
+    tolerance=0.0,
+    max_vertices=None,
+    stats=None,
+    with_iou=False,
+):
+    if not shapes:
+        return ""
+
+    # 所有多边形的顶点拼接后一次性归一化
+    class_ids = [classes.index(shape["label"]) for shape in shapes]
+    ring_lens = [len(shape["points"]) for shape in shapes]
+    points = [point for shape in shapes for point in shape["points"]]
 
+    if tolerance > 0 or max_vertices:
+        # 在像素坐标下简化, tolerance 单位为像素
+        points = np.fromiter(
+            chain.from_iterable(points), dtype=np.float64, count=2 * len(points)
+        ).reshape(-1, 2)
+        keep = simplify_polygons(points, ring_lens, tolerance, max_vertices)
+        if stats is not None:
+            update_simplify_stats(stats, points, ring_lens, keep, with_iou)
+        ring_lens = np.add.reduceat(keep, segment_starts(ring_lens)).tolist()
+        points = points[keep]
 
-def convert_labelme_to_yolo_seg(json_path, txt_path, classes, img_width, img_height):
-    with open(json_path, "r") as f:
-        data = json.load(f)
+    normalized = normalize_polygon(points, img_width, img_height)
 
-    with open(txt_path, "w") as f:
-        for shape in data["shapes"]:
-            label = shape["label"]
+    # Write to file: class_id x1 y1 x2 y2 ...
+    return format_yolo_rows(class_ids, normalized, [2 * n for n in ring_lens])
 
-            class_id = classes.index(label)
-            polygon = shape["points"]
-            normalized_polygon = normalize_polygon(polygon, img_width, img_height)
 
-            # Write to file: class_id x1 y1 x2 y2 ...
-            line = f"{class_id} " + " ".join(
-                [f"{coord:.6f}" for coord in normalized_polygon]
-            )
-            f.write(line + "\n")
+def convert_labelme_to_yolo_seg(
+    json_path, txt_path, classes, img_width, img_height, **simplify_kwargs
+):
+    data = load_json(json_path, skip_image_data=True)
+
+    with stage("convert"):
+        lines = shapes_to_yolo_seg(data["shapes"], classes, img_width, img_height, **simplify_kwargs)
+    with stage("write", nbytes=len(lines)), open(txt_path, "w") as f:
+        f.write(lines)
 
 
 @cli.command()
+@instrumented
 def process_labelme_to_yolo_seg(
     image_path: Path = typer.Argument(..., help="图片目录"),
     class_path: str = typer.Argument(..., help="classes.txt"),
     label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录"),
     output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
+    max_size: int = typer.Option(
+        None, "--max-size", "--resize", help="长边超过该值的图片缩小到该值 (INTER_AREA) 并重新编码, 默认原样复制"
+    ),
+    quality: int = typer.Option(95, "--quality", help="缩小后 JPEG 的编码质量"),
+    tolerance: float = typer.Option(
+        0.0, "--simplify", "-s", help="Douglas-Peucker 简化阈值 (像素), 0 表示不简化"
+    ),
+    max_vertices: int = typer.Option(None, "--max_vertices", help="每个多边形最多保留的顶点数"),
+    with_iou: bool = typer.Option(False, "--iou", help="统计简化前后的最大 IoU 偏差 (较慢)"),
+    watch: bool = typer.Option(False, "--watch", help="转换后持续监视图片/标签目录, 只转换变化的文件 (Ctrl+C 退出)"),
+    debounce: float = typer.Option(0.5, "--debounce", help="监视模式下合并连续保存的等待时间 (秒)"),
+    poll: bool = typer.Option(False, "--poll", help="监视模式下使用 mtime 轮询代替 inotify (如网络文件系统)"),
 ):
-    images = [f for f in image_path.iterdir() if f.suffix.lower() in SUPPORTED_IMAGE_EXTENSIONS]
     label_path = label_path or image_path
     output_path = create_output_directory(output_path, image_path, "json2yolo_seg")
 
@@ -55,20 +153,67 @@ def process_labelme_to_yolo_seg(
     with open(class_path, "r") as f:
         classes = f.read().splitlines()
 
-    for img_file in track(images, description="Converting to YOLO segmentation..."):
-        img = Image.open(img_file)
-        base_name = img_file.stem
-        json_file = label_path / f"{base_name}.json"
-        txt_file = output_path / f"{base_name}.txt"
-
-        if json_file.exists():
-            convert_labelme_to_yolo_seg(
-                json_file, txt_file, classes, img.width, img.height
-            )
-        shutil.copy(img_file, output_path)
-
+    simplify = tolerance > 0 or bool(max_vertices)
+    stats = {
+        "shapes": 0,
+        "vertices_before": 0,
+        "vertices_after": 0,
+        "max_area_dev": 0.0,
+        "max_iou_dev": 0.0,
+    }
+    simplify_kwargs = (
+        dict(tolerance=tolerance, max_vertices=max_vertices, stats=stats, with_iou=with_iou)
+        if simplify
+        else {}
+    )
+
+    def convert(pairs, changed_images=None):
+        with ImageWriter(max_size, quality) as writer:
+            for img_file, rel, json_file in track(pairs, description="Converting to YOLO segmentation..."):
+                with stage("image"):
+                    img = Image.open(img_file)
+                out_dir = output_subdir(output_path, rel)
+                txt_file = out_dir / f"{img_file.stem}.txt"
+
+                if json_file is not None:
+                    convert_labelme_to_yolo_seg(
+                        json_file, txt_file, classes, img.width, img.height, **simplify_kwargs
+                    )
+                elif changed_images is not None:
+                    # 监视模式下标签被删除时, 不保留之前的输出
+                    txt_file.unlink(missing_ok=True)
+                if changed_images is None or img_file in changed_images:
+                    writer.write(img_file, out_dir, (img.width, img.height))
+
+    def reload_classes(_):
+        with open(class_path, "r") as f:
+            classes[:] = f.read().splitlines()
+        shutil.copy(class_path, output_path / "classes.txt")
+
+    if watch:
+        shutil.copy(class_path, output_path / "classes.txt")
+        run_watch(
+            image_path, label_path, (".json",), recursive, convert,
+            lambda key: remove_outputs(output_path, key),
+            exclude=(output_path,), files=(class_path,), on_files=reload_classes, debounce=debounce, poll=poll,
+        )
+        return
+
+    convert(
+        iter_image_label_pairs(image_path, label_path, recursive, label_suffixes=(".json",), exclude=(output_path,))
+    )
     shutil.copy(class_path, output_path / "classes.txt")
 
+    if simplify and stats["vertices_before"]:
+        reduction = 1 - stats["vertices_after"] / stats["vertices_before"]
+        typer.echo(
+            f"多边形简化: {stats['shapes']} 个多边形, 顶点 {stats['vertices_before']} -> "
+            f"{stats['vertices_after']} (减少 {reduction:.1%})"
+        )
+        typer.echo(f"  最大面积偏差: {stats['max_area_dev']:.4%}")
+        if with_iou:
+            typer.echo(f"  最大 IoU 偏差: {stats['max_iou_dev']:.4%}")
+
 
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,315 @@
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+import typer
+from rich.progress import Progress
+
+from tools.geometry import shoelace_area
+from tools.instrument import instrumented
+from tools.json_codec import load_json
+from tools.utils import bounded_map
+from tools.utils import chunked
+from tools.utils import load_classes
+from tools.utils import scan_files
+
+cli = typer.Typer(help="标签检查 (YOLO txt / LabelMe json)")
+
+# 归一化坐标允许的浮点误差
+EPS = 1e-6
+# 归一化后面积小于该值的多边形视为退化
+MIN_POLYGON_AREA = 1e-8
+
+
+class Task(str, Enum):
+    det = "det"
+    seg = "seg"
+    pose = "pose"
+
+
+def make_issue(file, line, code, message):
+    # txt 标签的 line 为行号(从 1 开始), json 标签为 shapes 下标
+    return {"file": str(file), "line": line, "code": code, "message": message}
+
+
+def parse_yolo_files(files):
+    """批量读取 YOLO 标签, 所有行拼接为一个扁平数组, 返回数组与每行的元信息"""
+    tokens, row_lens, row_files, row_lines = [], [], [], []
+    issues = []
+
+    for file_idx, file in enumerate(files):
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError) as e:
+            issues.append(make_issue(file, 0, "parse_error", str(e)))
+            continue
+
+        for line_no, line in enumerate(lines, 1):
+            parts = line.split()
+            if not parts:
+                continue
+            tokens.extend(parts)
+            row_lens.append(len(parts))
+            row_files.append(file_idx)
+            row_lines.append(line_no)
+
+    row_lens = np.asarray(row_lens, dtype=np.int64)
+    row_files = np.asarray(row_files, dtype=np.int64)
+    row_lines = np.asarray(row_lines, dtype=np.int64)
+
+    try:
+        values = np.asarray(tokens, dtype=np.float64)
+    except ValueError:
+        # 存在非数字字段, 逐行定位后剔除
+        keep = np.ones(len(row_lens), dtype=bool)
+        values = []
+        pos = 0
+        for i, n in enumerate(row_lens):
+            row = tokens[pos : pos + n]
+            pos += n
+            try:
+                values.extend([float(t) for t in row])
+            except ValueError:
+                keep[i] = False
+                issues.append(
+                    make_issue(
+                        files[row_files[i]], int(row_lines[i]), "parse_error", "包含非数字字段"
+                    )
+                )
+        values = np.asarray(values, dtype=np.float64)
+        row_lens, row_files, row_lines = row_lens[keep], row_files[keep], row_lines[keep]
+
+    return values, row_lens, row_files, row_lines, issues
+
+
+def lint_yolo(files, task, num_classes, num_kpts, kpt_dim):
+    values, row_lens, row_files, row_lines, issues = parse_yolo_files(files)
+    if len(row_lens) == 0:
+        return issues
+
+    starts = np.concatenate(([0], np.cumsum(row_lens)[:-1]))
+    flagged = []
+
+    def flag(mask, code, message):
+        for r in np.flatnonzero(mask):
+            flagged.append((int(r), code, message))
+
+    # 类别 id
+    class_ids = values[starts]
+    bad_class = (class_ids != np.round(class_ids)) | (class_ids < 0)
+    if num_classes is not None:
+        bad_class |= class_ids >= num_classes
+    flag(bad_class, "bad_class", "类别 id 非法或超出 classes.txt 范围")
+
+    # 列数
+    if task == Task.det:
+        valid_len = row_lens == 5
+        expected = "5"
+    elif task == Task.pose:
+        if num_kpts is None:
+            # 未指定关键点数量时取出现最多的列数
+            lens, counts = np.unique(row_lens, return_counts=True)
+            expected_len = int(lens[np.argmax(counts)])
+        else:
+            expected_len = 5 + num_kpts * kpt_dim
+        valid_len = row_lens == expected_len
+        expected = str(expected_len)
+    else:
+        valid_len = (row_lens >= 7) & (row_lens % 2 == 1)
+        expected = "奇数且 >= 7"
+    flag(~valid_len, "bad_columns", f"列数错误, 期望 {expected}")
+
+    # 坐标范围, 排除类别列与关键点可见性列
+    coord_mask = np.ones(len(values), dtype=bool)
+    coord_mask[starts] = False
+    if task == Task.pose and kpt_dim == 3:
+        rows = np.flatnonzero(valid_len)
+        if len(rows) and expected_len > 5:
+            vis_idx = (starts[rows, None] + np.arange(7, expected_len, 3)).ravel()
+            coord_mask[vis_idx] = False
+            vis = values[vis_idx].reshape(len(rows), -1)
+            bad_vis = np.zeros(len(row_lens), dtype=bool)
+            bad_vis[rows] = ~np.isin(vis, (0, 1, 2)).all(axis=1)
+            flag(bad_vis, "bad_visibility", "关键点可见性应为 0/1/2")
+    # NaN 与任何值比较都为 False, 范围检查无法发现, 单独检查
+    finite = np.isfinite(values)
+    flag(np.add.reduceat(~finite, starts) > 0, "non_finite", "包含 nan/inf")
+    # 列数错误的行无法区分坐标列和可见性列, 只报告 bad_columns
+    out_range = coord_mask & finite & ((values < -EPS) | (values > 1 + EPS))
+    flag(valid_len & (np.add.reduceat(out_range, starts) > 0), "out_of_range", "坐标超出 [0, 1]")
+
+    if task in (Task.det, Task.pose):
+        rows = np.flatnonzero(valid_len)
+        boxes = values[starts[rows, None] + np.arange(5)]
+        bad_size = np.zeros(len(row_lens), dtype=bool)
+        bad_size[rows] = (boxes[:, 3] <= 0) | (boxes[:, 4] <= 0)
+        flag(bad_size, "bad_size", "目标框宽高非正")
+
+        # 同一文件内类别与坐标完全相同的目标框
+        keys = np.column_stack((row_files[rows], np.round(boxes, 6)))
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        dup = np.zeros(len(row_lens), dtype=bool)
+        dup[rows] = first[inverse.ravel()] != np.arange(len(rows))
+        flag(dup, "duplicate", "重复目标框")
+    else:
+        rows = np.flatnonzero(valid_len)
+        if len(rows):
+            n_pts = (row_lens[rows] - 1) // 2
+            pt_row = np.repeat(rows, n_pts)
+            seg_starts = np.concatenate(([0], np.cumsum(n_pts)[:-1]))
+            local = np.arange(n_pts.sum()) - np.repeat(seg_starts, n_pts)
+            x_idx = starts[pt_row] + 1 + 2 * local
+            area = shoelace_area(values[x_idx], values[x_idx + 1], seg_starts)
+            degenerate = np.zeros(len(row_lens), dtype=bool)
+            degenerate[rows] = area < MIN_POLYGON_AREA
+            flag(degenerate, "degenerate_polygon", "多边形面积为 0")
+
+            seen = set()
+            dup = np.zeros(len(row_lens), dtype=bool)
+            for r in rows:
+                key = (row_files[r], np.round(values[starts[r] : starts[r] + row_lens[r]], 6).tobytes())
+                if key in seen:
+                    dup[r] = True
+                seen.add(key)
+            flag(dup, "duplicate", "重复多边形")
+
+    for r, code, message in flagged:
+        issues.append(make_issue(files[row_files[r]], int(row_lines[r]), code, message))
+    return issues
+
+
+def lint_labelme(file, known_labels):
+    try:
+        data = load_json(file, skip_image_data=True)
+    except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
+        return [make_issue(file, 0, "parse_error", str(e))]
+
+    issues = []
+    shapes = data.get("shapes", [])
+    width, height = data.get("imageWidth"), data.get("imageHeight")
+    if not width or not height:
+        issues.append(make_issue(file, 0, "missing_size", "缺少 imageWidth/imageHeight"))
+
+    for i, shape in enumerate(shapes):
+        if known_labels is not None and shape.get("label") not in known_labels:
+            issues.append(make_issue(file, i, "unknown_label", f"未知标签: {shape.get('label')}"))
+
+    if not shapes:
+        return issues
+
+    lens = np.array([len(s.get("points", [])) for s in shapes])
+    if lens.sum() == 0:
+        return issues
+    points = np.array([p for s in shapes for p in s.get("points", [])], dtype=np.float64)
+    shape_idx = np.repeat(np.arange(len(shapes)), lens)
+
+    if width and height:
+        outside = (
+            (points[:, 0] < 0) | (points[:, 0] > width) | (points[:, 1] < 0) | (points[:, 1] > height)
+        )
+        for i in np.unique(shape_idx[outside]):
+            issues.append(make_issue(file, int(i), "out_of_range", "标注超出图像范围"))
+
+    types = np.array([s.get("shape_type", "polygon") for s in shapes])
+    rect = np.flatnonzero((types == "rectangle") & (lens == 2))
+    if len(rect):
+        seg_starts = np.concatenate(([0], np.cumsum(lens)[:-1]))
+        p1, p2 = points[seg_starts[rect]], points[seg_starts[rect] + 1]
+        for i in rect[(p1[:, 0] == p2[:, 0]) | (p1[:, 1] == p2[:, 1])]:
+            issues.append(make_issue(file, int(i), "bad_size", "矩形宽高为 0"))
+
+    poly = np.flatnonzero(types == "polygon")
+    if len(poly):
+        too_few = poly[lens[poly] < 3]
+        for i in too_few:
+            issues.append(make_issue(file, int(i), "degenerate_polygon", "多边形顶点少于 3 个"))
+        poly = poly[lens[poly] >= 3]
+        if len(poly):
+            keep = np.isin(shape_idx, poly)
+            seg_starts = np.concatenate(([0], np.cumsum(lens[poly])[:-1]))
+            area = shoelace_area(points[keep, 0], points[keep, 1], seg_starts)
+            for i in poly[area <= 0]:
+                issues.append(make_issue(file, int(i), "degenerate_polygon", "多边形面积为 0"))
+
+    return issues
+
+
+def lint_chunk(files, task, classes, point_order, num_kpts, kpt_dim):
+    txt_files = [f for f in files if f.suffix == ".txt"]
+    json_files = [f for f in files if f.suffix == ".json"]
+
+    num_classes = len(classes) if classes else None
+    issues = lint_yolo(txt_files, task, num_classes, num_kpts, kpt_dim) if txt_files else []
+
+    known_labels = set(classes) | set(point_order) if classes else None
+    for file in json_files:
+        issues.extend(lint_labelme(file, known_labels))
+    return len(files), issues
+
+
+@cli.command()
+@instrumented
+def lint(
+    label_path: Path = typer.Argument(..., help="标签目录 (txt/json)"),
+    class_path: Path = typer.Option(None, "--class_path", "-c", help="classes.txt"),
+    task: Task = typer.Option(Task.det, "--task", "-t", help="标签任务类型 [det, seg, pose]"),
+    num_kpts: int = typer.Option(
+        None, "--num_kpts", "-k", help="关键点数量, 默认取 classes.txt 中关键点顺序的长度"
+    ),
+    kpt_dim: int = typer.Option(3, "--kpt_dim", help="每个关键点的字段数 [2: x y, 3: x y v]"),
+    report_path: Path = typer.Option(None, "--report", "-r", help="检查报告输出路径 (json)"),
+    workers: int = typer.Option(os.cpu_count(), "--workers", "-w", help="进程数"),
+    chunk_size: int = typer.Option(2000, "--chunk_size", help="每个任务处理的文件数"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录"),
+):
+    """检查标签文件, 结果写入 json 报告, 存在问题时返回非 0 退出码"""
+    label_dir = label_path.resolve()
+    if not label_dir.is_dir():
+        raise ValueError(f"标签路径不存在或不是目录: {label_dir}")
+    report_path = report_path or label_dir.parent / "lint_report.json"
+
+    classes, point_order = load_classes(class_path) if class_path else ([], [])
+    if task == Task.pose and num_kpts is None and point_order:
+        num_kpts = len(point_order)
+
+    files = (
+        f for f in scan_files(label_dir, {".txt", ".json"}, recursive) if f.name != "classes.txt"
+    )
+
+    issues, num_files = [], 0
+    with Progress() as progress, ProcessPoolExecutor(max_workers=workers) as executor:
+        bar = progress.add_task("Linting...", total=None)
+        for _, (done, chunk_issues) in bounded_map(
+            executor, lint_chunk, chunked(files, chunk_size), task, classes, point_order, num_kpts, kpt_dim
+        ):
+            issues.extend(chunk_issues)
+            num_files += done
+            progress.update(bar, advance=done)
+
+    issues.sort(key=lambda x: (x["file"], x["line"]))
+    counts = Counter(issue["code"] for issue in issues)
+    report = {
+        "label_path": str(label_dir),
+        "task": task.value,
+        "files": num_files,
+        "files_with_issues": len({issue["file"] for issue in issues}),
+        "summary": dict(counts),
+        "issues": issues,
+    }
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for code, count in counts.most_common():
+        typer.echo(f"  {code}: {count}")
+    typer.echo(f"检查完成: 共 {num_files} 个文件, 发现 {len(issues)} 个问题, 报告保存在 {report_path}")
+    if issues:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    cli()
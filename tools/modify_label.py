@@ -1,10 +1,15 @@
-import json
 from enum import Enum
 from pathlib import Path
 
 import typer
 from rich.progress import track
 
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.json_codec import dump_json
+from tools.json_codec import load_json
+from tools.utils import scan_files
+
 cli = typer.Typer(help="修改标签")
 
 
@@ -14,8 +19,10 @@ class LabelFormat(Enum):
 
 
 def modify_txt(file, old_str, new_str, all_cls=None):
-    with open(file, "r") as bf:
-        lines = [i.strip() for i in bf if i.strip()]
+    with stage("read") as s, open(file, "r") as bf:
+        text = bf.read()
+        s.nbytes = len(text)
+    lines = [i.strip() for i in text.splitlines() if i.strip()]
 
     if old_str.isdigit():
         old_str_id = int(old_str)
@@ -46,15 +53,15 @@ def modify_txt(file, old_str, new_str, all_cls=None):
         new_line = " ".join(parts)
         new_lines.append(new_line)
 
-    with open(file, "w") as f:
-        f.write("\n".join(new_lines))
+    text = "\n".join(new_lines)
+    with stage("write", nbytes=len(text)), open(file, "w") as f:
+        f.write(text)
 
     return "Modification completed!"
 
 
-def modify_json(file, old_str, new_str):
-    with open(file, "r") as f:
-        data = json.load(f)
+def modify_json(file, old_str, new_str, compact=False):
+    data = load_json(file)
 
     if new_str is None:
         data["shapes"] = [
@@ -66,16 +73,18 @@ def modify_json(file, old_str, new_str):
             if shape["label"] == old_str:
                 shape["label"] = new_str
 
-    with open(file, "w") as f:
-        json.dump(data, f, indent=4)
+    dump_json(data, file, compact=compact)
 
 
 @cli.command()
+@instrumented
 def modify_label(
     path: Path = typer.Argument(..., help="标签目录"),
     old_str: str = typer.Argument(..., help="要替换或删除的旧标签名"),
     new_str: str = typer.Option(None, "--new_str", "-n", help="要替换的新标签名"),
     cls_path: str = typer.Option(None, "--cls_path", "-c", help="classes.txt"),
+    compact: bool = typer.Option(False, "--compact", help="json 紧凑输出 (无缩进)"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录"),
 ):
     if not path.exists():
         return f"{path} not found!"
@@ -88,13 +97,13 @@ def modify_label(
         with open(cls_path, "r") as af:
             all_cls = [i.strip() for i in af if i.strip()]
 
-    for label_file in track(path.iterdir(), description="Modify..."):
+    for label_file in track(scan_files(path, {is_txt, is_json}, recursive), description="Modify..."):
         if label_file.suffix == is_txt:
             if label_file.stem == "classes":
                 continue
             modify_txt(label_file, old_str, new_str, all_cls)
         elif label_file.suffix == is_json:
-            modify_json(label_file, old_str, new_str)
+            modify_json(label_file, old_str, new_str, compact)
 
     typer.echo("Modification completed!")
 
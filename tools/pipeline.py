@@ -0,0 +1,370 @@
+# 流式多阶段处理管线
+#
+# 各阶段是生成器: 输入 Sample 迭代器, 输出 Sample 迭代器. 每个阶段运行在独立线程中,
+# 阶段之间通过有界队列传递样本, 不再为每一步写出并重新读取完整的中间目录,
+# 只有最后的写出阶段 (以及 find_unlabeled 的旁路输出) 落盘.
+#
+# 配置使用 hydra compose, 示例见 configs/pipeline/ingest.yaml:
+#   datahelper pipeline configs/pipeline/ingest.yaml source.path=videos/ output_path=dataset/
+import hashlib
+import queue
+import shutil
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+import typer
+from rich.progress import Progress
+
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.utils import SUPPORTED_VIDEO_EXTENSIONS
+from tools.utils import scan_files
+
+cli = typer.Typer(help="流式处理管线 (视频抽帧 -> 筛选未标注 -> 转 YOLO -> 划分数据集)")
+
+_END = object()
+
+
+@dataclass
+class Sample:
+    """管线中传递的样本, 图片可以是文件路径或内存中的帧 (BGR ndarray)"""
+
+    stem: str
+    subdir: Path = field(default_factory=Path)  # 相对数据源目录的子目录, 写出时保留
+    image_path: Optional[Path] = None
+    frame: Any = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    label_path: Optional[Path] = None
+    shapes: Optional[list] = None
+    yolo: Optional[str] = None
+    split: Optional[str] = None
+    meta: dict = field(default_factory=dict)
+
+    @property
+    def suffix(self) -> str:
+        return self.image_path.suffix if self.image_path else ".jpg"
+
+    def size(self) -> tuple[int, int]:
+        if self.width is None:
+            if self.frame is not None:
+                self.height, self.width = self.frame.shape[:2]
+            else:
+                from PIL import Image
+
+                with stage("image"), Image.open(self.image_path) as img:
+                    self.width, self.height = img.size
+        return self.width, self.height
+
+
+# ---------------------------------------------------------------- 数据源
+
+
+def video_source(path, gap: int = 50, recursive: bool = False, **_) -> Iterator[Sample]:
+    """与 video_to_images 的 OpenCV 模式相同, 每隔 gap 帧取一帧, 命名为 <视频名>_<序号>"""
+    import cv2
+
+    path = Path(path)
+    videos = [path] if path.is_file() else scan_files(path, SUPPORTED_VIDEO_EXTENSIONS, recursive)
+    for video in videos:
+        subdir = Path() if path.is_file() else video.parent.relative_to(path)
+        cap = cv2.VideoCapture(str(video))
+        if not cap.isOpened():
+            print(f"无法打开视频文件: {video.name}")
+            continue
+        index, saved = 0, 0
+        # 跳过的帧只 grab 不解码
+        while cap.grab():
+            if index % gap == 0:
+                with stage("decode"):
+                    ok, frame = cap.retrieve()
+                if ok:
+                    yield Sample(
+                        stem=f"{video.stem}_{saved:05d}", subdir=subdir, frame=frame, meta={"video": video.name}
+                    )
+                    saved += 1
+            index += 1
+        cap.release()
+
+
+def image_source(path, recursive: bool = False, **_) -> Iterator[Sample]:
+    path = Path(path)
+    for f in scan_files(path, SUPPORTED_IMAGE_EXTENSIONS, recursive):
+        yield Sample(stem=f.stem, subdir=f.parent.relative_to(path), image_path=f)
+
+
+SOURCES = {"videos": video_source, "images": image_source}
+
+
+# ---------------------------------------------------------------- 处理阶段
+
+
+def attach_labels(samples: Iterable[Sample], ctx, path=None, **_) -> Iterator[Sample]:
+    """按文件名查找 LabelMe json, 未指定目录时在图片所在目录查找, 指定时在其下相同的子目录中查找"""
+    from tools.json_codec import load_json
+
+    label_dir = Path(path) if path else None
+    for sample in samples:
+        if label_dir is not None:
+            directory = label_dir / sample.subdir
+        else:
+            directory = sample.image_path.parent if sample.image_path else None
+        if directory is not None:
+            json_file = directory / f"{sample.stem}.json"
+            if json_file.exists():
+                sample.label_path = json_file
+                try:
+                    sample.shapes = load_json(json_file, skip_image_data=True).get("shapes", [])
+                except ValueError as e:
+                    print(f"无法解析标签文件 {json_file}: {e}")
+                    sample.shapes = []
+        yield sample
+
+
+def find_unlabeled(samples: Iterable[Sample], ctx, mode: str = "all", save: bool = True, **_) -> Iterator[Sample]:
+    """
+    与 find_unlabeled_data 相同的筛选规则: 没有标签文件 (single) 或标签为空 (nolabel)
+
+    mode 选择筛出的类型 (single/nolabel/all), 被筛出的样本不再向后传递,
+    save 为真时写入 <output>/find_single 或 <output>/find_nolabel
+    """
+    for sample in samples:
+        kind = "single" if sample.label_path is None else ("nolabel" if not sample.shapes else None)
+        if kind is None or mode not in (kind, "all"):
+            yield sample
+            continue
+        ctx.count(f"unlabeled_{kind}")
+        if save:
+            out_dir = ctx.output_path / f"find_{kind}" / sample.subdir
+            out_dir.mkdir(parents=True, exist_ok=True)
+            write_image(sample, out_dir)
+            if sample.label_path is not None:
+                with stage("copy"):
+                    shutil.copy(sample.label_path, out_dir)
+
+
+def labelme_to_yolo_det(samples: Iterable[Sample], ctx, classes, **_) -> Iterator[Sample]:
+    from tools.labelme_to_yolo_det import shapes_to_yolo_det
+    from tools.utils import load_classes
+
+    class_names, _ = load_classes(classes)
+    for sample in samples:
+        width, height = sample.size()
+        with stage("convert"):
+            sample.yolo = shapes_to_yolo_det(sample.shapes or [], class_names, width, height)
+        yield sample
+    # 与 labelme-to-yolo-det 相同, 输出目录中附带 classes.txt, 可直接用于训练
+    shutil.copy(classes, ctx.output_path / "classes.txt")
+
+
+def splitdata(samples: Iterable[Sample], ctx, ratio: float = 0.1, seed: int = 0, groups=None, **_) -> Iterator[Sample]:
+    """
+    流式划分: 按 (seed, 文件名) 的哈希决定 train/val, 结果与样本到达顺序无关
+
+    指定 dedup 输出的 groups 时按簇编号划分, 同一簇的样本落在同一个集合中.
+    """
+    group_of = {}
+    if groups:
+        from tools.dedup import load_groups
+
+        group_of = load_groups(Path(groups))
+    for sample in samples:
+        rel = sample.subdir / sample.stem
+        key = group_of.get(f"{rel.as_posix()}{sample.suffix}", rel.as_posix())
+        digest = hashlib.blake2b(f"{seed}:{key}".encode(), digest_size=8).digest()
+        sample.split = "val" if int.from_bytes(digest, "big") / 2**64 < ratio else "train"
+        yield sample
+
+
+STAGES = {
+    "attach_labels": attach_labels,
+    "find_unlabeled": find_unlabeled,
+    "labelme_to_yolo_det": labelme_to_yolo_det,
+    "splitdata": splitdata,
+}
+
+
+# ---------------------------------------------------------------- 写出
+
+
+def write_image(sample: Sample, out_dir: Path) -> None:
+    if sample.image_path is not None:
+        with stage("copy"):
+            shutil.copy(sample.image_path, out_dir)
+    else:
+        import cv2
+
+        with stage("write"):
+            cv2.imwrite(str(out_dir / f"{sample.stem}.jpg"), sample.frame)
+
+
+def write_dataset(samples: Iterable[Sample], ctx, progress=None, bar=None) -> None:
+    """写出最终结果: 有划分时为 splitdata 的目录结构, 否则图片和标签写入同一目录"""
+    created = set()
+    for sample in samples:
+        if sample.split:
+            image_dir = ctx.output_path / "images" / sample.split / sample.subdir
+            label_dir = ctx.output_path / "labels" / sample.split / sample.subdir
+        else:
+            image_dir = label_dir = ctx.output_path / sample.subdir
+        for d in (image_dir, label_dir):
+            if d not in created:
+                d.mkdir(parents=True, exist_ok=True)
+                created.add(d)
+
+        write_image(sample, image_dir)
+        if sample.yolo is not None:
+            with stage("write", nbytes=len(sample.yolo)), open(label_dir / f"{sample.stem}.txt", "w") as f:
+                f.write(sample.yolo)
+        ctx.count(f"written_{sample.split or 'all'}")
+        if progress is not None:
+            progress.update(bar, advance=1)
+
+
+# ---------------------------------------------------------------- 运行
+
+
+class Context:
+    def __init__(self, output_path: Path):
+        self.output_path = output_path
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+
+def iter_queue(q: queue.Queue, stop: threading.Event) -> Iterator[Sample]:
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _END:
+            return
+        yield item
+
+
+def put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """队列满时阻塞, 其他阶段出错时放弃"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def run_stages(
+    source: Iterator[Sample],
+    stages: List[Callable[[Iterable[Sample]], Iterator[Sample]]],
+    sink: Callable[[Iterable[Sample]], None],
+    queue_size: int = 64,
+) -> None:
+    """
+    源、各阶段和写出各占一个线程, 相邻两者之间为容量 queue_size 的队列
+
+    下游变慢时上游在 put 处阻塞, 内存占用上限约为 (阶段数 + 1) * queue_size 个样本.
+    任一线程出错时其余线程尽快退出, 异常在调用线程中重新抛出.
+    """
+    stop = threading.Event()
+    errors = []
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def produce(items, out_q):
+        try:
+            for item in items:
+                if not put(out_q, item, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            put(out_q, _END, stop)
+
+    def consume(in_q):
+        try:
+            sink(iter_queue(in_q, stop))
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=produce, args=(source, queues[0]), name="source", daemon=True)]
+    for i, fn in enumerate(stages):
+        threads.append(
+            threading.Thread(
+                target=produce, args=(fn(iter_queue(queues[i], stop)), queues[i + 1]), name=f"stage{i}", daemon=True
+            )
+        )
+    threads.append(threading.Thread(target=consume, args=(queues[-1],), name="sink", daemon=True))
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+
+
+def build(cfg, ctx: Context):
+    from omegaconf import OmegaConf
+
+    source_cfg = OmegaConf.to_container(cfg.source, resolve=True)
+    source_type = source_cfg.pop("type")
+    if source_type not in SOURCES:
+        raise ValueError(f"不支持的数据源: {source_type}, 仅支持: {list(SOURCES)}")
+    source = SOURCES[source_type](**source_cfg)
+
+    stages = []
+    for stage_cfg in cfg.stages:
+        params = OmegaConf.to_container(stage_cfg, resolve=True)
+        name = params.pop("name")
+        if name not in STAGES:
+            raise ValueError(f"不支持的阶段: {name}, 仅支持: {list(STAGES)}")
+        fn = STAGES[name]
+        stages.append(lambda items, fn=fn, params=params: fn(items, ctx, **params))
+    return source, stages
+
+
+@cli.command()
+@instrumented
+def pipeline(
+    config: Path = typer.Argument(..., help="管线配置 yaml"),
+    overrides: List[str] = typer.Argument(None, help="hydra 覆盖参数, 如 source.path=videos/ stages.2.ratio=0.2"),
+):
+    """按配置串联各处理阶段, 样本在内存中流动, 只在最后写出结果"""
+    from hydra import compose
+    from hydra import initialize_config_dir
+    from omegaconf import OmegaConf
+
+    config = config.resolve()
+    with initialize_config_dir(config_dir=str(config.parent), version_base=None):
+        cfg = compose(config_name=config.stem, overrides=overrides or [])
+
+    output_path = Path(cfg.output_path).resolve()
+    output_path.mkdir(parents=True, exist_ok=True)
+    OmegaConf.save(cfg, output_path / "pipeline.yaml")
+
+    ctx = Context(output_path)
+    source, stages = build(cfg, ctx)
+
+    with Progress() as progress:
+        bar = progress.add_task("Pipeline...", total=None)
+        run_stages(
+            source,
+            stages,
+            lambda items: write_dataset(items, ctx, progress, bar),
+            queue_size=cfg.get("queue_size", 64),
+        )
+
+    summary = ", ".join(f"{k}: {v}" for k, v in sorted(ctx.counters.items()))
+    typer.echo(f"完成 ({summary}), 结果保存在 {output_path}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,178 @@
+# 使用 Ultralytics 检测模型批量预标注, 结果直接写为 LabelMe json
+#
+# 图片解码和 letterbox 在线程池中进行, 与模型推理重叠. 送入模型的已是 imgsz x imgsz 的图片,
+# ultralytics 内部的 letterbox 不再改变尺寸, 检测框按本模块记录的缩放比例和填充还原到原图坐标.
+# 已存在 json 的图片默认跳过, 中断后重新运行即可从断点继续.
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import cv2
+import numpy as np
+import typer
+from rich.progress import Progress
+
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.json_codec import dump_json
+from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.utils import bounded_map
+from tools.utils import chunked
+from tools.utils import output_subdir
+from tools.utils import scan_files
+from tools.yolo_det_to_labelme import DEFAULT_JSON_TEMPLATE
+from tools.yolo_det_to_labelme import rectangle_shape
+
+cli = typer.Typer(help="YOLO 模型批量预标注, 输出 LabelMe json")
+
+PAD_VALUE = 114
+
+
+def letterbox(image: np.ndarray, size: int):
+    """等比缩放后居中填充为 size x size, 返回 (图片, 缩放比例, (左填充, 上填充))"""
+    h, w = image.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = round(w * ratio), round(h * ratio)
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    left, top = (size - new_w) // 2, (size - new_h) // 2
+    image = cv2.copyMakeBorder(
+        image, top, size - new_h - top, left, size - new_w - left,
+        cv2.BORDER_CONSTANT, value=(PAD_VALUE, PAD_VALUE, PAD_VALUE),
+    )
+    return image, ratio, (left, top)
+
+
+def load_image(image_file: Path, imgsz: int):
+    """读取并 letterbox, 返回 (图片, (原宽, 原高), 缩放比例, 填充), 无法读取时返回 None"""
+    with stage("image"):
+        image = cv2.imread(str(image_file))
+    if image is None:
+        return None
+    h, w = image.shape[:2]
+    with stage("letterbox"):
+        boxed, ratio, pad = letterbox(image, imgsz)
+    return boxed, (w, h), ratio, pad
+
+
+def result_to_shapes(result, names, size, ratio, pad) -> list:
+    """检测框从 letterbox 坐标还原到原图坐标, 转为 LabelMe rectangle"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+    xyxy = boxes.xyxy.cpu().numpy().astype(np.float64)
+    xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad[0]) / ratio).clip(0, size[0])
+    xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad[1]) / ratio).clip(0, size[1])
+    class_ids = boxes.cls.cpu().numpy().astype(np.int64)
+    return [rectangle_shape(names[c], *box) for c, box in zip(class_ids.tolist(), xyxy.tolist())]
+
+
+def write_labelme(json_file: Path, image_file: Path, size, shapes, compact: bool) -> None:
+    """先写临时文件再重命名, 中断时不会留下不完整的 json 被下次运行跳过"""
+    data = DEFAULT_JSON_TEMPLATE.copy()
+    data.update(
+        {
+            "imagePath": os.path.relpath(image_file, json_file.parent),
+            "imageWidth": size[0],
+            "imageHeight": size[1],
+            "shapes": shapes,
+        }
+    )
+    tmp_file = json_file.with_name(f".{json_file.name}.tmp")
+    dump_json(data, tmp_file, compact=compact)
+    os.replace(tmp_file, json_file)
+
+
+@cli.command()
+@instrumented
+def prelabel(
+    image_path: Path = typer.Argument(..., help="图片目录"),
+    model_path: str = typer.Argument(..., help="Ultralytics 检测模型 (.pt/.onnx/openvino 目录等)"),
+    output_path: Path = typer.Option(
+        None, "--output_path", "-o", help="json 输出目录, 默认与图片放在同一目录 (LabelMe 直接打开图片目录即可)"
+    ),
+    conf: float = typer.Option(0.25, "--conf", help="置信度阈值"),
+    iou: float = typer.Option(0.7, "--iou", help="NMS IoU 阈值"),
+    imgsz: int = typer.Option(640, "--imgsz", help="推理尺寸"),
+    batch: int = typer.Option(16, "--batch", "-b", help="每批推理的图片数"),
+    workers: int = typer.Option(min(8, os.cpu_count() or 1), "--workers", "-w", help="解码/letterbox 线程数"),
+    device: str = typer.Option("cpu", "--device", help="推理设备, 如 cpu, 0, 0,1"),
+    classes: List[str] = typer.Option(None, "--class", help="仅保留指定类别 (模型中的类别名), 可重复指定"),
+    overwrite: bool = typer.Option(False, "--overwrite", help="覆盖已有的 json, 默认跳过以便中断后继续"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
+    compact: bool = typer.Option(False, "--compact", help="json 紧凑输出 (无缩进)"),
+):
+    """批量推理图片目录, 检测结果写为 LabelMe json 供标注人员修正"""
+    from ultralytics import YOLO
+
+    image_path = image_path.resolve()
+    output_path = (output_path or image_path).resolve()
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    model = YOLO(model_path, task="detect")
+    names = model.names
+    class_ids = None
+    if classes:
+        name_to_id = {name: i for i, name in names.items()}
+        unknown = [c for c in classes if c not in name_to_id]
+        if unknown:
+            raise typer.BadParameter(f"模型中没有类别: {unknown}, 可选: {list(name_to_id)}")
+        class_ids = [name_to_id[c] for c in classes]
+
+    counts = {"labeled": 0, "skipped": 0, "failed": 0, "objects": 0}
+
+    def iter_todo():
+        for image_file in scan_files(image_path, SUPPORTED_IMAGE_EXTENSIONS, recursive, exclude=(output_path,)):
+            rel = image_file.relative_to(image_path)
+            json_file = output_path / rel.with_suffix(".json")
+            if not overwrite and json_file.exists():
+                counts["skipped"] += 1
+                continue
+            yield image_file, rel, json_file
+
+    with Progress() as progress, ThreadPoolExecutor(max_workers=workers) as executor:
+        bar = progress.add_task("Prelabeling...", total=None)
+        # 最多预读两批, 当前批推理时下一批在线程池中解码
+        loaded = bounded_map(
+            executor, lambda item: load_image(item[0], imgsz), iter_todo(), max_in_flight=2 * batch
+        )
+        for chunk in chunked(loaded, batch):
+            ok = []
+            for item, image in chunk:
+                if image is None:
+                    typer.echo(f"无法读取图片: {item[0]}")
+                    counts["failed"] += 1
+                else:
+                    ok.append((item, image))
+            if not ok:
+                continue
+
+            with stage("infer", count=len(ok)):
+                results = model.predict(
+                    [image[0] for _, image in ok],
+                    imgsz=imgsz,
+                    conf=conf,
+                    iou=iou,
+                    device=device,
+                    classes=class_ids,
+                    verbose=False,
+                )
+
+            for ((image_file, rel, json_file), (_, size, ratio, pad)), result in zip(ok, results):
+                with stage("convert"):
+                    shapes = result_to_shapes(result, names, size, ratio, pad)
+                output_subdir(output_path, rel)
+                write_labelme(json_file, image_file, size, shapes, compact)
+                counts["labeled"] += 1
+                counts["objects"] += len(shapes)
+            progress.update(bar, advance=len(chunk))
+
+    typer.echo(
+        f"完成: 预标注 {counts['labeled']} 张, 目标 {counts['objects']} 个, "
+        f"跳过已有 {counts['skipped']} 张, 读取失败 {counts['failed']} 张, 结果保存在 {output_path}"
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,124 @@
+# 输出图片时缩小到训练分辨率
+#
+# 长边超过 max_size 的图片在进程池中用 INTER_AREA 缩小并重新编码, 其余图片原样复制.
+# 缩放后的尺寸只由原尺寸和 max_size 决定 (target_size), 主进程不用等待子进程就能得到新尺寸,
+# 用于换算 LabelMe 的像素坐标; YOLO 标签是归一化坐标, 等比缩放后不需要修改.
+import os
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+from tools.instrument import stage
+
+JPEG_SUFFIXES = {".jpg", ".jpeg"}
+
+
+def target_size(width: int, height: int, max_size: Optional[int]) -> tuple[int, int]:
+    """长边不超过 max_size 的等比缩放尺寸, 不需要缩小时返回原尺寸"""
+    if not max_size or max(width, height) <= max_size:
+        return width, height
+    scale = max_size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def read_reduced(src: Path, width: int, height: int, size: tuple[int, int]):
+    """JPEG 按 1/2, 1/4, 1/8 缩小解码 (DCT 域), 只解码不小于目标尺寸的最小分辨率"""
+    import cv2
+
+    if src.suffix.lower() in JPEG_SUFFIXES:
+        for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if width // factor >= size[0] and height // factor >= size[1]:
+                # 忽略 EXIF 方向, 与 PIL/LabelMe 读取的宽高保持一致
+                return cv2.imread(str(src), flag | cv2.IMREAD_IGNORE_ORIENTATION)
+    return cv2.imread(str(src), cv2.IMREAD_UNCHANGED)
+
+
+def resize_image(src: Path, dst: Path, max_size: int, quality: int) -> Optional[str]:
+    """在子进程中执行, 返回警告信息"""
+    import cv2
+    from PIL import Image
+
+    try:
+        with Image.open(src) as img:
+            width, height = img.size
+    except OSError:
+        shutil.copy(src, dst)
+        return f"无法读取图片尺寸, 已原样复制: {src}"
+
+    size = target_size(width, height, max_size)
+    if size == (width, height):
+        shutil.copy(src, dst)
+        return None
+
+    image = read_reduced(src, width, height, size)
+    if image is None:
+        shutil.copy(src, dst)
+        return f"无法解码图片, 已原样复制: {src}"
+    image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if dst.suffix.lower() in JPEG_SUFFIXES else []
+    if not cv2.imwrite(str(dst), image, params):
+        raise OSError(f"写入图片失败: {dst}")
+    return None
+
+
+class ImageWriter:
+    """
+    将图片写入输出目录, 未指定 max_size 时直接复制
+
+    指定 max_size 时缩放任务提交到进程池, 最多 2 * workers 个任务未完成, 其余在 write 处等待.
+    on_done 在图片写入完成后于主线程调用, 用于依赖输出文件的后续操作 (如建立硬链接).
+    """
+
+    def __init__(self, max_size: Optional[int] = None, quality: int = 95, workers: Optional[int] = None):
+        self.max_size = max_size
+        self.quality = quality
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+        self._pending = deque()
+
+    def __enter__(self):
+        if self.max_size:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._executor is None:
+            return
+        try:
+            if exc_type is None:
+                with stage("resize"):
+                    while self._pending:
+                        self._collect()
+        finally:
+            self._executor.shutdown(cancel_futures=exc_type is not None)
+
+    def _collect(self) -> None:
+        future, on_done = self._pending.popleft()
+        warning = future.result()
+        if warning:
+            print(warning)
+        if on_done is not None:
+            on_done()
+
+    def size(self, width: int, height: int) -> tuple[int, int]:
+        """写出后的图片尺寸"""
+        return target_size(width, height, self.max_size)
+
+    def write(
+        self, src: Path, out_dir: Path, size: Optional[tuple[int, int]] = None, on_done: Optional[Callable] = None
+    ) -> None:
+        """size 为已知的原图尺寸, 不需要缩小时直接复制, 不经过进程池"""
+        if self._executor is None or (size is not None and max(size) <= self.max_size):
+            with stage("copy"):
+                shutil.copy(src, out_dir)
+            if on_done is not None:
+                on_done()
+            return
+
+        future = self._executor.submit(resize_image, src, out_dir / src.name, self.max_size, self.quality)
+        self._pending.append((future, on_done))
+        if len(self._pending) > 2 * self.workers:
+            with stage("resize"):
+                self._collect()
@@ -1,4 +1,3 @@
-import json
 import operator
 import shutil
 from pathlib import Path
@@ -7,8 +6,14 @@ from typing import Dict, List, Optional, Tuple
 import typer
 from rich.progress import track
 
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.json_codec import load_json
+from tools.label_store import LabelStore
 from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
 from tools.utils import create_output_directory
+from tools.utils import output_subdir
+from tools.utils import scan_files
 
 cli = typer.Typer(rich_markup_mode="rich")
 
@@ -22,17 +27,19 @@ OPERATOR_MAPPING = {
 }
 
 
-def find_files(search_dir: Path):
-    txt_label_files = list(search_dir.glob("*.txt"))
-    json_label_files = list(search_dir.glob("*.json"))
-    return txt_label_files + json_label_files
+def find_files(search_dir: Path, recursive: bool = False, exclude=()):
+    """流式产出标签文件, 不在内存中保留完整的文件列表"""
+    return scan_files(search_dir, {".txt", ".json"}, recursive, exclude=exclude)
 
 
 def load_labels(label_file_path: Path) -> Optional[Dict[str, int]]:
     label_counts = {}
     if label_file_path.suffix == ".txt":
-        with open(label_file_path, 'r') as f:
-            for line in f:
+        with stage("read") as s, open(label_file_path, 'r') as f:
+            text = f.read()
+            s.nbytes = len(text)
+        with stage("parse"):
+            for line in text.splitlines():
                 parts = line.strip().split() # 去除首位空白字符并按空格分割
                 if not parts:
                     continue
@@ -41,8 +48,7 @@ def load_labels(label_file_path: Path) -> Optional[Dict[str, int]]:
         return label_counts
 
     elif label_file_path.suffix == ".json":
-        with open(label_file_path, 'r', encoding='utf-8') as f:
-            label_data = json.load(f)
+        label_data = load_json(label_file_path, skip_image_data=True)
 
         for shape in label_data.get('shapes', []):
             class_name = shape.get('label', '').strip()
@@ -53,6 +59,21 @@ def load_labels(label_file_path: Path) -> Optional[Dict[str, int]]:
     return None
 
 
+def iter_label_counts(input_path: Path, store_path: Optional[Path] = None, recursive: bool = False, exclude=()):
+    """
+    返回 (标签数量, (标签文件, 类别数量) 迭代器), 指定标签存储时不再逐个读取标签文件
+
+    逐个读取标签文件时边扫描边处理, 标签数量事先未知, 返回 None.
+    """
+    if store_path is None:
+        return None, ((f, load_labels(f)) for f in find_files(input_path, recursive, exclude))
+
+    store = LabelStore(store_path)
+    return len(store), (
+        (input_path / f"{stem}.txt", store.class_counts(i)) for i, stem in enumerate(store.stems)
+    )
+
+
 def get_corressponding_image_path(label_file_path: Path) -> Optional[Path]:
     for ext in SUPPORTED_IMAGE_EXTENSIONS:
         image_file_path = label_file_path.with_suffix(ext) # 替换文件扩展名
@@ -155,13 +176,15 @@ def check_rule_matching(label_counts: Dict[str, int], **rules) -> bool:
 
 
 def safe_copy_or_move(src: Path, dst: Path, action: str):
-    if action == "copy":
-        shutil.copy2(src, dst)
-    elif action == "move":
-        shutil.move(str(src), str(dst))
+    with stage(action):
+        if action == "copy":
+            shutil.copy2(src, dst)
+        elif action == "move":
+            shutil.move(str(src), str(dst))
 
 
 @cli.command()
+@instrumented
 def main(
     input_path: Path = typer.Argument(..., help="输入目录路径, 包含标签文件(.txt/.json)和图像"),
     output_path: Path = typer.Option(
@@ -181,6 +204,10 @@ def main(
     all: Optional[List[str]] = typer.Option(None, "--all", help="匹配所有指定类别"),
     exact: Optional[List[str]] = typer.Option(None, "--exact", help="精确匹配类别集合和数量"),
     total: Optional[int] = typer.Option(None, "--total", help="匹配总标签数量规则"),
+    store_path: Optional[Path] = typer.Option(
+        None, "--store", help="标签存储目录 (label_store pack 生成), 指定后直接从存储读取类别数量"
+    ),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
 ):
     """
     根据指定的标签规则查找并处理对应的图像和标签文件
@@ -208,8 +235,10 @@ def main(
     output_path = create_output_directory(output_path, input_path, "search_data")
 
     matched_count = 0
-    for label_file in track(find_files(input_path), description="Searching..."):
-        label_counts = load_labels(label_file)
+    num_labels, label_counts_iter = iter_label_counts(input_path, store_path, recursive, exclude=(output_path,))
+    for label_file, label_counts in track(
+        label_counts_iter, total=num_labels, description="Searching..."
+    ):
         if not label_counts:
             continue
 
@@ -220,10 +249,11 @@ def main(
                         for ext in SUPPORTED_IMAGE_EXTENSIONS
                         if label_file.with_suffix(ext).exists()), None)
         if img_file:
-            safe_copy_or_move(img_file, output_path / img_file.name, action)
+            out_dir = output_subdir(output_path, label_file.relative_to(input_path))
+            safe_copy_or_move(img_file, out_dir / img_file.name, action)
 
-            if include_labels:
-                safe_copy_or_move(label_file, output_path / label_file.name, action)
+            if include_labels and label_file.exists():
+                safe_copy_or_move(label_file, out_dir / label_file.name, action)
 
             matched_count += 1
 
@@ -1,3 +1,4 @@
+from itertools import islice
 from pathlib import Path
 
 import cv2
@@ -5,7 +6,9 @@ import numpy as np
 import typer
 from PIL import Image, ImageDraw
 
+from tools.instrument import instrumented
 from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.utils import scan_files
 
 cli = typer.Typer(help="关键点可视化，yolo 格式")
 
@@ -92,20 +95,23 @@ def draw_pose(pil_image, data, classes, point_order):
 
 
 @cli.command()
+@instrumented
 def show(
     image_path: Path = typer.Argument(..., help="图片目录"),
     class_path: Path = typer.Argument(
         ..., help="classes.txt, 目标分类和关键点分类(按实际顺序排列)中间用空行分隔"
     ),
     label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归查找子目录中的图片"),
 ):
     label_path = image_path if label_path is None else label_path
-    images = sorted(
-        [f for f in image_path.iterdir() if f.suffix.lower() in SUPPORTED_IMAGE_EXTENSIONS]
-    )
+    # 按需从扫描结果中取图片, 大目录无需等待扫描完成即可显示第一张
+    pending = scan_files(image_path, SUPPORTED_IMAGE_EXTENSIONS, recursive)
+    images = list(islice(pending, 1))
     if not images:
         print("No images found in the specified directory.")
         return
+    scanned = False
 
     with open(class_path, "r") as f:
         classes = f.read().splitlines()
@@ -116,7 +122,7 @@ def show(
     while True:
         img_file = images[current_idx]
         base_name = img_file.stem
-        txt_file = Path(label_path) / f"{base_name}.txt"
+        txt_file = Path(label_path) / img_file.relative_to(image_path).parent / f"{base_name}.txt"
 
         pil_img = Image.open(img_file)
 
@@ -129,7 +135,7 @@ def show(
 
         cv_img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
 
-        info_text = f"{img_file.name} ({current_idx + 1}/{len(images)})"
+        info_text = f"{img_file.relative_to(image_path)} ({current_idx + 1}/{len(images) if scanned else '?'})"
         cv2.putText(
             cv_img, info_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2
         )
@@ -151,8 +157,15 @@ def show(
         if key == ord("q"):
             break
         elif key == ord("d"):
+            if current_idx + 1 == len(images) and not scanned:
+                images.extend(islice(pending, 1))
+                scanned = current_idx + 1 == len(images)
             current_idx = (current_idx + 1) % len(images)
         elif key == ord("a"):
+            if current_idx == 0 and not scanned:
+                # 从第一张向前翻到最后一张时才需要扫描剩余的图片
+                images.extend(pending)
+                scanned = True
             current_idx = (current_idx - 1) % len(images)
 
     cv2.destroyAllWindows()
@@ -5,18 +5,50 @@ from pathlib import Path
 import typer
 from rich.progress import track
 
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.resize import ImageWriter
 from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
 from tools.utils import create_output_directory
+from tools.utils import output_subdir
+from tools.utils import scan_files
 
 cli = typer.Typer(help="划分数据集")
 
 
+def split_by_groups(image_list, groups: dict[str, int], val_count: int):
+    """同一近重复簇的图片整体分到 train 或 val, 避免数据泄漏, image_list 为相对图片目录的路径"""
+    units = {}
+    for image_file in image_list:
+        name = image_file.as_posix()
+        units.setdefault(groups.get(name, name), []).append(image_file)
+    units = list(units.values())
+    random.shuffle(units)
+
+    train_files, val_files = [], []
+    for unit in units:
+        if len(val_files) < val_count:
+            val_files.extend(unit)
+        else:
+            train_files.extend(unit)
+    return train_files, val_files
+
+
 @cli.command()
+@instrumented
 def split_dataset(
     image_path: Path = typer.Argument(..., help="图片目录"),
     label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录"),
     output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
     ratio: float = typer.Option(0.1, "--ratio", "-r", help="分割比例(val集占比)"),
+    groups_file: Path = typer.Option(
+        None, "--groups", "-g", help="dedup 输出的 dedup_groups.json, 同一簇的图片不会同时出现在 train 和 val"
+    ),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
+    max_size: int = typer.Option(
+        None, "--max-size", "--resize", help="长边超过该值的图片缩小到该值 (INTER_AREA) 并重新编码, 默认原样复制"
+    ),
+    quality: int = typer.Option(95, "--quality", help="缩小后 JPEG 的编码质量"),
 ):
     output_path = output_path or image_path.resolve().parent / "splitdata"
     output_path.mkdir(parents=True, exist_ok=True)
@@ -34,26 +66,35 @@ def split_dataset(
     val_label_dir.mkdir(parents=True, exist_ok=True)
 
     image_list = [
-        file for file in image_path.iterdir() if file.suffix in SUPPORTED_IMAGE_EXTENSIONS
+        file.relative_to(image_path)
+        for file in scan_files(image_path, SUPPORTED_IMAGE_EXTENSIONS, recursive, exclude=(output_path,))
     ]
     random.shuffle(image_list)
 
     split_index = int(len(image_list) * ratio)
 
-    train_files = image_list[split_index:]
-    val_files = image_list[:split_index]
+    if groups_file:
+        # dedup 依赖 numpy/PIL, 只在使用 --groups 时导入
+        from tools.dedup import load_groups
+
+        train_files, val_files = split_by_groups(image_list, load_groups(groups_file), split_index)
+    else:
+        train_files = image_list[split_index:]
+        val_files = image_list[:split_index]
 
-    for tr_image_file in track(train_files, description="SplitTrain..."):
-        tr_label_file = label_path / Path(tr_image_file.name).stem
-        tr_label_file = str(tr_label_file) + ".txt"
-        shutil.copy(tr_image_file, train_image_dir)
-        shutil.copy(tr_label_file, train_label_dir)
+    # YOLO 标签为归一化坐标, 图片等比缩小后标签原样复制
+    with ImageWriter(max_size, quality) as writer:
+        for tr_image_file in track(train_files, description="SplitTrain..."):
+            tr_label_file = label_path / tr_image_file.with_suffix(".txt")
+            writer.write(image_path / tr_image_file, output_subdir(train_image_dir, tr_image_file))
+            with stage("copy"):
+                shutil.copy(tr_label_file, output_subdir(train_label_dir, tr_image_file))
 
-    for val_image_file in track(val_files, description="SplitVal..."):
-        val_label_file = label_path / Path(val_image_file.name).stem
-        val_label_file = str(val_label_file) + ".txt"
-        shutil.copy(val_image_file, val_image_dir)
-        shutil.copy(val_label_file, val_label_dir)
+        for val_image_file in track(val_files, description="SplitVal..."):
+            val_label_file = label_path / val_image_file.with_suffix(".txt")
+            writer.write(image_path / val_image_file, output_subdir(val_image_dir, val_image_file))
+            with stage("copy"):
+                shutil.copy(val_label_file, output_subdir(val_label_dir, val_image_file))
 
     typer.echo(f"Finished! file saved in {output_path}")
 
@@ -0,0 +1,326 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import typer
+from rich.progress import Progress
+
+from tools.geometry import segment_starts
+from tools.instrument import instrumented
+from tools.json_codec import dump_json
+from tools.json_codec import load_json
+from tools.label_store import LabelStore
+from tools.lint_labels import parse_yolo_files
+from tools.utils import bounded_map
+from tools.utils import create_output_directory
+from tools.utils import load_classes
+from tools.utils import scan_files
+
+cli = typer.Typer(help="数据集统计 (类别分布/目标尺寸/每图目标数/关键点可见性)")
+
+
+class Task(str, Enum):
+    det = "det"
+    seg = "seg"
+    pose = "pose"
+
+
+def object_table(class_ids, coords, coord_lens, task, kpt_dim):
+    """
+    由扁平坐标计算每个目标的宽高, 以及关键点可见性
+
+    Args:
+        class_ids: (R,) 每行类别
+        coords: 所有行去掉类别列后的坐标拼接
+        coord_lens: (R,) 每行坐标个数
+    Returns:
+        (宽, 高, 关键点下标, 关键点可见性)
+    """
+    coord_lens = np.asarray(coord_lens, dtype=np.int64)
+    starts = segment_starts(coord_lens)
+    empty = np.zeros(0)
+    if len(coord_lens) == 0:
+        return empty, empty, empty.astype(np.int64), empty
+
+    if task == Task.seg:
+        # 多边形取外接矩形
+        n_pts = coord_lens // 2
+        valid = n_pts > 0
+        pt_row = np.repeat(np.arange(len(coord_lens)), n_pts)
+        local = np.arange(n_pts.sum()) - np.repeat(segment_starts(n_pts), n_pts)
+        x_idx = starts[pt_row] + 2 * local
+        xs, ys = coords[x_idx], coords[x_idx + 1]
+        pt_starts = segment_starts(n_pts)[valid]
+        width, height = np.zeros(len(coord_lens)), np.zeros(len(coord_lens))
+        width[valid] = np.maximum.reduceat(xs, pt_starts) - np.minimum.reduceat(xs, pt_starts)
+        height[valid] = np.maximum.reduceat(ys, pt_starts) - np.minimum.reduceat(ys, pt_starts)
+        return width, height, empty.astype(np.int64), empty
+
+    valid = coord_lens >= 4
+    width = np.where(valid, coords[np.minimum(starts + 2, len(coords) - 1)], 0.0)
+    height = np.where(valid, coords[np.minimum(starts + 3, len(coords) - 1)], 0.0)
+
+    if task != Task.pose or kpt_dim != 3:
+        return width, height, empty.astype(np.int64), empty
+
+    # 关键点列数取出现最多的列数
+    lens, counts = np.unique(coord_lens, return_counts=True)
+    row_len = int(lens[np.argmax(counts)])
+    num_kpts = max((row_len - 4) // 3, 0)
+    rows = np.flatnonzero(coord_lens == row_len)
+    vis = coords[starts[rows, None] + 4 + 3 * np.arange(num_kpts) + 2]
+    kpt_ids = np.broadcast_to(np.arange(num_kpts), vis.shape)
+    return width, height, kpt_ids.ravel(), vis.ravel()
+
+
+def stats_yolo_chunk(files, task, kpt_dim):
+    values, row_lens, row_files, _, _ = parse_yolo_files(files)
+    starts = segment_starts(row_lens)
+    class_ids = values[starts].astype(np.int64)
+    coords = np.delete(values, starts)
+    width, height, kpt_ids, vis = object_table(class_ids, coords, row_lens - 1, task, kpt_dim)
+    return {
+        "class": class_ids,
+        "width": width,
+        "height": height,
+        "image": row_files,
+        "num_images": len(files),
+        "kpt": kpt_ids,
+        "vis": vis,
+    }
+
+
+def stats_labelme_chunk(files):
+    classes, widths, heights, images, kpts, vis = [], [], [], [], [], []
+    for i, file in enumerate(files):
+        data = load_json(file, skip_image_data=True)
+        img_width = data.get("imageWidth") or 1
+        img_height = data.get("imageHeight") or 1
+        for shape in data.get("shapes", []):
+            points = np.asarray(shape.get("points", []), dtype=np.float64).reshape(-1, 2)
+            if shape.get("shape_type") == "point":
+                kpts.append(shape.get("label", ""))
+                vis.append(2 if shape.get("group_id") is None else int(shape["group_id"]))
+                continue
+            if len(points) == 0:
+                continue
+            span = points.max(axis=0) - points.min(axis=0)
+            classes.append(shape.get("label", "").strip())
+            widths.append(span[0] / img_width)
+            heights.append(span[1] / img_height)
+            images.append(i)
+    return {
+        "class": np.asarray(classes, dtype=object),
+        "width": np.asarray(widths),
+        "height": np.asarray(heights),
+        "image": np.asarray(images, dtype=np.int64),
+        "num_images": len(files),
+        "kpt": np.asarray(kpts, dtype=object),
+        "vis": np.asarray(vis, dtype=np.float64),
+    }
+
+
+def stats_chunk(files, task, kpt_dim):
+    if files and files[0].suffix == ".json":
+        return stats_labelme_chunk(files)
+    return stats_yolo_chunk(files, task, kpt_dim)
+
+
+def chunk_by_suffix(files, size: int):
+    """txt 和 json 分开分块, 每个任务只处理一种格式"""
+    groups = {}
+    for file in files:
+        group = groups.setdefault(file.suffix, [])
+        group.append(file)
+        if len(group) >= size:
+            yield group
+            groups[file.suffix] = []
+    yield from (group for group in groups.values() if group)
+
+
+def stats_from_store(store: LabelStore, task, kpt_dim):
+    class_ids = np.asarray(store.class_ids, dtype=np.int64)
+    coords = np.asarray(store.values, dtype=np.float64)
+    width, height, kpt_ids, vis = object_table(
+        class_ids, coords, np.diff(store.row_offsets), task, kpt_dim
+    )
+    return {
+        "class": class_ids,
+        "width": width,
+        "height": height,
+        "image": store.image_of_rows(),
+        "num_images": len(store),
+        "kpt": kpt_ids,
+        "vis": vis,
+    }
+
+
+def id_to_name(ids, names):
+    """YOLO 的数字 id 映射为名称, 超出范围的保留 id"""
+    ids = np.asarray(ids)
+    if not names or ids.dtype == object:
+        return ids.astype(str)
+    lookup = np.asarray(names, dtype=object)
+    in_range = (ids >= 0) & (ids < len(names))
+    out = ids.astype(str).astype(object)
+    out[in_range] = lookup[ids[in_range]]
+    return out
+
+
+def merge_chunks(parts, classes, point_order):
+    objects, keypoints = [], []
+    image_offset = 0
+    for part in parts:
+        objects.append(
+            pd.DataFrame(
+                {
+                    "class": id_to_name(part["class"], classes),
+                    "width": part["width"],
+                    "height": part["height"],
+                    "image": part["image"] + image_offset,
+                }
+            )
+        )
+        keypoints.append(
+            pd.DataFrame({"kpt": id_to_name(part["kpt"], point_order), "vis": part["vis"]})
+        )
+        image_offset += part["num_images"]
+    return pd.concat(objects, ignore_index=True), pd.concat(keypoints, ignore_index=True), image_offset
+
+
+def write_plots(output_dir: Path, class_stats, objects, objects_per_image, kpt_stats):
+    # matplotlib 导入较慢, 只在画图时导入
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(max(6, len(class_stats) * 0.4), 4))
+    class_stats["objects"].plot.bar(ax=ax)
+    ax.set_title("Objects per class")
+    fig.tight_layout()
+    fig.savefig(output_dir / "class_balance.png")
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(5, 5))
+    ax.hist2d(objects["width"], objects["height"], bins=50, range=[[0, 1], [0, 1]], cmin=1)
+    ax.set_xlabel("width (normalized)")
+    ax.set_ylabel("height (normalized)")
+    ax.set_title("Box size distribution")
+    fig.tight_layout()
+    fig.savefig(output_dir / "box_size.png")
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(6, 4))
+    counts = np.bincount(objects_per_image)
+    ax.bar(np.arange(len(counts)), counts)
+    ax.set_xlabel("objects per image")
+    ax.set_ylabel("images")
+    fig.tight_layout()
+    fig.savefig(output_dir / "objects_per_image.png")
+    plt.close(fig)
+
+    if kpt_stats is not None:
+        fig, ax = plt.subplots(figsize=(max(6, len(kpt_stats) * 0.4), 4))
+        kpt_stats.plot.bar(stacked=True, ax=ax)
+        ax.set_title("Keypoint visibility rate")
+        fig.tight_layout()
+        fig.savefig(output_dir / "keypoint_visibility.png")
+        plt.close(fig)
+
+
+@cli.command()
+@instrumented
+def stats(
+    label_path: Path = typer.Argument(..., help="标签目录 (txt/json), 或 label_store pack 生成的存储目录"),
+    class_path: Path = typer.Option(None, "--class_path", "-c", help="classes.txt, 用于显示类别名"),
+    task: Task = typer.Option(Task.det, "--task", "-t", help="YOLO 标签任务类型 [det, seg, pose]"),
+    kpt_dim: int = typer.Option(3, "--kpt_dim", help="每个关键点的字段数 [2: x y, 3: x y v]"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    plot: bool = typer.Option(True, "--plot/--no-plot", help="是否输出图表"),
+    workers: int = typer.Option(os.cpu_count(), "--workers", "-w", help="进程数"),
+    chunk_size: int = typer.Option(2000, "--chunk_size", help="每个任务处理的文件数"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录"),
+):
+    """统计类别分布、目标尺寸分布、每张图片目标数和关键点可见率, 输出 json/csv 和图表"""
+    label_dir = label_path.resolve()
+    output_dir = create_output_directory(output_path, label_dir, "label_stats")
+    classes, point_order = load_classes(class_path) if class_path else ([], [])
+
+    if (label_dir / "meta.json").exists() and (label_dir / "values.npy").exists():
+        parts = [stats_from_store(LabelStore(label_dir), task, kpt_dim)]
+    else:
+        files = (
+            f
+            for f in scan_files(label_dir, {".txt", ".json"}, recursive, exclude=(output_dir,))
+            if f.name != "classes.txt"
+        )
+
+        parts = []
+        with Progress() as progress, ProcessPoolExecutor(max_workers=workers) as executor:
+            bar = progress.add_task("Loading labels...", total=None)
+            for chunk, part in bounded_map(executor, stats_chunk, chunk_by_suffix(files, chunk_size), task, kpt_dim):
+                parts.append(part)
+                progress.update(bar, advance=len(chunk))
+
+    if not parts:
+        typer.echo("没有找到标签文件")
+        return
+
+    objects, keypoints, num_images = merge_chunks(parts, classes, point_order)
+    objects["area"] = objects["width"] * objects["height"]
+
+    class_stats = objects.groupby("class").agg(
+        objects=("image", "size"),
+        images=("image", "nunique"),
+        mean_width=("width", "mean"),
+        mean_height=("height", "mean"),
+        median_area=("area", "median"),
+    )
+    class_stats["ratio"] = class_stats["objects"] / max(len(objects), 1)
+    class_stats = class_stats.sort_values("objects", ascending=False)
+
+    objects_per_image = np.bincount(objects["image"].to_numpy(dtype=np.int64), minlength=num_images)
+
+    kpt_stats = None
+    if len(keypoints):
+        kpt_stats = pd.crosstab(keypoints["kpt"], keypoints["vis"].astype(int), normalize="index")
+        kpt_stats.columns = [f"vis_{c}" for c in kpt_stats.columns]
+
+    size_quantiles = objects[["width", "height", "area"]].quantile([0.05, 0.25, 0.5, 0.75, 0.95])
+    summary = {
+        "label_path": str(label_dir),
+        "images": int(num_images),
+        "objects": int(len(objects)),
+        "empty_images": int((objects_per_image == 0).sum()),
+        "objects_per_image": {
+            "mean": float(objects_per_image.mean()) if num_images else 0.0,
+            "max": int(objects_per_image.max()) if num_images else 0,
+            "histogram": np.bincount(objects_per_image).tolist(),
+        },
+        "classes": class_stats.reset_index().to_dict(orient="records"),
+        "box_size_quantiles": {
+            col: {str(q): float(v) for q, v in size_quantiles[col].items()} for col in size_quantiles
+        },
+        "keypoint_visibility": (
+            kpt_stats.reset_index().to_dict(orient="records") if kpt_stats is not None else []
+        ),
+    }
+
+    dump_json(summary, output_dir / "stats.json")
+    class_stats.to_csv(output_dir / "class_stats.csv")
+    histogram = summary["objects_per_image"]["histogram"]
+    pd.DataFrame({"objects": np.arange(len(histogram)), "images": histogram}).to_csv(
+        output_dir / "objects_per_image.csv", index=False
+    )
+    if kpt_stats is not None:
+        kpt_stats.to_csv(output_dir / "keypoint_visibility.csv")
+    if plot:
+        write_plots(output_dir, class_stats, objects, objects_per_image, kpt_stats)
+
+    typer.echo(class_stats.to_string())
+    typer.echo(f"统计完成: {num_images} 张图片, {len(objects)} 个目标, 结果保存在 {output_dir}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,366 @@
+# 大图切块: 图片按相互重叠的滑动窗口切为小图, 标签同步裁剪
+#
+# 框、多边形和关键点都用 NumPy 批量裁剪: 所有框与所有切块一次求交; 多边形对所有
+# (切块, 多边形) 组合同时按 Sutherland-Hodgman 算法依次裁剪四条边. 裁剪后面积占原目标
+# 比例低于 min_visibility 的目标丢弃.
+#
+# 切块映射 (默认为输出目录同级的 <目录名>.tiles.json, 不放在输出目录内以免被当作 LabelMe 标签)
+# 记录每个切块在原图中的位置, 切块上的预测坐标加上 (x, y) 即为原图坐标.
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import typer
+from rich.progress import Progress
+
+from tools.geometry import segment_starts
+from tools.geometry import shoelace_area
+from tools.instrument import instrumented
+from tools.json_codec import dump_json
+from tools.label_objects import OutputFormat
+from tools.label_objects import Task
+from tools.label_objects import empty_objects
+from tools.label_objects import load_labelme_objects
+from tools.label_objects import load_yolo_objects
+from tools.utils import bounded_map
+from tools.utils import create_output_directory
+from tools.utils import iter_image_label_pairs
+from tools.utils import load_classes
+from tools.utils import output_subdir
+from tools.yolo_det_to_labelme import DEFAULT_JSON_TEMPLATE
+from tools.yolo_det_to_labelme import rectangle_shape
+from tools.yolo_format import format_yolo_rows
+
+cli = typer.Typer(help="大图切块, 标签 (框/多边形/关键点) 同步裁剪")
+
+MAP_SUFFIX = ".tiles.json"
+
+
+@dataclass
+class TileOptions:
+    task: Task
+    output_format: OutputFormat
+    classes: list
+    point_order: list
+    tile_size: int
+    overlap: int
+    min_visibility: float
+    kpt_dim: int
+    skip_empty: bool
+    quality: int
+
+
+# ---------------------------------------------------------------- 切块与裁剪
+
+
+def axis_starts(length: int, size: int, stride: int) -> list[int]:
+    if length <= size:
+        return [0]
+    # 最后一块与边缘对齐, 不足一块时向前多重叠一些
+    return list(range(0, length - size, stride)) + [length - size]
+
+
+def tile_grid(width: int, height: int, size: int, overlap: int) -> np.ndarray:
+    """(T, 4) 切块 xyxy, 按行优先排列"""
+    stride = size - overlap
+    xs = axis_starts(width, size, stride)
+    ys = axis_starts(height, size, stride)
+    x1, y1 = (a.ravel() for a in np.meshgrid(xs, ys))
+    return np.column_stack((x1, y1, np.minimum(x1 + size, width), np.minimum(y1 + size, height)))
+
+
+def intersect_boxes(boxes: np.ndarray, tiles: np.ndarray):
+    """(T, B) 的交集 x1 y1 x2 y2 与交集面积"""
+    x1 = np.maximum(tiles[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(tiles[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(tiles[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(tiles[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    return x1, y1, x2, y2, inter
+
+
+def clip_boxes(boxes: np.ndarray, tiles: np.ndarray, min_visibility: float):
+    """返回 (切块下标, 框下标, 切块坐标系下的裁剪框), 按切块下标排序"""
+    x1, y1, x2, y2, inter = intersect_boxes(boxes, tiles)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    visibility = np.divide(inter, area, out=np.zeros_like(inter), where=area > 0)
+    tile_idx, box_idx = np.nonzero((inter > 0) & (visibility >= min_visibility))
+    clipped = np.column_stack(
+        (x1[tile_idx, box_idx], y1[tile_idx, box_idx], x2[tile_idx, box_idx], y2[tile_idx, box_idx])
+    )
+    return tile_idx, box_idx, clipped - np.tile(tiles[tile_idx, :2], 2)
+
+
+def clip_keypoints(kpts: np.ndarray, tiles: np.ndarray):
+    """
+    kpts (n, K, 3) 与对应的切块 (n, 4), 返回切块坐标系下的关键点和保留掩码
+
+    切块外和未标注 (0 0 0) 的关键点置为 0 0 0.
+    """
+    labeled = (kpts[..., 2] > 0) | (kpts[..., 0] != 0) | (kpts[..., 1] != 0)
+    xy = kpts[..., :2] - tiles[:, None, :2]
+    size = (tiles[:, 2:] - tiles[:, :2])[:, None, :]
+    keep = labeled & (xy >= 0).all(axis=-1) & (xy < size).all(axis=-1)
+    out = np.zeros_like(kpts)
+    out[..., :2] = np.where(keep[..., None], xy, 0)
+    out[..., 2] = np.where(keep, kpts[..., 2], 0)
+    return out, keep
+
+
+def clip_half_plane(xy, ring_of, num_rings, axis, bound, keep_greater):
+    """
+    Sutherland-Hodgman 的一步: 所有多边形同时对一条直线裁剪
+
+    xy 为所有多边形的顶点拼接, ring_of 为每个顶点所属的多边形 (非递减),
+    bound 为每个多边形对应的直线位置, 保留 axis 坐标 >= bound (keep_greater) 或 <= bound 的部分.
+    """
+    if len(xy) == 0:
+        return xy, ring_of
+    lens = np.bincount(ring_of, minlength=num_rings)
+    starts = segment_starts(lens)
+    idx = np.arange(len(xy))
+    prev = np.where(idx == starts[ring_of], idx + lens[ring_of] - 1, idx - 1)
+
+    line = bound[ring_of]
+    dist = xy[:, axis] - line if keep_greater else line - xy[:, axis]
+    inside = dist >= 0
+    crossing = inside != inside[prev]
+
+    # 边 prev -> cur 与直线的交点
+    t = np.divide(dist[prev], dist[prev] - dist, out=np.zeros(len(xy)), where=crossing)
+    cross = xy[prev] + t[:, None] * (xy - xy[prev])
+    cross[:, axis] = np.where(crossing, line, cross[:, axis])
+
+    # 每条边输出: 穿入 [交点, cur], 在内 [cur], 穿出 [交点], 在外 []
+    counts = inside.astype(np.int64) + crossing
+    out_starts = np.cumsum(counts) - counts
+    out = np.empty((int(counts.sum()), 2))
+    emit = counts > 0
+    out[out_starts[emit]] = np.where(crossing[:, None], cross, xy)[emit]
+    both = counts == 2
+    out[out_starts[both] + 1] = xy[both]
+    return out, np.repeat(ring_of, counts)
+
+
+def clip_polygons(points: np.ndarray, ring_lens: np.ndarray, tiles: np.ndarray, min_visibility: float):
+    """返回 (切块下标, 多边形下标, 切块坐标系下的顶点, 每个多边形的顶点数), 按切块下标排序"""
+    if len(ring_lens) == 0:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros((0, 2)), np.zeros(0, np.int64)
+    starts = segment_starts(ring_lens)
+    area = shoelace_area(points[:, 0], points[:, 1], starts)
+    bounds = np.column_stack(
+        (np.minimum.reduceat(points[:, 0], starts), np.minimum.reduceat(points[:, 1], starts),
+         np.maximum.reduceat(points[:, 0], starts), np.maximum.reduceat(points[:, 1], starts))
+    )
+
+    # 只有外接矩形与切块相交的组合需要裁剪, 每个组合复制一份顶点
+    tile_idx, poly_idx = np.nonzero(intersect_boxes(bounds, tiles)[4] > 0)
+    pair_lens = ring_lens[poly_idx]
+    pair_of = np.repeat(np.arange(len(poly_idx)), pair_lens)
+    local = np.arange(len(pair_of)) - np.repeat(segment_starts(pair_lens), pair_lens)
+    xy = points[starts[poly_idx][pair_of] + local]
+
+    rect = tiles[tile_idx].astype(np.float64)
+    for axis, col, keep_greater in ((0, 0, True), (0, 2, False), (1, 1, True), (1, 3, False)):
+        xy, pair_of = clip_half_plane(xy, pair_of, len(poly_idx), axis, rect[:, col], keep_greater)
+
+    lens = np.bincount(pair_of, minlength=len(poly_idx))
+    valid = lens >= 3
+    clipped_area = np.zeros(len(poly_idx))
+    if valid.any():
+        sel = valid[pair_of]
+        clipped_area[valid] = shoelace_area(xy[sel, 0], xy[sel, 1], segment_starts(lens[valid]))
+    visibility = np.divide(clipped_area, area[poly_idx], out=np.zeros(len(poly_idx)), where=area[poly_idx] > 0)
+    keep = valid & (clipped_area > 0) & (visibility >= min_visibility)
+
+    sel = keep[pair_of]
+    xy = xy[sel] - rect[pair_of[sel], :2]
+    return tile_idx[keep], poly_idx[keep], xy, lens[keep]
+
+
+# ---------------------------------------------------------------- 写出
+
+
+def yolo_text(opts: TileOptions, box_labels, boxes, kpts, poly_labels, points, ring_lens, width, height) -> str:
+    scale = np.array([width, height], dtype=np.float64)
+    if opts.task == Task.seg:
+        class_ids = [opts.classes.index(label) for label in poly_labels]
+        return format_yolo_rows(class_ids, np.clip(points / scale, 0.0, 1.0).ravel(), (2 * ring_lens).tolist())
+
+    class_ids = [opts.classes.index(label) for label in box_labels]
+    xyxy = boxes / np.tile(scale, 2)
+    rows = np.column_stack(((xyxy[:, :2] + xyxy[:, 2:]) / 2, xyxy[:, 2:] - xyxy[:, :2]))
+    if opts.task == Task.pose:
+        kpts = kpts.copy()
+        kpts[..., :2] /= scale
+        rows = np.column_stack((rows, kpts[..., : opts.kpt_dim].reshape(len(rows), kpts.shape[1] * opts.kpt_dim)))
+    return format_yolo_rows(class_ids, rows.ravel(), [rows.shape[1]] * len(rows))
+
+
+def labelme_data(opts: TileOptions, image_name, box_labels, boxes, kpts, kpt_mask, poly_labels, points, ring_lens, width, height):
+    shapes = [rectangle_shape(label, *box) for label, box in zip(box_labels, boxes.tolist())]
+    for b, k in zip(*np.nonzero(kpt_mask)):
+        x, y, vis = kpts[b, k].tolist()
+        shapes.append(
+            {
+                "label": opts.point_order[k],
+                "points": [[x, y]],
+                "group_id": None if vis == 2 else int(vis),
+                "shape_type": "point",
+                "flags": {},
+            }
+        )
+    for label, ring in zip(poly_labels, np.split(points, np.cumsum(ring_lens)[:-1]) if len(ring_lens) else []):
+        shapes.append({"label": label, "points": ring.tolist(), "group_id": None, "shape_type": "polygon", "flags": {}})
+
+    data = DEFAULT_JSON_TEMPLATE.copy()
+    data.update({"imagePath": image_name, "imageWidth": width, "imageHeight": height, "shapes": shapes})
+    return data
+
+
+def tile_image(pair, output_path: Path, opts: TileOptions):
+    """在子进程中切一张图片, 返回 (原图宽, 原高, 切块记录), 无法读取时返回 None"""
+    import cv2
+
+    img_file, rel, label_file = pair
+    # 忽略 EXIF 方向, 与 LabelMe/PIL 读取的宽高保持一致
+    image = cv2.imread(str(img_file), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+
+    if label_file is None:
+        objects = empty_objects(len(opts.point_order))
+    elif label_file.suffix == ".json":
+        objects = load_labelme_objects(label_file, opts.point_order)
+    else:
+        objects = load_yolo_objects(
+            label_file, opts.task, width, height, opts.classes, opts.point_order, opts.kpt_dim
+        )
+
+    tiles = tile_grid(width, height, opts.tile_size, opts.overlap)
+    box_tile, box_idx, boxes = clip_boxes(objects.boxes, tiles, opts.min_visibility)
+    kpts, kpt_mask = clip_keypoints(objects.kpts[box_idx], tiles[box_tile])
+    poly_tile, poly_idx, points, ring_lens = clip_polygons(
+        objects.points, objects.ring_lens, tiles, opts.min_visibility
+    )
+    # 结果按切块排序, 每个切块对应一段连续区间
+    box_bounds = np.searchsorted(box_tile, np.arange(len(tiles) + 1))
+    poly_bounds = np.searchsorted(poly_tile, np.arange(len(tiles) + 1))
+    point_offsets = np.concatenate(([0], np.cumsum(ring_lens)))
+
+    out_dir = output_subdir(output_path, rel)
+    params = [cv2.IMWRITE_JPEG_QUALITY, opts.quality] if img_file.suffix.lower() in (".jpg", ".jpeg") else []
+    records = []
+    for t, (x1, y1, x2, y2) in enumerate(tiles.tolist()):
+        b = slice(box_bounds[t], box_bounds[t + 1])
+        p = slice(poly_bounds[t], poly_bounds[t + 1])
+        pts = slice(point_offsets[p.start], point_offsets[p.stop])
+        if opts.output_format == OutputFormat.yolo and opts.task != Task.seg:
+            num_objects = b.stop - b.start
+        elif opts.output_format == OutputFormat.yolo:
+            num_objects = p.stop - p.start
+        else:
+            num_objects = (b.stop - b.start) + (p.stop - p.start)
+        if opts.skip_empty and num_objects == 0:
+            continue
+
+        name = f"{img_file.stem}_{x1}_{y1}"
+        tile_width, tile_height = x2 - x1, y2 - y1
+        cv2.imwrite(str(out_dir / f"{name}{img_file.suffix}"), image[y1:y2, x1:x2], params)
+
+        box_labels = [objects.box_labels[i] for i in box_idx[b]]
+        poly_labels = [objects.poly_labels[i] for i in poly_idx[p]]
+        if label_file is not None and opts.output_format == OutputFormat.yolo:
+            text = yolo_text(
+                opts, box_labels, boxes[b], kpts[b], poly_labels, points[pts], ring_lens[p], tile_width, tile_height
+            )
+            with open(out_dir / f"{name}.txt", "w") as f:
+                f.write(text)
+        elif label_file is not None:
+            data = labelme_data(
+                opts, f"{name}{img_file.suffix}", box_labels, boxes[b], kpts[b], kpt_mask[b],
+                poly_labels, points[pts], ring_lens[p], tile_width, tile_height,
+            )
+            dump_json(data, out_dir / f"{name}.json")
+
+        records.append(
+            {
+                "tile": (rel.parent / f"{name}{img_file.suffix}").as_posix(),
+                "source": rel.as_posix(),
+                "x": x1,
+                "y": y1,
+                "width": tile_width,
+                "height": tile_height,
+                "objects": int(num_objects),
+            }
+        )
+    return width, height, records
+
+
+@cli.command()
+@instrumented
+def tile(
+    image_path: Path = typer.Argument(..., help="图片目录"),
+    class_path: Path = typer.Argument(..., help="classes.txt, 关键点任务中目标类别与关键点顺序以空行分隔"),
+    label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录 (LabelMe json 或 YOLO txt)"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    map_path: Path = typer.Option(
+        None, "--map", help=f"切块到原图的映射 json, 默认为输出目录同级的 <目录名>{MAP_SUFFIX}"
+    ),
+    task: Task = typer.Option(
+        Task.det, "--task", "-t", help="YOLO 标签的任务类型 [det, seg, pose], 决定 txt 的读取和输出内容"
+    ),
+    output_format: OutputFormat = typer.Option(OutputFormat.yolo, "--format", "-f", help="输出标签格式 [yolo, labelme]"),
+    tile_size: int = typer.Option(1024, "--tile_size", "-s", help="切块边长 (像素)"),
+    overlap: int = typer.Option(128, "--overlap", help="相邻切块的重叠像素数, 建议不小于最大目标的尺寸"),
+    min_visibility: float = typer.Option(
+        0.3, "--min_visibility", help="目标裁剪后保留的面积比例低于该值时丢弃"
+    ),
+    kpt_dim: int = typer.Option(3, "--kpt_dim", help="YOLO 关键点的字段数 [2: x y, 3: x y v]"),
+    skip_empty: bool = typer.Option(False, "--skip-empty", help="不输出没有目标的切块"),
+    quality: int = typer.Option(95, "--quality", help="切块 JPEG 的编码质量"),
+    workers: int = typer.Option(os.cpu_count(), "--workers", "-w", help="进程数"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
+):
+    """将大图切为相互重叠的切块, 同步裁剪框/多边形/关键点, 并输出切块到原图的映射"""
+    if not 0 <= overlap < tile_size:
+        raise typer.BadParameter("重叠像素数需小于切块边长")
+    label_path = label_path or image_path
+    output_path = create_output_directory(output_path, image_path, f"tiles_{tile_size}")
+    map_path = map_path or output_path.with_name(f"{output_path.name}{MAP_SUFFIX}")
+    classes, point_order = load_classes(class_path)
+    opts = TileOptions(
+        task, output_format, classes, point_order, tile_size, overlap, min_visibility, kpt_dim, skip_empty, quality
+    )
+
+    pairs = iter_image_label_pairs(
+        image_path, label_path, recursive, label_suffixes=(".json", ".txt"), exclude=(output_path,)
+    )
+    sources, tiles = {}, []
+    with Progress() as progress, ProcessPoolExecutor(max_workers=workers) as executor:
+        bar = progress.add_task("Tiling...", total=None)
+        for (img_file, rel, _), result in bounded_map(executor, tile_image, pairs, output_path, opts):
+            if result is None:
+                typer.echo(f"无法读取图片: {img_file}")
+            else:
+                width, height, records = result
+                sources[rel.as_posix()] = {"width": width, "height": height}
+                tiles.extend(records)
+            progress.update(bar, advance=1)
+
+    dump_json(
+        {"tile_size": tile_size, "overlap": overlap, "sources": sources, "tiles": tiles},
+        map_path,
+        compact=True,
+    )
+    if output_format == OutputFormat.yolo:
+        (output_path / "classes.txt").write_text(class_path.read_text())
+
+    typer.echo(f"完成: {len(sources)} 张图片切为 {len(tiles)} 块, 结果保存在 {output_path}, 映射保存在 {map_path}")
+
+
+if __name__ == "__main__":
+    cli()
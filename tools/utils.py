@@ -1,4 +1,10 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from tools.instrument import stage
 
 SUPPORTED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp'}
 SUPPORTED_VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.flv', '.mov', '.wmv', '.webm'}
@@ -9,3 +15,121 @@ def create_output_directory(output_dir, source_path, folder_name) -> Path:
 
     return output_dir
 
+
+
+def load_classes(class_path) -> tuple[list[str], list[str]]:
+    """读取 classes.txt, 关键点任务中目标类别与关键点顺序以空行分隔"""
+    with open(class_path, "r") as f:
+        classes = f.read().splitlines()
+
+    if "" in classes:
+        split_idx = classes.index("")
+        return classes[:split_idx], [c for c in classes[split_idx + 1 :] if c]
+    return classes, []
+
+
+def scan_dir(directory: Path, suffixes=None, exclude=frozenset()) -> tuple[list[Path], list[Path]]:
+    """
+    os.scandir 读取一层目录, 返回排序后的 (文件, 子目录)
+
+    跳过隐藏文件 (如工具的缓存文件) 和 exclude 中的目录 (如位于输入目录内的输出目录).
+    """
+    files, dirs = [], []
+    with stage("list"), os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir():
+                if not exclude or Path(entry.path).resolve() not in exclude:
+                    dirs.append(Path(entry.path))
+            elif suffixes is None or os.path.splitext(entry.name)[1].lower() in suffixes:
+                files.append(Path(entry.path))
+    files.sort()
+    dirs.sort()
+    return files, dirs
+
+
+def scan_files(root, suffixes=None, recursive: bool = False, workers: int = 8, exclude=()) -> Iterator[Path]:
+    """
+    流式列出目录中的文件, suffixes 为小写后缀集合, 为 None 时不过滤
+
+    recursive 时多个线程并行读取子目录, 按广度优先顺序逐个目录产出结果, 顺序确定.
+    同时在读取的目录数不超过 2 * workers, 内存占用只与待读取的目录数有关, 与文件总数无关.
+    """
+    root = Path(root)
+    if not recursive:
+        yield from scan_dir(root, suffixes)[0]
+        return
+
+    exclude = frozenset(Path(p).resolve() for p in exclude if p)
+    pending = deque([root])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = deque()
+        while pending or running:
+            while pending and len(running) < 2 * workers:
+                running.append(executor.submit(scan_dir, pending.popleft(), suffixes, exclude))
+            files, dirs = running.popleft().result()
+            pending.extend(dirs)
+            yield from files
+
+
+def iter_image_label_pairs(
+    image_root,
+    label_root=None,
+    recursive: bool = False,
+    label_suffixes: Iterable[str] = (".txt", ".json"),
+    workers: int = 8,
+    exclude=(),
+) -> Iterator[tuple[Path, Path, Optional[Path]]]:
+    """
+    流式产出 (图片, 相对路径, 标签), 标签在 label_root 的相同子目录下按同名查找, 不存在时为 None
+
+    相对路径为图片相对 image_root 的路径, 输出时用于保留原有的子目录结构.
+    """
+    image_root = Path(image_root)
+    label_root = Path(label_root) if label_root else image_root
+    for image_file in scan_files(image_root, SUPPORTED_IMAGE_EXTENSIONS, recursive, workers, exclude):
+        rel = image_file.relative_to(image_root)
+        label_dir = label_root / rel.parent
+        label_file = next(
+            (label_dir / f"{image_file.stem}{ext}" for ext in label_suffixes
+             if (label_dir / f"{image_file.stem}{ext}").exists()),
+            None,
+        )
+        yield image_file, rel, label_file
+
+
+def output_subdir(output_dir: Path, rel: Path) -> Path:
+    """按相对路径 rel 在输出目录下创建对应的子目录"""
+    out = output_dir / rel.parent
+    if rel.parent != Path("."):
+        out.mkdir(parents=True, exist_ok=True)
+    return out
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bounded_map(executor, fn, items: Iterable, *args, max_in_flight: Optional[int] = None):
+    """
+    与 executor.map 类似, 按提交顺序产出 (item, fn(item, *args)),
+    但最多只有 max_in_flight 个任务在执行或等待, 不会一次性提交全部任务
+    """
+    max_in_flight = max_in_flight or 2 * (getattr(executor, "_max_workers", None) or os.cpu_count() or 1)
+    running = deque()
+    for item in items:
+        running.append((item, executor.submit(fn, item, *args)))
+        if len(running) >= max_in_flight:
+            item, future = running.popleft()
+            yield item, future.result()
+    while running:
+        item, future = running.popleft()
+        yield item, future.result()
@@ -0,0 +1,195 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import typer
+from PIL import Image
+from rich.progress import Progress
+
+from tools.find_unlabeled_data import move_or_copy
+from tools.instrument import instrumented
+from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.utils import bounded_map
+from tools.utils import chunked
+from tools.utils import create_output_directory
+from tools.utils import output_subdir
+from tools.utils import scan_files
+
+cli = typer.Typer(help="图片完整性校验")
+
+CACHE_NAME = ".verify_images_cache.json"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IEND = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+# 读取的文件尾长度, JPEG 的 EOI 之后可能还有相机/编辑软件追加的数据
+TAIL_BYTES = 1024
+
+# 校验等级, 缓存中等级不低于本次要求时直接复用结果
+LEVEL_HEADER = 1
+LEVEL_DECODE = 2
+
+
+def check_header(image_file: Path) -> str | None:
+    """检查文件头/文件尾标记, 返回错误原因, 正常返回 None"""
+    size = image_file.stat().st_size
+    if size == 0:
+        return "空文件"
+
+    with open(image_file, "rb") as f:
+        head = f.read(16)
+        f.seek(max(size - TAIL_BYTES, 0))
+        tail = f.read()
+
+    suffix = image_file.suffix.lower()
+    if suffix in (".jpg", ".jpeg"):
+        if head[:2] != b"\xff\xd8":
+            return "缺少 JPEG SOI 标记"
+        # 部分相机会在 EOI 之后补 0 或追加其他数据, 只要文件尾附近有 EOI 即可
+        if b"\xff\xd9" not in tail:
+            return "缺少 JPEG EOI 标记 (文件截断)"
+    elif suffix == ".png":
+        if head[:8] != PNG_SIGNATURE:
+            return "PNG 文件签名错误"
+        if not tail.endswith(PNG_IEND):
+            return "缺少 PNG IEND 块 (文件截断)"
+    elif suffix == ".bmp":
+        if head[:2] != b"BM":
+            return "BMP 文件头错误"
+        if int.from_bytes(head[2:6], "little") > size:
+            return "BMP 文件截断"
+    elif suffix == ".webp":
+        if head[:4] != b"RIFF" or head[8:12] != b"WEBP":
+            return "WEBP 文件头错误"
+        if int.from_bytes(head[4:8], "little") + 8 > size:
+            return "WEBP 文件截断"
+    elif suffix == ".tiff":
+        if head[:4] not in (b"II*\x00", b"MM\x00*"):
+            return "TIFF 文件头错误"
+
+    return None
+
+
+def check_decode(image_file: Path) -> str | None:
+    try:
+        with Image.open(image_file) as img:
+            img.load()
+    except Exception as e:
+        return f"解码失败: {e}"
+    return None
+
+
+def verify_chunk(files, level):
+    results = []
+    for image_file in files:
+        try:
+            reason = check_header(image_file)
+            if reason is None and level >= LEVEL_DECODE:
+                reason = check_decode(image_file)
+        except OSError as e:
+            reason = str(e)
+        results.append((str(image_file), reason))
+    return results
+
+
+def load_cache(cache_file: Path) -> dict:
+    if not cache_file.exists():
+        return {}
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+
+def save_cache(cache_file: Path, cache: dict) -> None:
+    tmp_file = cache_file.with_suffix(".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_file, cache_file)
+
+
+@cli.command()
+@instrumented
+def verify_images(
+    image_path: Path = typer.Argument(..., help="图片目录"),
+    decode: bool = typer.Option(False, "--decode", "-d", help="完整解码校验 (较慢)"),
+    cache_path: Path = typer.Option(None, "--cache", help=f"缓存文件, 默认为图片目录下的 {CACHE_NAME}"),
+    no_cache: bool = typer.Option(False, "--no_cache", help="忽略已有缓存, 全部重新校验"),
+    quarantine: bool = typer.Option(False, "--quarantine", "-q", help="隔离损坏图片及其标签"),
+    label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录, 隔离时一并处理"),
+    output_path: Path = typer.Option(None, "--output_path", "-o", help="隔离目录"),
+    copy: bool = typer.Option(False, "--copy", "-c", help="复制或是移动"),
+    workers: int = typer.Option(os.cpu_count(), "--workers", "-w", help="进程数"),
+    chunk_size: int = typer.Option(500, "--chunk_size", help="每个任务处理的文件数"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 隔离时保留相对路径"),
+):
+    """校验图片文件头/尾标记, 可选完整解码, 结果按 路径+mtime+大小 缓存"""
+    img_dir = image_path.resolve()
+    if not img_dir.is_dir():
+        raise ValueError(f"图片路径不存在或不是目录: {img_dir}")
+    label_dir = label_path.resolve() if label_path else img_dir
+    cache_file = cache_path or img_dir / CACHE_NAME
+    level = LEVEL_DECODE if decode else LEVEL_HEADER
+
+    cache = {} if no_cache else load_cache(cache_file)
+
+    stats, bad = {}, {}
+
+    def iter_pending():
+        """边扫描边筛选需要校验的图片, 校验与目录扫描同时进行"""
+        for image_file in scan_files(img_dir, SUPPORTED_IMAGE_EXTENSIONS, recursive, exclude=(output_path,)):
+            st = image_file.stat()
+            stats[str(image_file)] = (st.st_mtime_ns, st.st_size)
+            entry = cache.get(str(image_file))
+            if (
+                entry
+                and entry["mtime"] == st.st_mtime_ns
+                and entry["size"] == st.st_size
+                and entry["level"] >= level
+            ):
+                if entry["error"]:
+                    bad[str(image_file)] = entry["error"]
+            else:
+                yield image_file
+
+    verified = 0
+    with Progress() as progress, ProcessPoolExecutor(max_workers=workers) as executor:
+        bar = progress.add_task("Verifying...", total=None)
+        for _, results in bounded_map(executor, verify_chunk, chunked(iter_pending(), chunk_size), level):
+            for file, reason in results:
+                mtime, size = stats[file]
+                cache[file] = {"mtime": mtime, "size": size, "level": level, "error": reason}
+                if reason:
+                    bad[file] = reason
+            verified += len(results)
+            progress.update(bar, advance=len(results))
+
+    # 删除已不存在文件的缓存
+    cache = {k: v for k, v in cache.items() if k in stats}
+
+    for file, reason in sorted(bad.items()):
+        typer.echo(f"{Path(file).relative_to(img_dir)}: {reason}")
+
+    if quarantine and bad:
+        output_dir = create_output_directory(output_path, img_dir, "bad_images")
+        for file in bad:
+            image_file = Path(file)
+            rel = image_file.relative_to(img_dir)
+            out_dir = output_subdir(output_dir, rel)
+            move_or_copy(image_file, out_dir, copy)
+            for suffix in (".txt", ".json"):
+                label_file = label_dir / rel.parent / f"{image_file.stem}{suffix}"
+                if label_file.exists():
+                    move_or_copy(label_file, out_dir, copy)
+            if not copy:
+                cache.pop(file, None)
+        typer.echo(f"损坏图片已{'复制' if copy else '移动'}至 {output_dir}")
+
+    save_cache(cache_file, cache)
+    typer.echo(
+        f"校验完成: 共 {len(stats)} 张图片, 本次校验 {verified} 张, 损坏 {len(bad)} 张"
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -6,13 +6,15 @@ import cv2
 import typer
 from rich.progress import Progress
 
+from tools.instrument import instrumented
 from tools.utils import SUPPORTED_VIDEO_EXTENSIONS
 from tools.utils import create_output_directory
+from tools.utils import scan_files
 
 cli = typer.Typer(help="视频转帧")
 
 
-def get_video_files_iterator(path: str):
+def get_video_files_iterator(path: str, recursive: bool = False):
     """优化的迭代器版本"""
     input_path = Path(path)
 
@@ -23,10 +25,8 @@ def get_video_files_iterator(path: str):
             print(f"文件 {path} 不是支持的视频格式")
         return
 
-    # 对于目录，使用迭代器避免一次性加载所有文件
-    for file_path in sorted(input_path.iterdir()):  # 保持排序
-        if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_VIDEO_EXTENSIONS:
-            yield file_path
+    # 对于目录，使用迭代器避免一次性加载所有文件, 每个目录内保持排序
+    yield from scan_files(input_path, SUPPORTED_VIDEO_EXTENSIONS, recursive)
 
 def extract_frames_with_ffmpeg(video_path: Path, output_dir: Path, gap: int, video_name: str) -> bool:
     """使用ffmpeg提取帧"""
@@ -95,13 +95,15 @@ def extract_frames_with_opencv(video_path: Path, output_dir: Path, gap: int, vid
         return False
 
 @cli.command()
+@instrumented
 def extract_frames(
     path: str = typer.Argument(..., help="视频文件路径或包含视频文件的文件夹路径"),
     gap: int = typer.Option(50, "-gap", "-g", help="间隔多少帧保存一次"),
     output_path: Optional[Path] = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归查找子目录中的视频"),
 ) -> None:
     """提取视频帧，默认使用ffmpeg，如果没有ffmpeg则使用OpenCV"""
-    video_files = get_video_files_iterator(path)
+    video_files = get_video_files_iterator(path, recursive)
 
     processed_count = 0
     found_files = False
@@ -121,7 +123,7 @@ def extract_frames(
         print(f"\n正在处理第 {processed_count} 个视频文件: {video_file.name}")
 
         video_output_path = create_output_directory(
-            output_path, str(video_file), f"video2img_{gap}_{video_file.stem}"
+            output_path, video_file, f"video2img_{gap}_{video_file.stem}"
         )
 
         success = False
@@ -0,0 +1,368 @@
+# --watch 模式: 持续监视图片/标签目录, 只处理发生变化的文件
+#
+# Linux 上通过 ctypes 调用 inotify (无需额外依赖), 只关注写入完成 (IN_CLOSE_WRITE)、创建、删除和移动,
+# LabelMe 保存时的多次写入只产生一个事件; inotify 不可用时 (其他平台或 watch 数量超出上限)
+# 退化为按 (mtime, 大小) 轮询. 事件在安静 debounce 秒后合并为一批, 连续保存时最多等待 MAX_DELAY_FACTOR 倍.
+#
+# 变化的文件按 "子目录/文件名 (不含后缀)" 映射回图片, 图片仍存在时重新转换, 图片已删除时删除对应输出.
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import typer
+
+from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.utils import iter_image_label_pairs
+
+MAX_DELAY_FACTOR = 10
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+# 需要重新全量扫描 (事件队列溢出或整个子目录被移走, 无法得知其中的文件)
+RESCAN = None
+
+
+def visible(path: Path) -> bool:
+    """与 scan_files 一致, 跳过隐藏文件/目录 (如原子写入时的临时文件)"""
+    return not path.name.startswith(".")
+
+
+class InotifyWatcher:
+    def __init__(self, roots: Iterable[Path], recursive: bool, files: Iterable[Path] = (), exclude=()):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.recursive = recursive
+        self.roots = [Path(r).resolve() for r in roots]
+        self.exclude = {Path(p).resolve() for p in exclude}
+        self.files = {Path(f).resolve() for f in files}
+        self.dirs = {}
+        try:
+            for root in self.roots:
+                self.add_tree(root)
+            for file in self.files:
+                self.add_dir(file.parent)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def close(self):
+        os.close(self.fd)
+
+    def add_dir(self, directory: Path) -> None:
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"无法监视目录 {directory}")
+        self.dirs[wd] = directory
+
+    def add_tree(self, directory: Path) -> list[Path]:
+        """监视目录 (递归时包括子目录), 返回其中已有的文件, 用于处理新建目录时已写入的文件"""
+        self.add_dir(directory)
+        found = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                path = Path(entry.path)
+                if not visible(path) or path in self.exclude:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recursive:
+                        found += self.add_tree(path)
+                else:
+                    found.append(path)
+        return found
+
+    def read(self, timeout: float):
+        """等待最多 timeout 秒, 返回变化的路径集合, 需要全量扫描时集合中包含 RESCAN"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        changed = set()
+        if not ready:
+            return changed
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return changed
+
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, pos)
+            name = data[pos + EVENT_HEADER.size : pos + EVENT_HEADER.size + length].rstrip(b"\0")
+            pos += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                changed.add(RESCAN)
+                continue
+            directory = self.dirs.get(wd)
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if path in self.files:
+                changed.add(path)
+                continue
+            # 只为额外文件 (如 classes.txt) 监视的目录中, 其他变化都忽略
+            if not visible(path) or path in self.exclude or not any(directory.is_relative_to(r) for r in self.roots):
+                continue
+            if mask & IN_ISDIR:
+                if not self.recursive:
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        changed.update(self.add_tree(path))
+                    except OSError:
+                        changed.add(RESCAN)
+                elif mask & IN_MOVED_FROM:
+                    changed.add(RESCAN)
+                continue
+            changed.add(path)
+        return changed
+
+
+class PollWatcher:
+    """每隔 interval 秒比较一次 (mtime, 大小) 快照"""
+
+    def __init__(self, roots: Iterable[Path], recursive: bool, files: Iterable[Path] = (), exclude=(), interval=1.0):
+        self.roots = [Path(r).resolve() for r in roots]
+        self.recursive = recursive
+        self.files = [Path(f).resolve() for f in files]
+        self.exclude = {Path(p).resolve() for p in exclude}
+        self.interval = interval
+        self.snapshot = self.scan()
+        self.next_scan = time.monotonic() + interval
+
+    def close(self):
+        pass
+
+    def scan(self) -> dict:
+        snapshot = {}
+        pending = list(self.roots)
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        path = Path(entry.path)
+                        if not visible(path) or path in self.exclude:
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                pending.append(path)
+                            continue
+                        st = entry.stat()
+                        snapshot[path] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                continue
+        for file in self.files:
+            try:
+                st = file.stat()
+                snapshot[file] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                pass
+        return snapshot
+
+    def read(self, timeout: float):
+        time.sleep(max(0.0, min(timeout, self.next_scan - time.monotonic())))
+        if time.monotonic() < self.next_scan:
+            return set()
+        self.next_scan = time.monotonic() + self.interval
+        snapshot = self.scan()
+        old, self.snapshot = self.snapshot, snapshot
+        return {p for p in old.keys() | snapshot.keys() if old.get(p) != snapshot.get(p)}
+
+
+def create_watcher(roots, recursive: bool, files=(), exclude=(), interval=1.0, poll: bool = False):
+    if not poll:
+        try:
+            return InotifyWatcher(roots, recursive, files, exclude)
+        except (OSError, AttributeError) as e:
+            # AttributeError: libc 中没有 inotify (非 Linux)
+            typer.echo(f"inotify 不可用 ({e}), 改为每 {interval}s 轮询")
+    return PollWatcher(roots, recursive, files, exclude, interval)
+
+
+def debounced(watcher, debounce: float, interval: float):
+    """合并连续的变化, 安静 debounce 秒后产出一批"""
+    while True:
+        changed = watcher.read(interval)
+        if not changed:
+            continue
+        deadline = time.monotonic() + debounce * MAX_DELAY_FACTOR
+        while True:
+            more = watcher.read(min(debounce, max(0.0, deadline - time.monotonic())))
+            changed |= more
+            if not more or time.monotonic() >= deadline:
+                break
+        yield changed
+
+
+def source_key(path: Path, image_root: Path, label_root: Path, suffixes) -> Optional[Path]:
+    """变化的图片/标签文件 -> 相对路径 (不含后缀), 无关文件返回 None"""
+    if path.suffix.lower() not in suffixes:
+        return None
+    for root in (label_root, image_root):
+        if path.is_relative_to(root):
+            return path.relative_to(root).with_suffix("")
+    return None
+
+
+def find_pair(key: Path, image_root: Path, label_root: Path, label_suffixes):
+    """按相对路径查找图片和标签, 图片不存在时返回 None"""
+    image_dir = image_root / key.parent
+    img_file = next(
+        (image_dir / f"{key.name}{ext}" for ext in sorted(SUPPORTED_IMAGE_EXTENSIONS)
+         if (image_dir / f"{key.name}{ext}").exists()),
+        None,
+    )
+    if img_file is None:
+        return None
+    label_dir = label_root / key.parent
+    label_file = next(
+        (label_dir / f"{key.name}{ext}" for ext in label_suffixes if (label_dir / f"{key.name}{ext}").exists()),
+        None,
+    )
+    return img_file, img_file.relative_to(image_root), label_file
+
+
+def run_watch(
+    image_root: Path,
+    label_root: Path,
+    label_suffixes,
+    recursive: bool,
+    convert: Callable,
+    remove: Callable[[Path], None],
+    exclude=(),
+    files: Iterable[Path] = (),
+    on_files: Optional[Callable[[set], None]] = None,
+    debounce: float = 0.5,
+    interval: float = 1.0,
+    poll: bool = False,
+) -> None:
+    """
+    先全量处理一次, 之后持续处理变化的文件, Ctrl+C 退出
+
+    Args:
+        convert: convert(pairs, changed_images) 处理 (图片, 相对路径, 标签) 列表;
+            changed_images 为内容有变化的图片, 全量处理时为 None, 未变化的图片可以不重新写出
+        remove: remove(key) 删除相对路径 key (不含后缀) 对应的输出, 用于源图片已删除的情况
+        files: 额外监视的文件 (如 classes.txt), 变化时调用 on_files 后重新全量处理
+    """
+    image_root, label_root = Path(image_root).resolve(), Path(label_root).resolve()
+    files = {Path(f).resolve() for f in files}
+    suffixes = SUPPORTED_IMAGE_EXTENSIONS | set(label_suffixes)
+    roots = {image_root, label_root}
+    # 先开始监视再全量处理, 处理期间的修改不会丢失
+    watcher = create_watcher(roots, recursive, files, exclude, interval, poll)
+    known = set()
+
+    def full_pass():
+        current = set()
+        last, consumed = None, 0
+
+        def iter_pairs():
+            nonlocal last, consumed
+            for pair in iter_image_label_pairs(image_root, label_root, recursive, label_suffixes, exclude=exclude):
+                current.add(pair[1].with_suffix(""))
+                last, consumed = pair, consumed + 1
+                yield pair
+
+        # 与 convert_each 相同, 跳过格式错误或类别不在 classes.txt 中的标签:
+        # convert 逐个处理, 出错的是最后取出的图片, 报告后用同一个迭代器从下一个继续.
+        # 出错的图片仍记录在 known 中, 下次保存时会再次处理
+        pairs = iter_pairs()
+        while True:
+            start = consumed
+            try:
+                convert(pairs, None)
+                break
+            except (ValueError, KeyError, OSError) as e:
+                typer.echo(f"处理失败 {last[0] if last else image_root}: {e}")
+                # 没有取出新的图片就出错 (如输出目录不可写) 时不再重试
+                if consumed == start:
+                    break
+        for key in known - current:
+            remove(key)
+        known.clear()
+        known.update(current)
+
+    try:
+        full_pass()
+        typer.echo(f"正在监视 {', '.join(str(r) for r in roots)} ({type(watcher).__name__}), Ctrl+C 退出")
+        for changed in debounced(watcher, debounce, interval):
+            changed_files = {p for p in changed if p in files}
+            if RESCAN in changed or changed_files:
+                if changed_files and on_files is not None:
+                    on_files(changed_files)
+                typer.echo("重新全量同步")
+                full_pass()
+                continue
+
+            keys = {k for p in changed if (k := source_key(p, image_root, label_root, suffixes)) is not None}
+            if not recursive:
+                keys = {k for k in keys if k.parent == Path(".")}
+            pairs, removed = [], []
+            for key in sorted(keys):
+                pair = find_pair(key, image_root, label_root, label_suffixes)
+                if pair is None:
+                    if key in known:
+                        removed.append(key)
+                        known.discard(key)
+                else:
+                    pairs.append(pair)
+                    known.add(key)
+            for key in removed:
+                remove(key)
+            if pairs:
+                changed_images = {p for p in changed if p is not None and p.suffix.lower() in SUPPORTED_IMAGE_EXTENSIONS}
+                convert_each(convert, pairs, changed_images)
+            typer.echo(f"[{time.strftime('%H:%M:%S')}] 已同步: 更新 {len(pairs)} 个, 删除 {len(removed)} 个")
+    except KeyboardInterrupt:
+        typer.echo("停止监视")
+    finally:
+        watcher.close()
+
+
+def convert_each(convert: Callable, pairs: list, changed_images: set) -> None:
+    """整批处理失败时逐个重试, 跳过仍在写入或格式错误的标签, 下次保存时会再次处理"""
+    try:
+        convert(pairs, changed_images)
+        return
+    except (ValueError, KeyError, OSError) as e:
+        if len(pairs) == 1:
+            typer.echo(f"处理失败 {pairs[0][0]}: {e}")
+            return
+    for pair in pairs:
+        try:
+            convert([pair], changed_images)
+        except (ValueError, KeyError, OSError) as e:
+            typer.echo(f"处理失败 {pair[0]}: {e}")
+
+
+def remove_outputs(output_root: Path, key: Path, suffixes: Iterable[str] = (".txt", *SUPPORTED_IMAGE_EXTENSIONS)) -> None:
+    """删除输出目录中相对路径 key (不含后缀) 对应的标签和图片"""
+    out_dir = output_root / key.parent
+    for suffix in suffixes:
+        (out_dir / f"{key.name}{suffix}").unlink(missing_ok=True)
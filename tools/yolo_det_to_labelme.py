@@ -1,13 +1,16 @@
-import json
-import shutil
 from pathlib import Path
 
 import typer
 from PIL import Image
 from rich.progress import track
 
-from tools.utils import SUPPORTED_IMAGE_EXTENSIONS
+from tools.instrument import instrumented
+from tools.instrument import stage
+from tools.json_codec import dump_json
+from tools.resize import ImageWriter
 from tools.utils import create_output_directory
+from tools.utils import iter_image_label_pairs
+from tools.utils import output_subdir
 
 cli = typer.Typer(help="YOLO 标签转 LabelMe 标签 (目标检测)")
 
@@ -31,9 +34,23 @@ def xywh2xyxy(box, img_width, img_height):
     return (class_id, x_min, y_min, x_max, y_max)
 
 
-def convert_yolo_to_labelme(txt_path, json_path, classes, img_width, img_height):
-    with open(txt_path, "r") as f:
-        lines = [line.strip() for line in f if line.strip()]
+def rectangle_shape(label, x_min, y_min, x_max, y_max):
+    return {
+        "label": label,
+        "points": [[x_min, y_min], [x_max, y_max]],
+        "group_id": None,
+        "shape_type": "rectangle",
+        "flags": {},
+    }
+
+
+def convert_yolo_to_labelme(
+    txt_path, json_path, classes, img_width, img_height, compact=False
+):
+    with stage("read") as s, open(txt_path, "r") as f:
+        text = f.read()
+        s.nbytes = len(text)
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
 
     json_data = DEFAULT_JSON_TEMPLATE.copy()
     json_data.update(
@@ -45,30 +62,28 @@ def convert_yolo_to_labelme(txt_path, json_path, classes, img_width, img_height)
         }
     )
 
-    for line in lines:
-        class_id, x_min, y_min, x_max, y_max = xywh2xyxy(line, img_width, img_height)
-        json_data["shapes"].append(
-            {
-                "label": classes[int(class_id)],
-                "points": [[x_min, y_min], [x_max, y_max]],
-                "group_id": None,
-                "shape_type": "rectangle",
-                "flags": {},
-            }
-        )
+    with stage("convert"):
+        for line in lines:
+            class_id, x_min, y_min, x_max, y_max = xywh2xyxy(line, img_width, img_height)
+            json_data["shapes"].append(rectangle_shape(classes[int(class_id)], x_min, y_min, x_max, y_max))
 
-    with open(json_path, "w") as f:
-        json.dump(json_data, f, indent=4)
+    dump_json(json_data, json_path, compact=compact)
 
 
 @cli.command()
+@instrumented
 def process_yolo_det_to_labelme(
     image_path: Path = typer.Argument(..., help="图片目录"),
     class_path: str = typer.Argument(..., help="classes.txt"),
     label_path: Path = typer.Option(None, "--label_path", "-l", help="标签目录"),
     output_path: Path = typer.Option(None, "--output_path", "-o", help="输出目录"),
+    recursive: bool = typer.Option(False, "--recursive", help="递归处理子目录, 输出保留相对路径"),
+    max_size: int = typer.Option(
+        None, "--max-size", "--resize", help="长边超过该值的图片缩小到该值 (INTER_AREA) 并重新编码, 默认原样复制"
+    ),
+    quality: int = typer.Option(95, "--quality", help="缩小后 JPEG 的编码质量"),
+    compact: bool = typer.Option(False, "--compact", help="json 紧凑输出 (无缩进)"),
 ):
-    images = [f for f in image_path.iterdir() if f.suffix.lower() in SUPPORTED_IMAGE_EXTENSIONS]
     label_path = label_path or image_path
     output_path = create_output_directory(output_path, image_path, "yolo2json_det")
 
@@ -76,15 +91,21 @@ def process_yolo_det_to_labelme(
     with open(class_path, "r") as f:
         classes = f.read().splitlines()
 
-    for img_file in track(images, description="Converting to JSON..."):
-        img = Image.open(img_file)
-        base_name = img_file.stem
-        txt_file = label_path / f"{base_name}.txt"
-        json_file = output_path / f"{base_name}.json"
-
-        if txt_file.exists():
-            convert_yolo_to_labelme(txt_file, json_file, classes, img.width, img.height)
-        shutil.copy(img_file, output_path)
+    pairs = iter_image_label_pairs(
+        image_path, label_path, recursive, label_suffixes=(".txt",), exclude=(output_path,)
+    )
+    with ImageWriter(max_size, quality) as writer:
+        for img_file, rel, txt_file in track(pairs, description="Converting to JSON..."):
+            with stage("image"):
+                img = Image.open(img_file)
+            out_dir = output_subdir(output_path, rel)
+            json_file = out_dir / f"{img_file.stem}.json"
+
+            if txt_file is not None:
+                # 像素坐标和 imageWidth/imageHeight 按缩小后的尺寸计算
+                width, height = writer.size(img.width, img.height)
+                convert_yolo_to_labelme(txt_file, json_file, classes, width, height, compact)
+            writer.write(img_file, out_dir, (img.width, img.height))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+import numpy as np
+
+# 定点格式化的取值上限, 超出时退化为逐个 %.6f 格式化
+FIXED_POINT_MAX = 9.5
+
+
+def format_yolo_rows(class_ids, values, row_lens) -> str:
+    """
+    批量格式化 YOLO 标签行 `class_id v1 v2 ...`, 数值保留 6 位小数
+
+    Args:
+        class_ids: 每行的类别 id
+        values: 所有行的数值拼接后的扁平数组
+        row_lens: 每行数值的个数
+    """
+    values = np.asarray(values, dtype=np.float64)
+    # 含 NaN 时 min/max 为 NaN, 比较均为 False, 同样退化为 %.6f (输出 nan)
+    if values.size and not (values.min() >= 0 and values.max() < FIXED_POINT_MAX):
+        fmt = "".join(f"{class_id}" + " %.6f" * n + "\n" for class_id, n in zip(class_ids, row_lens))
+        return fmt % tuple(values.tolist())
+
+    # 归一化坐标和可见性都在 [0, 10) 内, 转为定点整数后直接拼出 " d.dddddd" 的字节
+    fixed = np.rint(values * 1e6).astype(np.int64)
+    chars = np.empty((len(fixed), 9), dtype=np.uint8)
+    chars[:, 0] = ord(" ")
+    chars[:, 1] = fixed // 1_000_000 + ord("0")
+    chars[:, 2] = ord(".")
+    frac = fixed % 1_000_000
+    for i in range(8, 2, -1):
+        chars[:, i] = frac % 10 + ord("0")
+        frac //= 10
+    body = chars.tobytes()
+
+    parts = []
+    pos = 0
+    for class_id, n in zip(class_ids, row_lens):
+        end = pos + 9 * n
+        parts.append(b"%d%s\n" % (class_id, body[pos:end]))
+        pos = end
+    return b"".join(parts).decode("ascii")